@@ -12,6 +12,8 @@ import os
 from typing import Tuple, Dict, Any, Optional
 from PIL import Image
 
+from image_normalization import clahe_luminance
+
 # Card dimensions and aspect ratio
 # v3.1: More permissive to handle various card types
 ASPECT_MIN = 0.60  # Reduced from 0.68 to catch more cards
@@ -35,12 +37,7 @@ def _download_image_to_tmp(url: str) -> str:
 
 def _apply_clahe_bgr(img: np.ndarray) -> np.ndarray:
     """Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) for better edge detection."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    l2 = clahe.apply(l)
-    lab2 = cv2.merge((l2, a, b))
-    return cv2.cvtColor(lab2, cv2.COLOR_LAB2BGR)
+    return clahe_luminance(img, clip_limit=3.0)
 
 
 def _focus_metric(gray: np.ndarray) -> float:
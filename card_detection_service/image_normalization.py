@@ -0,0 +1,62 @@
+"""
+Image normalization and quality grading shared by the stage0 and v3.1 detectors.
+
+Vendored from the OpenCV service (opencv_service/illumination.py
+clahe_luminance and opencv_service/quality_gate.py grade_image_quality) so
+this service deploys on its own. Keep the two copies in step: both services
+must report the same image-quality grade and equalize luminance the same way.
+"""
+
+import threading
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+_thread_local = threading.local()
+
+
+def get_clahe(clip_limit: float, tile_grid: Tuple[int, int] = (8, 8)) -> "cv2.CLAHE":
+    """CLAHE operator for the calling thread, created once per parameter set."""
+    cache = getattr(_thread_local, "clahe", None)
+    if cache is None:
+        cache = {}
+        _thread_local.clahe = cache
+    key = (float(clip_limit), tuple(tile_grid))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=float(clip_limit), tileGridSize=tuple(tile_grid))
+        cache[key] = clahe
+    return clahe
+
+
+def clahe_luminance(img_bgr: np.ndarray, clip_limit: float = 2.0,
+                    tile_grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+    """CLAHE on the LAB L channel, color channels untouched."""
+    lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
+    lab[:, :, 0] = get_clahe(clip_limit, tile_grid).apply(np.ascontiguousarray(lab[:, :, 0]))
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def grade_image_quality(focus: float, edge_density: float, brightness: float) -> Dict[str, Any]:
+    """Calculate image quality grade (A-D) based on metrics."""
+    score = (
+        min(focus / 250.0, 1.0) * 0.5 +
+        min(edge_density / 0.08, 1.0) * 0.3 +
+        (1 - abs(128 - brightness) / 128.0) * 0.2
+    ) * 100
+
+    if score >= 85:
+        grade = "A"
+    elif score >= 70:
+        grade = "B"
+    elif score >= 55:
+        grade = "C"
+    else:
+        grade = "D"
+
+    return {
+        "score": round(score, 1),
+        "grade": grade,
+        "reshoot": grade in ["C", "D"]
+    }
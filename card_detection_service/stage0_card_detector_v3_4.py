@@ -15,6 +15,8 @@ import tempfile
 import os
 from typing import Dict, Any, Tuple, Optional
 
+from image_normalization import clahe_luminance, grade_image_quality
+
 # --- Tunable constants ---
 ASPECT_MIN, ASPECT_MAX = 0.60, 0.80          # Card aspect tolerance (widened for various card types)
 MIN_RATIO, MAX_RATIO = 0.30, 0.95            # Acceptable card-to-frame area ratio (v3.4.2: raised to 95% for product photos)
@@ -56,12 +58,7 @@ def edge_density_metric(edges: np.ndarray) -> float:
 # -------------------------------------------------------------
 def equalize_lighting(img: np.ndarray) -> np.ndarray:
     """Apply CLAHE to improve contrast in uneven lighting."""
-    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    l2 = clahe.apply(l)
-    merged = cv2.merge((l2, a, b))
-    return cv2.cvtColor(merged, cv2.COLOR_LAB2BGR)
+    return clahe_luminance(img, clip_limit=2.0)
 
 
 def adaptive_edges(img: np.ndarray) -> np.ndarray:
@@ -225,33 +222,6 @@ def measure_borders(warped: np.ndarray) -> Dict[str, Any]:
     }
 
 
-# -------------------------------------------------------------
-# Image-quality grade
-# -------------------------------------------------------------
-def grade_image_quality(focus, edge_density, brightness):
-    """Calculate image quality grade (A-D) based on metrics."""
-    score = (
-        min(focus / 250.0, 1.0) * 0.5 +
-        min(edge_density / 0.08, 1.0) * 0.3 +
-        (1 - abs(128 - brightness) / 128.0) * 0.2
-    ) * 100
-
-    if score >= 85:
-        grade = "A"
-    elif score >= 70:
-        grade = "B"
-    elif score >= 55:
-        grade = "C"
-    else:
-        grade = "D"
-
-    return {
-        "score": round(score, 1),
-        "grade": grade,
-        "reshoot": grade in ["C", "D"]
-    }
-
-
 # -------------------------------------------------------------
 # Master process (compatible with app.py expectations)
 # -------------------------------------------------------------
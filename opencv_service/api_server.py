@@ -7,23 +7,44 @@ Provides HTTP endpoint for Next.js to call OpenCV analysis
 
 import os
 import json
+import shutil
 import tempfile
+import time
 import uuid
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory, url_for
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
 # Import the core OpenCV analysis function
-from card_cv_stage1 import analyze_side, serialize_combined_metrics, CombinedMetrics
+from card_cv_stage1 import (
+    analyze_side, serialize_combined_metrics, combine_sides, DEFAULT_METRIC_GROUPS, METRIC_GROUPS, parse_metric_groups
+)
+from burst import MAX_BURST_FRAMES, analyze_burst, serialize_burst
+from fidelity_tiers import DEFAULT_TIER, FIDELITY_TIERS, get_tier
+from live_guidance import LIVE_MAX_FPS, run_guidance_socket
+from llm_export import EXPORT_DELIVERIES, EXPORT_FORMATS, parse_export_options
+from multi_card import MAX_CARDS, analyze_multi_card, serialize_multi_card
+from quad_hint import QUAD_TRUST_LEVELS, parse_quad_hint
+
+# Optional: the /live-guidance WebSocket needs flask-sock
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Next.js calls
+sock = Sock(app) if Sock is not None else None
 
 # Configuration
 UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# LLM card images delivered by reference, served from /exports for EXPORT_TTL seconds
+EXPORT_FOLDER = os.environ.get('OPENCV_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'opencv_exports'))
+EXPORT_TTL = int(os.environ.get('OPENCV_EXPORT_TTL', '3600'))
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
@@ -34,16 +55,76 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def with_export_group(metric_groups, export):
+    """Metric groups with "export" added when export options were given"""
+    if export is None:
+        return metric_groups
+    groups = list(DEFAULT_METRIC_GROUPS) if metric_groups is None else list(metric_groups)
+    return groups if 'export' in groups else groups + ['export']
+
+
+def publish_exports(sides, run_id):
+    """Move reference-delivery card images to EXPORT_FOLDER and set their URLs"""
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    cutoff = time.time() - EXPORT_TTL
+    for name in os.listdir(EXPORT_FOLDER):
+        path = os.path.join(EXPORT_FOLDER, name)
+        if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+    for side in sides:
+        export = (side or {}).get('export')
+        if not export or export['options'].get('delivery') != 'reference':
+            continue
+        name = f'{run_id}_{os.path.basename(export["path"])}'
+        shutil.move(export['path'], os.path.join(EXPORT_FOLDER, name))
+        export['path'] = None
+        export['url'] = url_for('get_export', name=name, _external=True)
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'opencv-card-analysis',
-        'version': 'v1.0'
+        'version': 'v1.0',
+        'metric_groups': list(METRIC_GROUPS),
+        'default_metric_groups': list(DEFAULT_METRIC_GROUPS),
+        'fidelity_tiers': {name: t.to_dict() for name, t in FIDELITY_TIERS.items()},
+        'default_tier': DEFAULT_TIER,
+        'quad_trust_levels': list(QUAD_TRUST_LEVELS),
+        'export_formats': list(EXPORT_FORMATS),
+        'export_deliveries': list(EXPORT_DELIVERIES),
+        'max_cards': MAX_CARDS,
+        'max_burst_frames': MAX_BURST_FRAMES,
+        'live_guidance': sock is not None
     }), 200
 
 
+if sock is not None:
+    @sock.route('/live-guidance')
+    def live_guidance(ws):
+        """
+        Capture guidance for a camera preview stream (WebSocket)
+
+        Send preview frames as binary JPEG / PNG / WebP messages (a few
+        hundred pixels is enough); each is answered with a JSON message:
+        the card quad (normalized), capture hints such as move_closer, tilt
+        or glare with its region, and ready once the card has held still.
+        Frames that arrive faster than the service keeps up are dropped,
+        newest kept, and counted in "dropped". Send {"type": "reset"} as text
+        to forget the tracked card.
+        """
+        run_guidance_socket(ws)
+
+
+@app.route('/exports/<name>', methods=['GET'])
+def get_export(name):
+    """LLM card image of an earlier analysis (export_delivery=reference)"""
+    return send_from_directory(EXPORT_FOLDER, secure_filename(name))
+
+
 @app.route('/analyze', methods=['POST'])
 def analyze_card():
     """
@@ -52,6 +133,25 @@ def analyze_card():
     Expects multipart/form-data with:
     - front: image file (required)
     - back: image file (optional)
+    - groups: comma-separated metric groups to compute (optional, default all):
+      detection, centering, edges, corners, surface, indicators, debug,
+      consistency; opt-in, only when named: duplicates (card hashes,
+      near-duplicate earlier submissions), evidence (defect crops), export
+      (card image). "all,evidence" adds an opt-in group to the defaults.
+      Also accepted as a query parameter. Groups not requested are neither
+      computed nor returned.
+    - tier: fidelity tier, fast | standard | full (optional, default standard).
+      Also accepted as a query parameter; recorded as fidelity_tier per side.
+    - front_quad / back_quad: card corners the client already knows (optional):
+      JSON list of four [x, y] pairs, normalized (0-1) or pixels
+    - quad_trust: exact (warp the corners as given) | hint (snap them to
+      nearby edges, full detection if that fails); default hint
+    - quad_units: normalized | pixel (optional; inferred from the values)
+    - export: jpeg | webp - add a cropped, deskewed card image per side for
+      the vision LLM (optional; turns on the export group)
+    - export_max_pixels / export_max_bytes: budgets for that image (optional)
+    - export_delivery: inline (base64 in the JSON) | reference (a URL under
+      /exports, kept EXPORT_TTL seconds); optional
 
     Returns JSON metrics including:
     - Centering measurements
@@ -59,6 +159,8 @@ def analyze_card():
     - Corner analysis
     - Surface defect detection
     - Sleeve/glare indicators
+    - Front/back consistency verdict (consistency.verdict, reject) when both
+      sides are given
     """
     try:
         # Check if files are present
@@ -71,6 +173,23 @@ def analyze_card():
         front_file = request.files.get('front')
         back_file = request.files.get('back')
 
+        try:
+            metric_groups = parse_metric_groups(request.values.get('groups'))
+            tier = get_tier(request.values.get('tier'))
+            front_quad = parse_quad_hint(request.values.get('front_quad'), request.values.get('quad_trust'),
+                                         request.values.get('quad_units'))
+            back_quad = parse_quad_hint(request.values.get('back_quad'), request.values.get('quad_trust'),
+                                        request.values.get('quad_units'))
+            export = parse_export_options(request.values.get('export'), request.values.get('export_max_pixels'),
+                                          request.values.get('export_max_bytes'),
+                                          request.values.get('export_delivery'))
+            metric_groups = with_export_group(metric_groups, export)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid analysis options',
+                'message': str(e)
+            }), 400
+
         # Validate files
         if front_file and not allowed_file(front_file.filename):
             return jsonify({
@@ -112,20 +231,19 @@ def analyze_card():
         back_metrics = None
 
         if front_path:
-            front_metrics = analyze_side(front_path, output_dir, 'front')
+            front_metrics = analyze_side(front_path, output_dir, 'front', metric_groups=metric_groups, tier=tier,
+                                         quad=front_quad, export=export)
 
         if back_path:
-            back_metrics = analyze_side(back_path, output_dir, 'back')
+            back_metrics = analyze_side(back_path, output_dir, 'back', metric_groups=metric_groups, tier=tier,
+                                        quad=back_quad, export=export)
 
         # Combine metrics
-        combined = CombinedMetrics(
-            front=front_metrics,
-            back=back_metrics,
-            run_id=run_id
-        )
+        combined = combine_sides(front_metrics, back_metrics, run_id=run_id)
 
         # Serialize to JSON
         result = serialize_combined_metrics(combined)
+        publish_exports([result['front'], result['back']], run_id)
 
         # Clean up temp files (keep output for debugging)
         if front_path and os.path.exists(front_path):
@@ -143,6 +261,169 @@ def analyze_card():
         }), 500
 
 
+@app.route('/analyze-burst', methods=['POST'])
+def analyze_burst_frames():
+    """
+    Analyze the best frame of a capture burst per side
+
+    Expects multipart/form-data with:
+    - front: one or more image files (required; repeat the field per frame)
+    - back: one or more image files (optional)
+    - groups, tier: as for /analyze
+
+    Every frame is scored on a thumbnail (focus, glare, card presence); only
+    the best frame of each side is fully analyzed. Returns the /analyze
+    metrics plus a burst object per side with every frame's score and the
+    selected index.
+    """
+    try:
+        front_files = [f for f in request.files.getlist('front') if f and f.filename]
+        back_files = [f for f in request.files.getlist('back') if f and f.filename]
+        if not front_files:
+            return jsonify({
+                'error': 'No file provided',
+                'message': 'Please provide at least one front frame'
+            }), 400
+
+        for f in front_files + back_files:
+            if not allowed_file(f.filename):
+                return jsonify({
+                    'error': 'Invalid file type',
+                    'message': f'Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+                }), 400
+
+        if max(len(front_files), len(back_files)) > MAX_BURST_FRAMES:
+            return jsonify({
+                'error': 'Too many frames',
+                'message': f'At most {MAX_BURST_FRAMES} frames per side'
+            }), 400
+
+        try:
+            metric_groups = parse_metric_groups(request.values.get('groups'))
+            tier = get_tier(request.values.get('tier'))
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid analysis options',
+                'message': str(e)
+            }), 400
+
+        # Create temporary directory for this analysis
+        run_id = str(uuid.uuid4())
+        temp_dir = os.path.join(tempfile.gettempdir(), f'opencv_analysis_{run_id}')
+        os.makedirs(temp_dir, exist_ok=True)
+
+        # Save uploaded frames (indexed, so same-named frames do not collide)
+        frame_paths = {}
+        for side, files in (('front', front_files), ('back', back_files)):
+            frame_paths[side] = []
+            for i, f in enumerate(files):
+                path = os.path.join(temp_dir, f'{side}_{i}_{secure_filename(f.filename)}')
+                f.save(path)
+                frame_paths[side].append(path)
+
+        output_dir = os.path.join(temp_dir, 'output')
+        os.makedirs(output_dir, exist_ok=True)
+
+        bursts = {side: analyze_burst(paths, output_dir, side, metric_groups=metric_groups, tier=tier)
+                  for side, paths in frame_paths.items() if paths}
+
+        combined = combine_sides(bursts['front'].side, bursts['back'].side if 'back' in bursts else None,
+                                 run_id=run_id)
+        result = serialize_combined_metrics(combined)
+        result['burst'] = {side: serialize_burst(b) for side, b in bursts.items()}
+
+        # Clean up temp files
+        for paths in frame_paths.values():
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        app.logger.error(f'Error analyzing burst: {str(e)}')
+        return jsonify({
+            'error': 'Analysis failed',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/analyze-multi', methods=['POST'])
+def analyze_multi():
+    """
+    Analyze every card in one photo (binder page, cards laid out on a mat)
+
+    Expects multipart/form-data with:
+    - image: image file (required)
+    - groups: metric groups (optional, see /analyze)
+    - tier: fidelity tier (optional, see /analyze)
+    - max_cards: most cards to analyze (optional, default MAX_CARDS)
+    - export, export_max_pixels, export_max_bytes, export_delivery: an LLM
+      card image per card (optional, see /analyze)
+
+    Returns one metrics object per card, in reading order, each with its
+    grid_position (row, col, label and quad), plus the grid size.
+    """
+    try:
+        image_file = request.files.get('image')
+        if not image_file or not image_file.filename:
+            return jsonify({
+                'error': 'No file provided',
+                'message': 'Please provide an image'
+            }), 400
+
+        if not allowed_file(image_file.filename):
+            return jsonify({
+                'error': 'Invalid file type',
+                'message': f'Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            }), 400
+
+        try:
+            metric_groups = parse_metric_groups(request.values.get('groups'))
+            tier = get_tier(request.values.get('tier'))
+            max_cards = int(request.values.get('max_cards', MAX_CARDS))
+            if not 1 <= max_cards <= MAX_CARDS:
+                raise ValueError(f'max_cards must be between 1 and {MAX_CARDS}')
+            export = parse_export_options(request.values.get('export'), request.values.get('export_max_pixels'),
+                                          request.values.get('export_max_bytes'),
+                                          request.values.get('export_delivery'))
+            metric_groups = with_export_group(metric_groups, export)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid analysis options',
+                'message': str(e)
+            }), 400
+
+        # Create temporary directory for this analysis
+        run_id = str(uuid.uuid4())
+        temp_dir = os.path.join(tempfile.gettempdir(), f'opencv_analysis_{run_id}')
+        os.makedirs(temp_dir, exist_ok=True)
+
+        image_path = os.path.join(temp_dir, f'page_{secure_filename(image_file.filename)}')
+        image_file.save(image_path)
+
+        output_dir = os.path.join(temp_dir, 'output')
+        os.makedirs(output_dir, exist_ok=True)
+
+        result = analyze_multi_card(image_path, output_dir, metric_groups=metric_groups,
+                                    tier=tier, max_cards=max_cards, export=export)
+        result.run_id = run_id
+
+        if os.path.exists(image_path):
+            os.remove(image_path)
+
+        payload = serialize_multi_card(result)
+        publish_exports(payload['cards'], run_id)
+        return jsonify(payload), 200
+
+    except Exception as e:
+        app.logger.error(f'Error analyzing page: {str(e)}')
+        return jsonify({
+            'error': 'Analysis failed',
+            'message': str(e)
+        }), 500
+
+
 @app.route('/analyze-url', methods=['POST'])
 def analyze_card_from_url():
     """
@@ -151,6 +432,12 @@ def analyze_card_from_url():
     Expects JSON with:
     - frontUrl: string (required)
     - backUrl: string (optional)
+    - groups: list or comma-separated string of metric groups (optional, see /analyze)
+    - tier: fidelity tier (optional, see /analyze)
+    - frontQuad / backQuad, quadTrust, quadUnits: client-supplied corners
+      (optional, see front_quad / back_quad on /analyze)
+    - export, exportMaxPixels, exportMaxBytes, exportDelivery: LLM card
+      image (optional, see export on /analyze)
 
     Returns same metrics as /analyze endpoint
     """
@@ -168,6 +455,20 @@ def analyze_card_from_url():
         front_url = data.get('frontUrl')
         back_url = data.get('backUrl')
 
+        try:
+            metric_groups = parse_metric_groups(data.get('groups'))
+            tier = get_tier(data.get('tier'))
+            front_quad = parse_quad_hint(data.get('frontQuad'), data.get('quadTrust'), data.get('quadUnits'))
+            back_quad = parse_quad_hint(data.get('backQuad'), data.get('quadTrust'), data.get('quadUnits'))
+            export = parse_export_options(data.get('export'), data.get('exportMaxPixels'),
+                                          data.get('exportMaxBytes'), data.get('exportDelivery'))
+            metric_groups = with_export_group(metric_groups, export)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid analysis options',
+                'message': str(e)
+            }), 400
+
         # Create temporary directory for this analysis
         run_id = str(uuid.uuid4())
         temp_dir = os.path.join(tempfile.gettempdir(), f'opencv_analysis_{run_id}')
@@ -200,20 +501,19 @@ def analyze_card_from_url():
         back_metrics = None
 
         if front_path:
-            front_metrics = analyze_side(front_path, output_dir, 'front')
+            front_metrics = analyze_side(front_path, output_dir, 'front', metric_groups=metric_groups, tier=tier,
+                                         quad=front_quad, export=export)
 
         if back_path:
-            back_metrics = analyze_side(back_path, output_dir, 'back')
+            back_metrics = analyze_side(back_path, output_dir, 'back', metric_groups=metric_groups, tier=tier,
+                                        quad=back_quad, export=export)
 
         # Combine metrics
-        combined = CombinedMetrics(
-            front=front_metrics,
-            back=back_metrics,
-            run_id=run_id
-        )
+        combined = combine_sides(front_metrics, back_metrics, run_id=run_id)
 
         # Serialize to JSON
         result = serialize_combined_metrics(combined)
+        publish_exports([result['front'], result['back']], run_id)
 
         # Clean up temp files
         if front_path and os.path.exists(front_path):
@@ -244,7 +544,12 @@ if __name__ == '__main__':
     print('Endpoints:')
     print('  GET  /health                - Health check')
     print('  POST /analyze               - Analyze uploaded images')
+    print('  POST /analyze-burst         - Analyze the best frame of a burst')
+    print('  POST /analyze-multi         - Analyze every card in one photo')
     print('  POST /analyze-url           - Analyze images from URLs')
+    print('  GET  /exports/<name>        - LLM card images delivered by reference')
+    if sock is not None:
+        print(f'  WS   /live-guidance        - Capture guidance, up to {LIVE_MAX_FPS:.0f} fps')
     print('')
     print('Starting server on http://localhost:5000')
     print('Press Ctrl+C to stop')
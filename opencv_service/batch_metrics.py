@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch Metrics
+=============
+
+Edge, corner and lighting metrics for many warped card sides at once, for
+bulk submissions. Sides must share one size (warp them at the same height,
+e.g. WarpPyramid.level(WARP_BASE_HEIGHT)). Each metric stacks the regions it
+reads across the whole batch - border bands, corner patches, full images -
+and runs its conversions, ΔE and counts as single array operations instead
+of one call per card, side and segment.
+
+Results are identical to the single-card functions in card_cv_stage1.py:
+- batch_edge_whitening       detect_edge_whitening
+- batch_corners              analyze_corners
+- batch_brightness_uniformity brightness_uniformity (of the gray image)
+- batch_color_bias_bgr       color_bias_bgr
+
+Exactness notes:
+- color conversions, ΔE and thresholds are per pixel, so stacking does not
+  change them; counts and tile sums are integer sums.
+- connected components run on one canvas with the regions separated by a
+  zero row, so components never join across regions, and are counted per
+  region from their top row.
+- the segment opening is done in numpy with OpenCV's morphology border
+  values (erode pads with 1, dilate with 0) rather than on the full strip.
+- corner Canny takes Sobel gradients computed per patch (replicate border),
+  laid out with zero-gradient gaps, which is what Canny sees at an image edge.
+- corner center resizes stack patches as channels; resize is per channel.
+
+`python benchmark.py batch <image dir>` checks identity and timing.
+"""
+
+from typing import Dict, List, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from card_cv_stage1 import CornerMetrics, EdgeSegmentMetrics, edge_segment_rects
+
+
+# Cards per chunk for full-image metrics (brightness, color bias); border and
+# corner metrics only stack their bands and take the whole batch at once.
+BATCH_CHUNK = 64
+
+# Channels per cv2.resize call when resizing stacked corner patches
+# (OpenCV's Python binding accepts at most a few hundred channels).
+_RESIZE_CHANNELS = 120
+
+Sides = Union[np.ndarray, Sequence[np.ndarray]]
+
+
+def batch_shape(images: Sides) -> Tuple[int, int, int]:
+    """(N, H, W) of a batch. Raises ValueError if the sides differ in size."""
+    if isinstance(images, np.ndarray):
+        if images.ndim != 4:
+            raise ValueError(f"Expected an (N, H, W, 3) array, got shape {images.shape}")
+        return images.shape[0], images.shape[1], images.shape[2]
+    if not images:
+        raise ValueError("Empty batch")
+    shapes = set(img.shape for img in images)
+    if len(shapes) != 1:
+        raise ValueError(f"Batch sides must share one size, got {sorted(shapes)}")
+    h, w = images[0].shape[:2]
+    return len(images), h, w
+
+
+def _stack(images: Sides, ys: slice, xs: slice) -> np.ndarray:
+    """(N, h, w, 3) stack of the same region of every side."""
+    if isinstance(images, np.ndarray):
+        return images[:, ys, xs]
+    return np.stack([img[ys, xs] for img in images])
+
+
+def _convert(stack: np.ndarray, code: int) -> np.ndarray:
+    """cv2.cvtColor over an (N, h, w, 3) stack in one call."""
+    n, h, w = stack.shape[:3]
+    # Conversions are per pixel, so each region is laid out as one image row;
+    # narrow side bands would otherwise be thousands of short rows.
+    out = cv2.cvtColor(np.ascontiguousarray(stack).reshape(n, h * w, 3), code)
+    return out.reshape((n, h, w) + out.shape[2:])
+
+
+def _delta_e(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    # Simple ΔE 1976, same as card_cv_stage1.delta_e_lab. The channel sum is
+    # spelled out in np.sum's order (((c0 + c1) + c2), float32), which avoids a
+    # slow length-3 reduction over the stack.
+    d = lab1.astype(np.float32) - lab2.astype(np.float32)
+    d *= d
+    return np.sqrt(d[..., 0] + d[..., 1] + d[..., 2])
+
+
+def _count_components(masks: np.ndarray) -> np.ndarray:
+    """Connected components (8-connectivity) of each (h, w) mask in an (M, h, w) stack."""
+    m, h, w = masks.shape
+    canvas = np.zeros((m, h + 1, w), np.uint8)
+    canvas[:, :h] = masks > 0
+    n, _, stats, _ = cv2.connectedComponentsWithStats(canvas.reshape(m * (h + 1), w), connectivity=8)
+    return np.bincount(stats[1:n, cv2.CC_STAT_TOP] // (h + 1), minlength=m)
+
+
+def _shift_reduce(masks: np.ndarray, pad_value: int, reduce) -> np.ndarray:
+    """3x3 min/max filter of each mask in an (M, h, w) stack with a constant border."""
+    _, h, w = masks.shape
+    padded = np.pad(masks, ((0, 0), (1, 1), (1, 1)), constant_values=pad_value)
+    out = padded[:, 0:h, 0:w].copy()
+    for dy in range(3):
+        for dx in range(3):
+            if dy or dx:
+                reduce(out, padded[:, dy:dy + h, dx:dx + w], out=out)
+    return out
+
+
+def _open3x3(masks: np.ndarray) -> np.ndarray:
+    """cv2.morphologyEx(MORPH_OPEN, 3x3) of each binary mask in an (M, h, w) stack."""
+    return _shift_reduce(_shift_reduce(masks, 1, np.minimum), 0, np.maximum)
+
+
+def batch_edge_whitening(images: Sides, strip_width: int = 8, segment_splits: int = 3,
+                         delta_e_thresh: float = 8.0) -> List[Dict[str, List[EdgeSegmentMetrics]]]:
+    """detect_edge_whitening() for every side of a batch."""
+    n, h, w = batch_shape(images)
+    sw = strip_width
+    bands = {
+        "top": (slice(0, 2 * sw), slice(None)),
+        "right": (slice(None), slice(w - 2 * sw, w)),
+        "bottom": (slice(h - 2 * sw, h), slice(None)),
+        "left": (slice(None), slice(0, 2 * sw)),
+    }
+    results: List[Dict[str, List[EdgeSegmentMetrics]]] = [
+        {"top": [], "right": [], "bottom": [], "left": []} for _ in range(n)]
+
+    for side, (ys, xs) in bands.items():
+        band = _stack(images, ys, xs)
+        lab = _convert(band, cv2.COLOR_BGR2LAB)
+        gray = _convert(band, cv2.COLOR_BGR2GRAY)
+        # Outer strip vs the strip_width pixels further inward, as CardRoiStats.edge_delta_e
+        if side == "top":
+            de, white = _delta_e(lab[:, 0:sw], lab[:, sw:2 * sw]), gray[:, 0:sw]
+        elif side == "bottom":
+            de, white = _delta_e(lab[:, sw:2 * sw], lab[:, 0:sw]), gray[:, sw:2 * sw]
+        elif side == "left":
+            de, white = _delta_e(lab[:, :, 0:sw], lab[:, :, sw:2 * sw]), gray[:, :, 0:sw]
+        else:
+            de, white = _delta_e(lab[:, :, sw:2 * sw], lab[:, :, 0:sw]), gray[:, :, sw:2 * sw]
+        whitening = (de > delta_e_thresh).astype(np.uint8)
+        white = (white > 240).astype(np.uint8)
+
+        horizontal = side in ("top", "bottom")
+        for i, (a, b) in enumerate(edge_segment_rects(w if horizontal else h, segment_splits)):
+            if horizontal:
+                seg_mask, seg_white = whitening[:, :, a:b], white[:, :, a:b]
+            else:
+                seg_mask, seg_white = whitening[:, a:b, :], white[:, a:b, :]
+            counts = seg_mask.sum(axis=(1, 2), dtype=np.int64)
+            rows = max(1, seg_mask.shape[1])
+            chips = _count_components(_open3x3(seg_mask))
+            dots = _count_components(seg_white)
+            for k in range(n):
+                results[k][side].append(EdgeSegmentMetrics(
+                    segment_name=f"{side}_{i+1}",
+                    whitening_length_px=float(float(counts[k]) / rows),
+                    whitening_count=int(counts[k]),
+                    chips_count=int(chips[k]),
+                    white_dots_count=int(dots[k])
+                ))
+    return results
+
+
+def _canny_patches(gray: np.ndarray, low: float, high: float) -> np.ndarray:
+    """cv2.Canny of each (p, p) patch in an (M, p, p) stack, in one call."""
+    m, p, _ = gray.shape
+    padded = np.pad(gray, ((0, 0), (1, 1), (1, 1)), mode="edge").reshape(m * (p + 2), p + 2)
+    grads = []
+    for dx, dy in ((1, 0), (0, 1)):
+        g = cv2.Sobel(padded, cv2.CV_16S, dx, dy, ksize=3).reshape(m, p + 2, p + 2)
+        canvas = np.zeros((m, p + 1, p), np.int16)
+        canvas[:, :p] = g[:, 1:-1, 1:-1]
+        grads.append(canvas.reshape(m * (p + 1), p))
+    edges = cv2.Canny(grads[0], grads[1], low, high)
+    return edges.reshape(m, p + 1, p)[:, :p]
+
+
+def _resize_patches(patches: np.ndarray, size: int) -> np.ndarray:
+    """cv2.resize(INTER_LINEAR) of each patch in an (M, h, w, 3) stack to (size, size)."""
+    m, h, w, c = patches.shape
+    channels = np.ascontiguousarray(patches.transpose(1, 2, 0, 3)).reshape(h, w, m * c)
+    out = np.concatenate([
+        cv2.resize(np.ascontiguousarray(channels[:, :, i:i + _RESIZE_CHANNELS]), (size, size),
+                   interpolation=cv2.INTER_LINEAR).reshape(size, size, -1)
+        for i in range(0, m * c, _RESIZE_CHANNELS)
+    ], axis=2)
+    return out.reshape(size, size, m, c).transpose(2, 0, 1, 3)
+
+
+def batch_corners(images: Sides, patch_size: int = 80, delta_e_thresh: float = 8.0) -> List[List[CornerMetrics]]:
+    """analyze_corners() for every side of a batch."""
+    n, h, w = batch_shape(images)
+    ps = patch_size
+    names = ("tl", "tr", "bl", "br")
+    spans = {"t": slice(0, ps), "b": slice(h - ps, h), "l": slice(0, ps), "r": slice(w - ps, w)}
+    # (N * 4, ps, ps, 3), card-major in the order of `names`
+    patches = np.stack([_stack(images, spans[c[0]], spans[c[1]]) for c in names], axis=1)
+    patches = patches.reshape(n * 4, ps, ps, 3)
+    lab = _convert(patches, cv2.COLOR_BGR2LAB)
+    gray = _convert(patches, cv2.COLOR_BGR2GRAY)
+
+    edges = _canny_patches(gray, 50, 150)
+    idx, ys, xs = np.nonzero(edges)
+    bounds = np.searchsorted(idx, np.arange(n * 4 + 1))
+
+    center = _resize_patches(lab[:, ps // 4: 3 * ps // 4, ps // 4: 3 * ps // 4], ps)
+    whitening = (_delta_e(lab, center) > delta_e_thresh).sum(axis=(1, 2), dtype=np.int64)
+    dots = _count_components(gray >= 240)
+
+    results: List[List[CornerMetrics]] = []
+    for k in range(n):
+        corners = []
+        for j, name in enumerate(names):
+            m = k * 4 + j
+            a, b = bounds[m], bounds[m + 1]
+            if b - a > 10:
+                pts = np.vstack([xs[a:b], ys[a:b]]).T.astype(np.float32)
+                _, radius = cv2.minEnclosingCircle(pts)
+                rounding = float(radius)
+            else:
+                rounding = 0.0
+            corners.append(CornerMetrics(
+                corner_name=name,
+                rounding_radius_px=rounding,
+                whitening_length_px=float(whitening[m]),
+                white_dots_count=int(dots[m])
+            ))
+        results.append(corners)
+    return results
+
+
+def _chunks(images: Sides, n: int):
+    for i in range(0, n, BATCH_CHUNK):
+        yield _stack(images[i:i + BATCH_CHUNK], slice(None), slice(None))
+
+
+def batch_brightness_uniformity(images: Sides, grid_rows: int = 6, grid_cols: int = 4) -> List[float]:
+    """brightness_uniformity(to_gray(side)) for every side of a batch."""
+    n, h, w = batch_shape(images)
+    tile_h = max(1, h // grid_rows)
+    tile_w = max(1, w // grid_cols)
+    ys = np.array([r * tile_h for r in range(grid_rows)])
+    xs = np.array([c * tile_w for c in range(grid_cols)])
+    areas = np.outer(np.diff(np.append(ys, h)), np.diff(np.append(xs, w)))
+
+    scores = []
+    for chunk in _chunks(images, n):
+        gray = _convert(chunk, cv2.COLOR_BGR2GRAY)
+        sums = np.add.reduceat(np.add.reduceat(gray, xs, axis=2, dtype=np.int64), ys, axis=1)
+        means = (sums / np.maximum(areas, 1)).reshape(len(chunk), -1)
+        std = np.std(means, axis=1) + 1e-6
+        scores.extend(float(s) for s in np.clip(1.0 / (1.0 + std / 20.0), 0.0, 1.0))
+    return scores
+
+
+def batch_color_bias_bgr(images: Sides) -> List[Tuple[float, float, float]]:
+    """color_bias_bgr() for every side of a batch."""
+    n, h, w = batch_shape(images)
+    bias = []
+    for chunk in _chunks(images, n):
+        # Integer channel sums (row sums in OpenCV, then per card), so the mean
+        # is the same double np.mean returns
+        rows = cv2.reduce(np.ascontiguousarray(chunk).reshape(len(chunk) * h, w, 3), 1, cv2.REDUCE_SUM,
+                          dtype=cv2.CV_32S)
+        means = rows.reshape(len(chunk), h, 3).sum(axis=1, dtype=np.int64) / float(h * w)
+        bias.extend((float(b), float(g), float(r)) for b, g, r in means)
+    return bias
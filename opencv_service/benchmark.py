@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the OpenCV Card Analysis pipeline
+================================================
+
+Run against a directory of real card photos (front/back, raw, sleeved, slabbed,
+screenshots) to check that speed-oriented changes keep their decisions intact.
+
+Commands:
+    preflight   Compare thumbnail preflight (extract_preflight_features) with the
+                original full-resolution preflight detectors: profile agreement
+                and per-image latency.
+    pipeline    Run analyze_side twice per image against a fresh stage cache:
+                cold vs warm latency and which stages were served from cache.
+    tiers       Run analyze_side at every fidelity tier: per-tier latency
+                against its latency_target_ms, and centering / defect-count
+                drift from the full tier.
+    batch       Warp every image once, then time the single-card edge / corner /
+                lighting metrics against batch_metrics over a submission-sized
+                batch, and check the results are identical.
+
+Usage:
+    python benchmark.py preflight ./benchmark_images
+    python benchmark.py preflight ./benchmark_images --json results.json --strict
+    python benchmark.py pipeline ./benchmark_images --cache-dir /tmp/stage_cache
+    python benchmark.py tiers ./benchmark_images --strict
+    python benchmark.py batch ./benchmark_images --cards 500
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from batch_metrics import (
+    batch_brightness_uniformity, batch_color_bias_bgr, batch_corners, batch_edge_whitening
+)
+from card_cv_stage1 import (
+    SIDE_PIPELINE, STAGE_RESOLUTION, WARP_BASE_HEIGHT, PreflightFeatures, analyze_background_texture,
+    analyze_corners, analyze_side, brightness_uniformity, color_bias_bgr, crop_ui_bars,
+    detect_edge_whitening, detect_foil_highlights, detect_thick_acrylic_edges, detect_translucent_edges,
+    detect_ui_bars, extract_preflight_features, imread_color, profile_for_features, resize_max_dim, to_gray
+)
+from fidelity_tiers import FIDELITY_TIERS, get_tier
+from illumination import normalize_for_detection
+from pipeline import PipelineRun, StageCache
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def list_images(image_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def load_pipeline_input(path: str) -> np.ndarray:
+    """Image exactly as analyze_side() hands it to detect_card_quadrilateral()."""
+    return normalize_for_detection(resize_max_dim(imread_color(path), 2200))[0]
+
+
+# -----------------------------
+# Preflight
+# -----------------------------
+
+def full_resolution_features(img_bgr: np.ndarray) -> PreflightFeatures:
+    """Reference preflight: the original per-detector full-resolution passes."""
+    t_start = time.perf_counter()
+    h, w = img_bgr.shape[:2]
+    has_ui, top_crop, bottom_crop = detect_ui_bars(img_bgr)
+    is_foil, foil_density = detect_foil_highlights(img_bgr)
+    features = PreflightFeatures(
+        aspect=w / float(h) if h > 0 else 1.0,
+        thumb_width=w,
+        thumb_height=h,
+        ui_top_score=-1.0,
+        ui_bottom_score=-1.0,
+        has_ui_bars=bool(has_ui),
+        ui_top_crop_px=int(top_crop),
+        ui_bottom_crop_px=int(bottom_crop),
+        texture_score=analyze_background_texture(img_bgr),
+        foil_density=float(foil_density),
+        is_foil=bool(is_foil),
+        border_edge_density=-1.0,
+        has_translucent=bool(detect_translucent_edges(img_bgr)),
+        has_acrylic=bool(detect_thick_acrylic_edges(img_bgr)),
+    )
+    features.elapsed_ms = (time.perf_counter() - t_start) * 1000.0
+    return features
+
+
+def preflight_profile(img_bgr: np.ndarray, extractor) -> Dict[str, any]:
+    """Profile choice as detect_card_quadrilateral() makes it (UI bars cropped first)."""
+    t_start = time.perf_counter()
+    features = extractor(img_bgr)
+    if features.has_ui_bars:
+        img_bgr = crop_ui_bars(img_bgr, features)
+        features = extractor(img_bgr)
+    profile, reason = profile_for_features(features)
+    return {
+        "profile": profile.name,
+        "reason": reason,
+        "elapsed_ms": (time.perf_counter() - t_start) * 1000.0,
+        "features": features.to_dict(),
+    }
+
+
+def run_preflight(image_dir: str) -> Dict[str, any]:
+    rows = []
+    for path in list_images(image_dir):
+        img = load_pipeline_input(path)
+        reference = preflight_profile(img, full_resolution_features)
+        thumbnail = preflight_profile(img, extract_preflight_features)
+        rows.append({
+            "image": os.path.basename(path),
+            "reference": reference,
+            "thumbnail": thumbnail,
+            "match": reference["profile"] == thumbnail["profile"],
+        })
+        flag = "  " if rows[-1]["match"] else "!!"
+        print(f"{flag} {rows[-1]['image']:32s} full={reference['profile']:17s} {reference['elapsed_ms']:7.1f}ms"
+              f"   thumb={thumbnail['profile']:17s} {thumbnail['elapsed_ms']:6.1f}ms")
+
+    if not rows:
+        return {"images": 0}
+
+    matches = sum(r["match"] for r in rows)
+    summary = {
+        "images": len(rows),
+        "profile_agreement": matches / float(len(rows)),
+        "mismatches": [r["image"] for r in rows if not r["match"]],
+        "reference_ms_mean": float(np.mean([r["reference"]["elapsed_ms"] for r in rows])),
+        "thumbnail_ms_mean": float(np.mean([r["thumbnail"]["elapsed_ms"] for r in rows])),
+        "thumbnail_ms_max": float(np.max([r["thumbnail"]["elapsed_ms"] for r in rows])),
+        "rows": rows,
+    }
+    print(f"\nProfile agreement: {matches}/{len(rows)} ({summary['profile_agreement']:.0%})")
+    print(f"Preflight time: full-res {summary['reference_ms_mean']:.1f}ms mean, "
+          f"thumbnail {summary['thumbnail_ms_mean']:.1f}ms mean / {summary['thumbnail_ms_max']:.1f}ms max")
+    return summary
+
+
+def run_pipeline_cache(image_dir: str, cache_dir: str) -> Dict[str, any]:
+    cache = StageCache(directory=cache_dir)
+    outdir = os.path.join(cache_dir, "_debug")
+    rows = []
+    for path in list_images(image_dir):
+        name = os.path.basename(path)
+        timings = []
+        for _ in range(2):
+            t_start = time.perf_counter()
+            side = analyze_side(path, outdir, os.path.splitext(name)[0], cache=cache)
+            timings.append(((time.perf_counter() - t_start) * 1000.0, side.pipeline or {}))
+        (cold_ms, _), (warm_ms, warm) = timings
+        rows.append({
+            "image": name,
+            "cold_ms": cold_ms,
+            "warm_ms": warm_ms,
+            "warm_computed": warm.get("computed", []),
+            "warm_cached": warm.get("cached", []),
+        })
+        print(f"   {name:32s} cold {cold_ms:7.1f}ms   warm {warm_ms:7.1f}ms   "
+              f"recomputed: {','.join(rows[-1]['warm_computed']) or '-'}")
+
+    if not rows:
+        return {"images": 0}
+
+    summary = {
+        "images": len(rows),
+        "cold_ms_mean": float(np.mean([r["cold_ms"] for r in rows])),
+        "warm_ms_mean": float(np.mean([r["warm_ms"] for r in rows])),
+        "rows": rows,
+    }
+    print(f"\nAnalyze time: cold {summary['cold_ms_mean']:.1f}ms mean, warm {summary['warm_ms_mean']:.1f}ms mean")
+    return summary
+
+
+def run_tiers(image_dir: str) -> Dict[str, any]:
+    no_cache = StageCache()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="tier_debug_") as outdir:
+        for path in list_images(image_dir):
+            name = os.path.basename(path)
+            row = {"image": name}
+            for tier in FIDELITY_TIERS:
+                t_start = time.perf_counter()
+                side = analyze_side(path, outdir, os.path.splitext(name)[0], cache=no_cache, tier=tier)
+                row[tier] = {
+                    "elapsed_ms": (time.perf_counter() - t_start) * 1000.0,
+                    "method": (side.detection_metadata or {}).get("method"),
+                    "lr_ratio": side.centering.lr_ratio[0] if side.centering else None,
+                    "tb_ratio": side.centering.tb_ratio[0] if side.centering else None,
+                    "white_dots": side.surface.white_dots_count if side.surface else None,
+                }
+            rows.append(row)
+            print(f"   {name:32s} " + "   ".join(f"{t}={row[t]['elapsed_ms']:7.1f}ms" for t in FIDELITY_TIERS))
+
+    if not rows:
+        return {"images": 0}
+
+    summary = {"images": len(rows), "tiers": {}, "rows": rows}
+    print("")
+    for tier, spec in FIDELITY_TIERS.items():
+        times = [r[tier]["elapsed_ms"] for r in rows]
+        # Centering drift (percentage points of the left/top share) against the full tier
+        drift = [max(abs(r[tier][k] - r["full"][k]) for k in ("lr_ratio", "tb_ratio"))
+                 for r in rows if "full" in r and r[tier]["lr_ratio"] is not None and r["full"]["lr_ratio"] is not None]
+        stats = {
+            "p50_ms": float(np.percentile(times, 50)),
+            "p90_ms": float(np.percentile(times, 90)),
+            "target_ms": spec.latency_target_ms,
+            "meets_target": float(np.percentile(times, 50)) <= spec.latency_target_ms,
+            "centering_drift_max_pct": float(max(drift)) if drift else None,
+        }
+        summary["tiers"][tier] = stats
+        flag = "  " if stats["meets_target"] else "!!"
+        drift_txt = f"{stats['centering_drift_max_pct']:.2f}pp" if drift else "-"
+        print(f"{flag} {tier:9s} p50 {stats['p50_ms']:7.1f}ms  p90 {stats['p90_ms']:7.1f}ms  "
+              f"target {spec.latency_target_ms:7.1f}ms  centering drift vs full {drift_txt}")
+    return summary
+
+
+def run_batch(image_dir: str, cards: int) -> Dict[str, any]:
+    warped = []
+    for path in list_images(image_dir):
+        run = PipelineRun(SIDE_PIPELINE, sources={"image_path": path, "tier": get_tier(), "quad_hint": None,
+                                                    "export_options": None},
+                          cache=StageCache())
+        warped.append(run.get("warp").level(WARP_BASE_HEIGHT))
+    if not warped:
+        return {"cards": 0}
+
+    # Same-size batch: every side at the first side's size, repeated up to `cards`
+    h, w = warped[0].shape[:2]
+    sides = [cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA) for img in warped]
+    sides = [sides[i % len(sides)] for i in range(cards)]
+    scale = STAGE_RESOLUTION["lighting"] / float(h)
+    overviews = [cv2.resize(img, (int(round(w * scale)), STAGE_RESOLUTION["lighting"]),
+                            interpolation=cv2.INTER_AREA) for img in sides]
+
+    t_start = time.perf_counter()
+    single = (
+        [detect_edge_whitening(img) for img in sides],
+        [analyze_corners(img) for img in sides],
+        [brightness_uniformity(to_gray(img)) for img in overviews],
+        [color_bias_bgr(img) for img in overviews],
+    )
+    single_ms = (time.perf_counter() - t_start) * 1000.0
+
+    t_start = time.perf_counter()
+    batch = (
+        batch_edge_whitening(sides),
+        batch_corners(sides),
+        batch_brightness_uniformity(overviews),
+        batch_color_bias_bgr(overviews),
+    )
+    batch_ms = (time.perf_counter() - t_start) * 1000.0
+
+    names = ("edges", "corners", "brightness_uniformity", "color_bias")
+    identical = {name: a == b for name, a, b in zip(names, single, batch)}
+    summary = {
+        "cards": cards,
+        "card_size": [w, h],
+        "single_ms": single_ms,
+        "batch_ms": batch_ms,
+        "speedup": single_ms / max(batch_ms, 1e-6),
+        "identical": identical,
+    }
+    print(f"{cards} cards at {w}x{h}: single {single_ms:.1f}ms ({single_ms / cards:.2f}ms/card), "
+          f"batch {batch_ms:.1f}ms ({batch_ms / cards:.2f}ms/card), x{summary['speedup']:.2f}")
+    for name, same in identical.items():
+        print(f"{'  ' if same else '!!'} {name:22s} {'identical' if same else 'DIFFERS'}")
+    return summary
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the OpenCV card analysis pipeline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pre = sub.add_parser("preflight", help="Thumbnail vs full-resolution preflight profile agreement")
+    pre.add_argument("image_dir", help="Directory of benchmark photos")
+    pre.add_argument("--json", dest="json_path", help="Write full results to this JSON file")
+    pre.add_argument("--strict", action="store_true", help="Exit non-zero on any profile mismatch")
+
+    pipe = sub.add_parser("pipeline", help="Cold vs warm analyze_side latency with the stage cache")
+    pipe.add_argument("image_dir", help="Directory of benchmark photos")
+    pipe.add_argument("--cache-dir", help="Stage cache directory (default: a temporary directory)")
+    pipe.add_argument("--json", dest="json_path", help="Write full results to this JSON file")
+
+    tiers = sub.add_parser("tiers", help="Latency of each fidelity tier against its target")
+    tiers.add_argument("image_dir", help="Directory of benchmark photos")
+    tiers.add_argument("--json", dest="json_path", help="Write full results to this JSON file")
+    tiers.add_argument("--strict", action="store_true", help="Exit non-zero if any tier misses its p50 target")
+
+    batch = sub.add_parser("batch", help="Single-card vs batch metric latency and identity")
+    batch.add_argument("image_dir", help="Directory of benchmark photos")
+    batch.add_argument("--cards", type=int, default=500, help="Batch size (images are repeated to fill it)")
+    batch.add_argument("--json", dest="json_path", help="Write full results to this JSON file")
+    batch.add_argument("--strict", action="store_true", help="Exit non-zero if any batch metric differs")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.command == "preflight":
+        summary = run_preflight(args.image_dir)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        if args.strict and summary.get("mismatches"):
+            sys.exit(1)
+    elif args.command == "pipeline":
+        if args.cache_dir:
+            summary = run_pipeline_cache(args.image_dir, args.cache_dir)
+        else:
+            with tempfile.TemporaryDirectory(prefix="stage_cache_") as cache_dir:
+                summary = run_pipeline_cache(args.image_dir, cache_dir)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+    elif args.command == "tiers":
+        summary = run_tiers(args.image_dir)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        if args.strict and not all(t["meets_target"] for t in summary.get("tiers", {}).values()):
+            sys.exit(1)
+    elif args.command == "batch":
+        summary = run_batch(args.image_dir, args.cards)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        if args.strict and not all(summary.get("identical", {}).values()):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
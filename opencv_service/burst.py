@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Burst Capture
+=============
+
+Picks the best frame of a short capture burst for one card side, so a
+motion-blurred or glare-struck frame is not the one that gets graded.
+
+Every frame is scored with the image quality gate (assess_image_quality) on
+a reduced decode - JPEG frames are decoded at 1/2 to 1/8 size by libjpeg's
+DCT scaling, which is much cheaper than a full decode - and only the
+winning frame goes through analyze_side().
+
+Frame score (0-100):
+- focus        Laplacian variance relative to the sharpest frame of the burst
+               (bursts share exposure and framing, so relative focus
+               separates shake from a sharp frame better than a fixed scale)
+- presence     card_presence_score of the gate: a card-shaped outline in frame
+- glare        1 - glare coverage / MAX_GLARE_PERCENT
+Frames that fail the gate rank below every frame that passes.
+
+Usage:
+    python burst.py frame1.jpg frame2.jpg frame3.jpg --side front --outdir ./out
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import quality_gate
+from card_cv_stage1 import SideMetrics, analyze_side, assess_image_quality, ensure_outdir, serialize_side_metrics
+from pipeline import STAGE_WORKERS, StageCache
+
+
+# Most frames accepted per side
+MAX_BURST_FRAMES = 12
+
+# Score weights
+BURST_FOCUS_WEIGHT = 0.5
+BURST_PRESENCE_WEIGHT = 0.3
+BURST_GLARE_WEIGHT = 0.2
+
+# Reduced decodes, largest reduction first; a frame is scored on the first
+# whose longest side still covers the gate thumbnail
+_REDUCED_DECODES = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                    (2, cv2.IMREAD_REDUCED_COLOR_2), (1, cv2.IMREAD_COLOR))
+
+
+@dataclass
+class BurstFrameScore:
+    index: int
+    filename: str
+    score: float
+    passed: bool                # image quality gate verdict
+    reasons: List[str]
+    focus_variance: float
+    glare_coverage_percent: float
+    card_presence: float
+    decode_factor: int          # 1/n reduced decode the frame was scored on
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+@dataclass
+class BurstResult:
+    side: SideMetrics           # full analysis of the selected frame
+    selected_index: int
+    frames: List[BurstFrameScore]
+    scoring_ms: float = 0.0
+    analysis_ms: float = 0.0
+
+
+def _decode_for_scoring(path: str, factor: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """(image, factor): the frame decoded at 1/factor size (factor None = pick from the frame)."""
+    for n, flag in _REDUCED_DECODES:
+        if factor is not None and n != factor:
+            continue
+        img = cv2.imread(path, flag)
+        if img is None:
+            raise FileNotFoundError(f"Could not read image: {path}")
+        if factor is not None or n == 1 or max(img.shape[:2]) >= quality_gate.GATE_THUMB_DIM:
+            return img, n
+    raise ValueError(f"Unknown decode factor: {factor}")
+
+
+def score_frames(frame_paths: List[str], parallel: bool = True) -> List[BurstFrameScore]:
+    """Gate and score every frame; returns scores in input order."""
+    # Frames of one burst share a resolution: the first frame picks the
+    # reduction for all, so focus is compared at one scale
+    first, factor = _decode_for_scoring(frame_paths[0])
+
+    def gate(i: int):
+        t_start = time.perf_counter()
+        img = first if i == 0 else _decode_for_scoring(frame_paths[i], factor)[0]
+        return assess_image_quality(img), (time.perf_counter() - t_start) * 1000.0
+
+    if parallel and len(frame_paths) > 1:
+        with ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="burst") as pool:
+            gates = list(pool.map(gate, range(len(frame_paths))))
+    else:
+        gates = [gate(i) for i in range(len(frame_paths))]
+
+    max_focus = max(g.focus_variance for g, _ in gates) or 1.0
+    frames = []
+    for i, (g, elapsed_ms) in enumerate(gates):
+        glare_term = max(0.0, 1.0 - g.glare_coverage_percent / quality_gate.MAX_GLARE_PERCENT)
+        score = 100.0 * (BURST_FOCUS_WEIGHT * g.focus_variance / max_focus +
+                         BURST_PRESENCE_WEIGHT * min(1.0, g.card_presence) +
+                         BURST_GLARE_WEIGHT * glare_term)
+        frames.append(BurstFrameScore(
+            index=i,
+            filename=os.path.basename(frame_paths[i]),
+            score=round(score, 2),
+            passed=g.passed,
+            reasons=g.reasons,
+            focus_variance=g.focus_variance,
+            glare_coverage_percent=g.glare_coverage_percent,
+            card_presence=g.card_presence,
+            decode_factor=factor,
+            elapsed_ms=elapsed_ms,
+        ))
+    return frames
+
+
+def select_frame(frames: List[BurstFrameScore]) -> BurstFrameScore:
+    """Best frame: passing frames first, then score, then the earliest."""
+    return max(frames, key=lambda f: (f.passed, f.score, -f.index))
+
+
+def analyze_burst(frame_paths: List[str], outdir: str, side_label: str,
+                  metric_groups: Optional[List[str]] = None, tier=None,
+                  cache: Optional[StageCache] = None) -> BurstResult:
+    """
+    Score every frame of a burst and run analyze_side() on the best one.
+
+    Options are as in analyze_side(). If no frame passes the quality gate the
+    best frame is still analyzed, which returns its reshoot-required result.
+    """
+    if not frame_paths:
+        raise ValueError("Burst has no frames")
+    if len(frame_paths) > MAX_BURST_FRAMES:
+        raise ValueError(f"Burst has {len(frame_paths)} frames; at most {MAX_BURST_FRAMES} are accepted")
+
+    t_start = time.perf_counter()
+    frames = score_frames(frame_paths)
+    best = select_frame(frames)
+    scoring_ms = (time.perf_counter() - t_start) * 1000.0
+    print(f"[Burst] {side_label}: frame {best.index + 1}/{len(frames)} selected "
+          f"(score {best.score:.1f}, {'pass' if best.passed else 'no frame passed'}) in {scoring_ms:.0f}ms")
+
+    t_analysis = time.perf_counter()
+    side = analyze_side(frame_paths[best.index], outdir, side_label, cache=cache,
+                        metric_groups=metric_groups, tier=tier)
+    return BurstResult(
+        side=side,
+        selected_index=best.index,
+        frames=frames,
+        scoring_ms=scoring_ms,
+        analysis_ms=(time.perf_counter() - t_analysis) * 1000.0,
+    )
+
+
+def serialize_burst(data: BurstResult) -> Dict:
+    """Frame scores and selection; the side's metrics are serialized separately."""
+    return {
+        "selected_index": data.selected_index,
+        "frame_count": len(data.frames),
+        "scoring_ms": data.scoring_ms,
+        "analysis_ms": data.analysis_ms,
+        "frames": [f.to_dict() for f in data.frames],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pick the best frame of a burst and analyze it.")
+    parser.add_argument("frames", type=str, nargs="+", help="Paths to the burst frames of one side")
+    parser.add_argument("--side", type=str, default="front", help="Side label (front or back)")
+    parser.add_argument("--outdir", type=str, default="./out", help="Output directory for metrics and visualizations")
+    parser.add_argument("--tier", type=str, default=None, help="Fidelity tier (default: standard)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    ensure_outdir(args.outdir)
+    result = analyze_burst(args.frames, args.outdir, args.side, tier=args.tier)
+    out = serialize_burst(result)
+    out[args.side] = serialize_side_metrics(result.side)
+    json_path = os.path.join(args.outdir, f"stage1_burst_{args.side}_metrics.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    print(f"Selected frame {result.selected_index + 1} of {len(result.frames)}; saved metrics to: {json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,10 @@ try:
 except ImportError:
     raise SystemExit("grading_criteria.py not found. Ensure it's in the same directory.")
 
+from crease_detector import CreaseCandidate, detect_creases
+from pipeline import get_stage_executor
+from roi_stats import CardRoiStats, IntegralImage
+
 
 # =============================================================================
 # Enhanced Data Classes with Severity Classification
@@ -101,6 +105,7 @@ class SurfaceMetricsEnhanced:
     lighting_uniformity_score: float
     color_bias_bgr: Tuple[float, float, float]
     structural_damage_suspected: bool = False
+    creases: List[CreaseCandidate] = field(default_factory=list)
 
 
 @dataclass
@@ -187,23 +192,15 @@ def auto_contrast(img_gray: np.ndarray) -> np.ndarray:
 
 
 def variance_of_laplacian(img_gray: np.ndarray) -> float:
-    return float(cv2.Laplacian(img_gray, cv2.CV_64F).var())
-
-
-def brightness_uniformity(img_gray: np.ndarray, grid_rows: int = 6, grid_cols: int = 4) -> float:
-    h, w = img_gray.shape[:2]
-    tile_h = max(1, h // grid_rows)
-    tile_w = max(1, w // grid_cols)
-    means = []
-    for r in range(grid_rows):
-        for c in range(grid_cols):
-            y0 = r * tile_h
-            x0 = c * tile_w
-            y1 = h if r == grid_rows - 1 else (r + 1) * tile_h
-            x1 = w if c == grid_cols - 1 else (c + 1) * tile_w
-            tile = img_gray[y0:y1, x0:x1]
-            means.append(float(np.mean(tile)))
-    means = np.array(means)
+    # int16 holds the 3x3 Laplacian of uint8 exactly; meanStdDev needs no float copy
+    _, std = cv2.meanStdDev(cv2.Laplacian(img_gray, cv2.CV_16S))
+    return float(std[0, 0] ** 2)
+
+
+def brightness_uniformity(img_gray: np.ndarray, grid_rows: int = 6, grid_cols: int = 4,
+                          luminance: Optional[IntegralImage] = None) -> float:
+    luminance = luminance or IntegralImage(img_gray)
+    means = luminance.grid_means(grid_rows, grid_cols).ravel()
     std = float(np.std(means) + 1e-6)
     score = 1.0 / (1.0 + std / 20.0)
     return float(np.clip(score, 0.0, 1.0))
@@ -414,52 +411,39 @@ def delta_e_lab(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
     return np.sqrt(np.sum((lab1.astype(np.float32) - lab2.astype(np.float32)) ** 2, axis=2))
 
 
-def detect_edge_whitening_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) -> Dict[str, List[EdgeSegmentMetricsEnhanced]]:
-    h, w = img_bgr.shape[:2]
+def detect_edge_whitening_enhanced(img_bgr: np.ndarray, pixels_per_mm: float,
+                                   stats: Optional[CardRoiStats] = None) -> Dict[str, List[EdgeSegmentMetricsEnhanced]]:
+    stats = stats or CardRoiStats(img_bgr)
+    h, w = stats.height, stats.width
     strip_width = EDGE_THRESHOLDS["strip_width_px"]
     segment_splits = EDGE_THRESHOLDS["segment_splits"]
-
-    strips = {
-        "top": img_bgr[0:strip_width, :, :],
-        "bottom": img_bgr[h - strip_width:h, :, :],
-        "left": img_bgr[:, 0:strip_width, :],
-        "right": img_bgr[:, w - strip_width:w, :],
-    }
+    # threshold(..., white_dot_threshold) keeps pixels strictly above it
+    white_min = SURFACE_THRESHOLDS["white_dot_threshold"] + 1
 
     results: Dict[str, List[EdgeSegmentMetricsEnhanced]] = {
         "top": [], "right": [], "bottom": [], "left": []
     }
 
-    for side, strip in strips.items():
-        side_len = strip.shape[1] if side in ("top", "bottom") else strip.shape[0]
+    for side in results:
+        whitening, whitening_sat = stats.edge_whitening(side, strip_width, DELTA_E_THRESHOLDS["whitening"])
+        white_mask, _ = stats.border_white(side, strip_width, white_min)
+        side_len = w if side in ("top", "bottom") else h
         seg_len = side_len // segment_splits if segment_splits > 0 else side_len
 
         for i in range(segment_splits):
+            a = i * seg_len
+            b = side_len if i == segment_splits - 1 else (i + 1) * seg_len
             if side in ("top", "bottom"):
-                x0 = i * seg_len
-                x1 = side_len if i == segment_splits - 1 else (i + 1) * seg_len
-                if side == "top":
-                    roi = img_bgr[0:strip_width, x0:x1]
-                    adj = img_bgr[strip_width:strip_width * 2, x0:x1]
-                else:
-                    roi = img_bgr[h - strip_width:h, x0:x1]
-                    adj = img_bgr[h - 2 * strip_width:h - strip_width, x0:x1]
+                rect = (a, 0, b, strip_width)
+                whitening_mask = whitening[:, a:b]
+                thr = white_mask[:, a:b]
             else:
-                y0 = i * seg_len
-                y1 = side_len if i == segment_splits - 1 else (i + 1) * seg_len
-                if side == "left":
-                    roi = img_bgr[y0:y1, 0:strip_width]
-                    adj = img_bgr[y0:y1, strip_width:2 * strip_width]
-                else:
-                    roi = img_bgr[y0:y1, w - strip_width:w]
-                    adj = img_bgr[y0:y1, w - 2 * strip_width:w - strip_width]
-
-            roi_lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
-            adj_lab = cv2.cvtColor(adj, cv2.COLOR_BGR2LAB)
-
-            de = delta_e_lab(roi_lab, adj_lab)
-            whitening_mask = (de > DELTA_E_THRESHOLDS["whitening"]).astype(np.uint8)
-            whitening_length_px = float(np.sum(whitening_mask > 0) / max(1, whitening_mask.shape[0]))
+                rect = (0, a, strip_width, b)
+                whitening_mask = whitening[a:b, :]
+                thr = white_mask[a:b, :]
+
+            whitening_count = whitening_sat.sum(rect)
+            whitening_length_px = float(whitening_count / max(1, whitening_mask.shape[0]))
             whitening_length_mm = pixels_to_mm(whitening_length_px, h)
 
             # Classify whitening severity
@@ -472,8 +456,6 @@ def detect_edge_whitening_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) ->
             total_chip_area_mm = pixels_to_mm(np.sum(chips_mask), h)
             chips_severity = classify_defect_severity(total_chip_area_mm).value
 
-            gray = to_gray(roi)
-            _, thr = cv2.threshold(gray, SURFACE_THRESHOLDS["white_dot_threshold"], 255, cv2.THRESH_BINARY)
             dots_count, _ = cv2.connectedComponents(thr)
 
             # Create detailed defect list
@@ -493,7 +475,7 @@ def detect_edge_whitening_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) ->
                 whitening_length_px=float(whitening_length_px),
                 whitening_length_mm=float(whitening_length_mm),
                 whitening_severity=whitening_severity,
-                whitening_count=int(np.sum(whitening_mask)),
+                whitening_count=int(whitening_count),
                 chips_count=max(0, chips_count - 1),
                 chips_severity=chips_severity,
                 white_dots_count=max(0, dots_count - 1),
@@ -507,21 +489,16 @@ def detect_edge_whitening_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) ->
 # Enhanced Corner Analysis
 # =============================================================================
 
-def analyze_corners_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) -> List[CornerMetricsEnhanced]:
-    h, w = img_bgr.shape[:2]
+def analyze_corners_enhanced(img_bgr: np.ndarray, pixels_per_mm: float,
+                             stats: Optional[CardRoiStats] = None) -> List[CornerMetricsEnhanced]:
+    stats = stats or CardRoiStats(img_bgr)
+    h, w = stats.height, stats.width
     patch_size = CORNER_THRESHOLDS["patch_size_px"]
 
-    corners = {
-        "tl": img_bgr[0:patch_size, 0:patch_size],
-        "tr": img_bgr[0:patch_size, w - patch_size:w],
-        "bl": img_bgr[h - patch_size:h, 0:patch_size],
-        "br": img_bgr[h - patch_size:h, w - patch_size:w],
-    }
-
     out: List[CornerMetricsEnhanced] = []
 
-    for name, patch in corners.items():
-        gray = to_gray(patch)
+    for name in ("tl", "tr", "bl", "br"):
+        gray = stats.corner_gray(name, patch_size)
         edges = cv2.Canny(gray, 50, 150)
         ys, xs = np.where(edges > 0)
 
@@ -535,7 +512,7 @@ def analyze_corners_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) -> List[
         rounding_mm = pixels_to_mm(rounding_px, h)
         rounding_severity = classify_defect_severity(rounding_mm).value
 
-        lab = cv2.cvtColor(patch, cv2.COLOR_BGR2LAB)
+        lab = stats.corner_lab(name, patch_size)
         center = lab[patch_size // 4: 3 * patch_size // 4, patch_size // 4: 3 * patch_size // 4]
         border = lab
         center_resized = cv2.resize(center, (border.shape[1], border.shape[0]), interpolation=cv2.INTER_LINEAR)
@@ -545,7 +522,7 @@ def analyze_corners_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) -> List[
         whitening_length_mm = pixels_to_mm(whitening_length_px, h)
         whitening_severity = classify_defect_severity(whitening_length_mm).value
 
-        dots = cv2.inRange(to_gray(patch), SURFACE_THRESHOLDS["white_dot_threshold"], 255)
+        dots = stats.corner_white(name, patch_size, SURFACE_THRESHOLDS["white_dot_threshold"])
         dots_count, _ = cv2.connectedComponents(dots)
 
         # Create detailed defect list
@@ -590,59 +567,41 @@ def analyze_corners_enhanced(img_bgr: np.ndarray, pixels_per_mm: float) -> List[
 # Enhanced Surface Analysis with Crease Detection
 # =============================================================================
 
-def detect_crease_indicators(img_bgr: np.ndarray, pixels_per_mm: float) -> Tuple[int, List[str]]:
+def detect_crease_indicators(img_bgr: np.ndarray, pixels_per_mm: float,
+                             creases: Optional[List[CreaseCandidate]] = None) -> Tuple[int, List[str]]:
     """
     Detect potential crease indicators using Phase 1 criteria.
     Returns count and list of indicators found.
-    """
-    gray = to_gray(img_bgr)
-    indicators = []
-
-    # Use Scharr operator for gradient analysis (depth variation detection)
-    scharrx = cv2.Scharr(gray, cv2.CV_64F, 1, 0)
-    scharry = cv2.Scharr(gray, cv2.CV_64F, 0, 1)
-    mag = cv2.magnitude(scharrx, scharry)
-    mag = (mag / (mag.max() + 1e-6) * 255).astype(np.uint8)
-    _, thr = cv2.threshold(mag, 30, 255, cv2.THRESH_BINARY)
-    thr = cv2.morphologyEx(thr, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8), iterations=1)
-
-    contours, _ = cv2.findContours(thr, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    crease_like_count = 0
-    min_len_mm = 5.0  # Creases typically span significant length
-
-    for cnt in contours:
-        x, y, w_cnt, h_cnt = cv2.boundingRect(cnt)
-        length_px = max(w_cnt, h_cnt)
-        length_mm = pixels_to_mm(length_px, img_bgr.shape[0])
-
-        if length_mm >= min_len_mm:
-            crease_like_count += 1
-            indicators.append(f"depth_variation_{length_mm:.1f}mm")
-
-    # Detect gloss breaks (would need glossiness analysis - simplified here)
-    # This is a placeholder for more sophisticated gloss detection
 
-    return crease_like_count, indicators
+    Creases come from the multi-scale detector (long low-contrast shading
+    ridges confirmed at full resolution); pass them in if already computed.
+    """
+    if creases is None:
+        creases = detect_creases(img_bgr)
+    indicators = [f"depth_variation_{c.length_mm:.1f}mm" for c in creases]
+    return len(creases), indicators
 
 
 def compute_surface_metrics_enhanced(img_bgr: np.ndarray, glare_mask: np.ndarray,
-                                      pixels_per_mm: float) -> SurfaceMetricsEnhanced:
+                                      pixels_per_mm: float,
+                                      stats: Optional[CardRoiStats] = None) -> SurfaceMetricsEnhanced:
+    stats = stats or CardRoiStats(img_bgr, glare_mask=glare_mask)
     h, w = img_bgr.shape[:2]
+    gray = stats.gray
 
     # Focus and lighting
-    focus = variance_of_laplacian(to_gray(img_bgr))
-    light_score = brightness_uniformity(to_gray(img_bgr))
+    focus = variance_of_laplacian(gray)
+    light_score = brightness_uniformity(gray, luminance=stats.luminance())
     bias = color_bias_bgr(img_bgr)
 
     # White dots detection
-    gray = to_gray(img_bgr)
     _, thr = cv2.threshold(gray, SURFACE_THRESHOLDS["white_dot_threshold"], 255, cv2.THRESH_BINARY)
     thr = cv2.morphologyEx(thr, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8), iterations=1)
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(thr, connectivity=8)
+    num_labels, labels, cc_stats, centroids = cv2.connectedComponentsWithStats(thr, connectivity=8)
 
     dots_count = 0
     for i in range(1, num_labels):
-        area = stats[i, cv2.CC_STAT_AREA]
+        area = cc_stats[i, cv2.CC_STAT_AREA]
         if SURFACE_THRESHOLDS["white_dot_min_area"] <= area <= SURFACE_THRESHOLDS["white_dot_max_area"]:
             dots_count += 1
 
@@ -665,8 +624,8 @@ def compute_surface_metrics_enhanced(img_bgr: np.ndarray, glare_mask: np.ndarray
 
     scratch_details = []
     if lines is not None:
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
+        # (N, 1, 4) or (N, 4) depending on the OpenCV version
+        for x1, y1, x2, y2 in lines.reshape(-1, 4):
             length_px = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
             length_mm = pixels_to_mm(length_px, h)
             severity = classify_defect_severity(length_mm).value
@@ -681,10 +640,11 @@ def compute_surface_metrics_enhanced(img_bgr: np.ndarray, glare_mask: np.ndarray
             ))
 
     # Crease detection
-    crease_count, crease_indicators = detect_crease_indicators(img_bgr, pixels_per_mm)
+    creases = detect_creases(img_bgr, glare_mask=glare_mask)
+    crease_count, crease_indicators = detect_crease_indicators(img_bgr, pixels_per_mm, creases)
     structural_suspected = crease_count > 0
 
-    glare_percent = float(100.0 * np.sum(glare_mask > 0) / float(h * w))
+    glare_percent = float(100.0 * stats.glare_fraction())
 
     return SurfaceMetricsEnhanced(
         white_dots_count=dots_count,
@@ -697,7 +657,8 @@ def compute_surface_metrics_enhanced(img_bgr: np.ndarray, glare_mask: np.ndarray
         focus_variance=focus,
         lighting_uniformity_score=light_score,
         color_bias_bgr=bias,
-        structural_damage_suspected=structural_suspected
+        structural_damage_suspected=structural_suspected,
+        creases=creases
     )
 
 
@@ -840,10 +801,18 @@ def analyze_side_enhanced(image_path: str, outdir: str, side_label: str) -> Side
     glare_mask = detect_glare_mask(warped)
     sleeve, top_loader, slab = detect_sleeve_like_features(warped)
 
-    centering = measure_centering_enhanced(warped, mask, pixels_per_mm)
-    edge_metrics = detect_edge_whitening_enhanced(warped, pixels_per_mm)
-    corner_metrics = analyze_corners_enhanced(warped, pixels_per_mm)
-    surface_metrics = compute_surface_metrics_enhanced(warped, glare_mask, pixels_per_mm)
+    # The four measurements only read the warped card: run them on the shared
+    # stage pool and collect in a fixed order.
+    roi_stats = CardRoiStats(warped, glare_mask=glare_mask)
+    pool = get_stage_executor()
+    surface_future = pool.submit(compute_surface_metrics_enhanced, warped, glare_mask, pixels_per_mm, stats=roi_stats)
+    edge_future = pool.submit(detect_edge_whitening_enhanced, warped, pixels_per_mm, stats=roi_stats)
+    corner_future = pool.submit(analyze_corners_enhanced, warped, pixels_per_mm, stats=roi_stats)
+    centering_future = pool.submit(measure_centering_enhanced, warped, mask, pixels_per_mm)
+    centering = centering_future.result()
+    edge_metrics = edge_future.result()
+    corner_metrics = corner_future.result()
+    surface_metrics = surface_future.result()
 
     overlay = draw_overlays_enhanced(warped, edge_metrics, corner_metrics, glare_mask)
 
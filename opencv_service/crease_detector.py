@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-Scale Crease Detector
+===========================
+
+Creases show up as long, straight, shallow shading valleys or ridges that run
+across the artwork and leave its texture intact. Printed lines are step edges,
+crisp strokes or dark rules that hide what is under them. The detector works
+in two scales:
+
+1. Search (CREASE_SEARCH_HEIGHT level, ~4.5 px/mm): an oriented line filter
+   (second derivative of a Gaussian across the line, a long Gaussian along it)
+   at CREASE_RIDGE_ORIENTATIONS angles. Averaging along the line cancels
+   artwork texture while a straight crease adds up. A response is dropped only
+   where the same filter's edge response is stronger, i.e. where a step edge
+   is coherent along that line, so creases crossing busy artwork survive.
+   The thinned map goes through HoughLinesP; collinear pieces are merged and
+   the strongest CREASE_MAX_CANDIDATES go on.
+2. Confirm (full resolution): each candidate is resampled into a narrow strip
+   along its axis (cv2.warpAffine, +-CREASE_BAND_MM), re-aimed through the
+   valley in each half, and split into chunks. A chunk confirms when its
+   cross-profile dips (or peaks) below both flanks at the line's offset, with
+   crease-like depth and width. The confirmed run must keep one depth
+   consistently (significance), not exceed printed-ink depth, and keep the
+   flank texture on its axis.
+
+Only the strips around candidates are ever touched at full resolution.
+Results carry geometry (endpoints in warped-card pixels, length in mm) rather
+than a bare count.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+CARD_HEIGHT_MM = 88.9
+
+# Search level height and ridge scale (Gaussian sigma across the line, px)
+CREASE_SEARCH_HEIGHT = 400
+CREASE_RIDGE_SIGMA = 1.5
+# Gaussian sigma along the line (mm) and number of filter orientations
+CREASE_RIDGE_ALONG_MM = 1.8
+CREASE_RIDGE_ORIENTATIONS = 16
+# Scale-normalized ridge strength (gray levels) a search pixel needs
+CREASE_RIDGE_MIN = 3.0
+# Ridge must match the edge response of the same oriented filter (step edges
+# coherent along the line beat it; texture and crossing artwork do not)
+CREASE_RIDGE_DOMINANCE = 1.0
+# Ignore this much of the card edge (borders of the warp are step edges)
+CREASE_EDGE_MARGIN_MM = 2.0
+
+CREASE_MIN_LEN_MM = 10.0
+# Candidates confirmed per side, strongest (ridge strength x length) first
+CREASE_MAX_CANDIDATES = 64
+
+# Confirmation strip half-width and chunk length at full resolution
+CREASE_BAND_MM = 1.5
+CREASE_CHUNK_MM = 3.0
+# Two-sided depth (gray levels below or above both flanks) a chunk needs
+CREASE_MIN_CONTRAST = 3.0
+# Median depth above which the line is printed ink: fold shading, even from a
+# deep crease, stays below it (a 40-level crease measures ~35-41 here), while
+# dark rules and text baselines run past 60
+CREASE_MAX_CONTRAST = 50.0
+# Width of the valley at half depth; narrower lines are hairline print
+CREASE_MIN_WIDTH_MM = 0.5
+# Share of the candidate's chunks that must confirm
+CREASE_CONFIRM_FRACTION = 0.75
+# Along-line texture on the axis relative to the flanks: a crease only shades
+# the artwork (ratio ~1), ink hides it (low) and text rows add to it (high).
+# Variances under the floor count as flat paper
+CREASE_TEXTURE_RATIO = (0.7, 2.0)
+CREASE_TEXTURE_FLOOR = 4.0
+# Mean chunk depth over its standard error; long lines may be less consistent
+CREASE_MIN_SIGNIFICANCE = 12.0
+CREASE_LONG_SIGNIFICANCE = 6.0
+CREASE_LONG_MM = 25.0
+
+
+@dataclass
+class CreaseCandidate:
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+    length_px: float
+    length_mm: float
+    contrast: float
+    confidence: float
+
+
+def _line_kernels(sigma: float) -> Tuple[np.ndarray, np.ndarray]:
+    """1-D second- and first-derivative-of-Gaussian kernels, scale-normalized."""
+    r = int(np.ceil(3 * sigma))
+    v = np.arange(-r, r + 1, dtype=np.float64)
+    g = np.exp(-0.5 * (v / sigma) ** 2)
+    g /= g.sum()
+    d2 = g * (v ** 2 / sigma ** 4 - 1.0 / sigma ** 2) * sigma ** 2
+    d2 -= g * d2.sum()
+    d1 = g * (-v / sigma ** 2) * sigma
+    return d2.astype(np.float32), d1.astype(np.float32)
+
+
+def _ridge_map(gray: np.ndarray, sigma: float, along: float) -> np.ndarray:
+    """
+    Oriented ridge strength, thinned across the line; 0 where no orientation
+    has a ridge that matches its own edge response.
+    """
+    h, w = gray.shape[:2]
+    g = gray.astype(np.float32)
+    d2, d1 = _line_kernels(sigma)
+    smooth = cv2.getGaussianKernel(2 * int(np.ceil(3 * along)) + 1, along, cv2.CV_32F)
+    side = int(np.ceil(np.hypot(h, w)))
+    cx, cy, c = (w - 1) / 2.0, (h - 1) / 2.0, (side - 1) / 2.0
+    best = np.zeros((h, w), np.float32)
+    best_k = np.zeros((h, w), np.int32)
+    for k in range(CREASE_RIDGE_ORIENTATIONS):
+        a = k * np.pi / CREASE_RIDGE_ORIENTATIONS
+        ca, sa = np.cos(a), np.sin(a)
+        # Rotated pixel (x', y') samples the image at angle a along x'
+        M = np.array([[ca, -sa, cx - ca * c + sa * c],
+                      [sa, ca, cy - sa * c - ca * c]])
+        rot = cv2.warpAffine(g, M, (side, side), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                             borderMode=cv2.BORDER_REPLICATE)
+        ridge = np.abs(cv2.sepFilter2D(rot, cv2.CV_32F, smooth, d2))
+        edge = np.abs(cv2.sepFilter2D(rot, cv2.CV_32F, smooth, d1))
+        ridge[ridge < CREASE_RIDGE_DOMINANCE * edge] = 0
+        ridge = cv2.warpAffine(ridge, M, (w, h), flags=cv2.INTER_LINEAR)
+        better = ridge > best
+        best[better] = ridge[better]
+        best_k[better] = k
+
+    # Non-maximum suppression along each pixel's line normal (4 directions)
+    normal = np.round((best_k * np.pi / CREASE_RIDGE_ORIENTATIONS + np.pi / 2) / (np.pi / 4))
+    normal = normal.astype(np.int32) % 4
+    pad = np.pad(best, 1)
+    keep = np.zeros((h, w), bool)
+    for d, (dy, dx) in enumerate(((0, 1), (1, 1), (1, 0), (1, -1))):
+        ahead = pad[1 + dy:1 + dy + h, 1 + dx:1 + dx + w]
+        behind = pad[1 - dy:1 - dy + h, 1 - dx:1 - dx + w]
+        keep |= (normal == d) & (best >= ahead) & (best >= behind)
+    best[~keep] = 0
+    return best
+
+
+def _collinear_with(lines: np.ndarray, s: np.ndarray, cos_tol: float, offset_px: float,
+                    gap_px: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Whether s lies on each row's line and overlaps or abuts it within gap_px,
+    with the joint span (start, end) along each row's direction.
+    """
+    length = np.maximum(np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1]), 1e-6)
+    u = (lines[:, 2:] - lines[:, :2]) / length[:, None]
+    e = s[2:] - s[:2]
+    a, b = s[:2] - lines[:, :2], s[2:] - lines[:, :2]
+    ta, tb = (a * u).sum(axis=1), (b * u).sum(axis=1)
+    offset = np.maximum(np.abs(a[:, 1] * u[:, 0] - a[:, 0] * u[:, 1]),
+                        np.abs(b[:, 1] * u[:, 0] - b[:, 0] * u[:, 1]))
+    match = ((np.abs(u @ e) >= cos_tol * max(float(np.hypot(*e)), 1e-6))
+             & (offset <= offset_px)
+             & (np.minimum(ta, tb) <= length + gap_px) & (np.maximum(ta, tb) >= -gap_px))
+    return match, np.minimum(0.0, np.minimum(ta, tb)), np.maximum(length, np.maximum(ta, tb))
+
+
+def _merge_collinear(segs: List[np.ndarray], angle_deg: float, offset_px: float,
+                     gap_px: float) -> List[np.ndarray]:
+    """Greedily join segments that lie on one line, keeping the outermost endpoints."""
+    cos_tol = np.cos(np.radians(angle_deg))
+    merged = np.zeros((len(segs), 4))
+    n = 0
+    for s in sorted(segs, key=lambda s: -np.hypot(s[2] - s[0], s[3] - s[1])):
+        match, lo, hi = _collinear_with(merged[:n], s, cos_tol, offset_px, gap_px)
+        hits = np.flatnonzero(match)
+        if len(hits):
+            m = merged[hits[0]]
+            u = (m[2:] - m[:2]) / max(float(np.hypot(*(m[2:] - m[:2]))), 1e-6)
+            merged[hits[0]] = np.concatenate([m[:2] + u * lo[hits[0]], m[:2] + u * hi[hits[0]]])
+        else:
+            merged[n] = s
+            n += 1
+    return list(merged[:n])
+
+
+def find_crease_candidates(search_gray: np.ndarray,
+                           glare_mask: Optional[np.ndarray] = None) -> List[np.ndarray]:
+    """Long straight ridges on the search level, as (x1, y1, x2, y2) in search pixels."""
+    h, w = search_gray.shape[:2]
+    ppm = h / CARD_HEIGHT_MM
+    ridge = _ridge_map(search_gray, CREASE_RIDGE_SIGMA, CREASE_RIDGE_ALONG_MM * ppm)
+    mask = (ridge >= CREASE_RIDGE_MIN).astype(np.uint8) * 255
+    margin = int(round(CREASE_EDGE_MARGIN_MM * ppm))
+    mask[:margin, :] = 0
+    mask[h - margin:, :] = 0
+    mask[:, :margin] = 0
+    mask[:, w - margin:] = 0
+    if glare_mask is not None:
+        if glare_mask.shape[:2] != (h, w):
+            glare_mask = cv2.resize(glare_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        mask[glare_mask > 0] = 0
+
+    min_len = CREASE_MIN_LEN_MM * ppm
+    lines = cv2.HoughLinesP(mask, 1, np.pi / 180.0, threshold=int(min_len * 0.6),
+                            minLineLength=int(min_len), maxLineGap=int(round(2.0 * ppm)))
+    if lines is None:
+        return []
+    segs = _merge_collinear(list(lines.reshape(-1, 4).astype(np.float64)),
+                            angle_deg=3.0, offset_px=3.0, gap_px=2.0 * ppm)
+
+    # Rank by total ridge strength along the line so long, steady ridges go
+    # first. A candidate on the line of a stronger one adds nothing: confirm
+    # traces the whole line across the card either way
+    peak = cv2.dilate(ridge, np.ones((3, 3), np.uint8))
+    strength = []
+    for seg in segs:
+        n = max(2, int(np.hypot(seg[2] - seg[0], seg[3] - seg[1])))
+        xs = np.clip(np.linspace(seg[0], seg[2], n).round().astype(int), 0, w - 1)
+        ys = np.clip(np.linspace(seg[1], seg[3], n).round().astype(int), 0, h - 1)
+        strength.append(float(peak[ys, xs].sum()))
+    cos_tol = np.cos(np.radians(3.0))
+    kept = np.zeros((min(len(segs), CREASE_MAX_CANDIDATES), 4))
+    n = 0
+    for i in np.argsort(strength)[::-1]:
+        if n == len(kept):
+            break
+        if not _collinear_with(kept[:n], segs[i], cos_tol, CREASE_BAND_MM * ppm, np.inf)[0].any():
+            kept[n] = segs[i]
+            n += 1
+    return list(kept[:n])
+
+
+def _two_sided(profile: np.ndarray, side: int) -> np.ndarray:
+    """
+    Signed depth of every profile sample below both flanks (>0 valley, <0
+    ridge); 0 where the flanks disagree, i.e. on a step.
+    """
+    left, right = float(profile[:side].mean()), float(profile[-side:].mean())
+    dl, dr = left - profile, right - profile
+    return np.where(dl * dr > 0, np.sign(dl) * np.minimum(np.abs(dl), np.abs(dr)), 0.0)
+
+
+def _peak(profile: np.ndarray, center: int, reach: int, side: int) -> Tuple[float, int]:
+    """Deepest two-sided valley or ridge within reach of the axis: (signed depth, offset)."""
+    t = _two_sided(profile, side)[center - reach:center + reach + 1]
+    k = int(np.argmax(np.abs(t)))
+    return float(t[k]), k - reach
+
+
+def _half_width(profile: np.ndarray, pos: int) -> float:
+    """Width (samples) of the contiguous run around pos within half its depth."""
+    depth = max(abs(float(profile[0] - profile[pos])), abs(float(profile[-1] - profile[pos])))
+    resid = np.abs(profile - profile[pos])
+    lo = hi = pos
+    while lo > 0 and resid[lo - 1] <= 0.5 * depth:
+        lo -= 1
+    while hi < len(profile) - 1 and resid[hi + 1] <= 0.5 * depth:
+        hi += 1
+    return float(hi - lo + 1)
+
+
+def _clip_to_card(p: np.ndarray, u: np.ndarray, w: int, h: int, margin: float) -> Tuple[float, float]:
+    """Parameter range t for which p + t*u stays inside the card minus margin."""
+    t_lo, t_hi = -np.inf, np.inf
+    for k, limit in ((0, w), (1, h)):
+        lo, hi = margin - p[k], limit - 1 - margin - p[k]
+        if abs(u[k]) < 1e-9:
+            continue
+        a, b = lo / u[k], hi / u[k]
+        t_lo, t_hi = max(t_lo, min(a, b)), min(t_hi, max(a, b))
+    return float(t_lo), float(t_hi)
+
+
+def _strip(img_bgr: np.ndarray, p1: np.ndarray, u: np.ndarray, t_lo: float, t_hi: float,
+           band: int) -> np.ndarray:
+    """Gray strip along p1 + t*u for t in [t_lo, t_hi], band pixels either side."""
+    nrm = np.array([-u[1], u[0]])
+    origin = p1 + t_lo * u - band * nrm
+    # Strip pixel (i along, j across) samples img_bgr at origin + i*u + j*nrm
+    M = np.array([[u[0], nrm[0], origin[0]], [u[1], nrm[1], origin[1]]], dtype=np.float64)
+    strip = cv2.warpAffine(img_bgr, M, (int(t_hi - t_lo), 2 * band + 1),
+                           flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                           borderMode=cv2.BORDER_REPLICATE)
+    return cv2.GaussianBlur(cv2.cvtColor(strip, cv2.COLOR_BGR2GRAY).astype(np.float32), (0, 0), 1.0)
+
+
+def _texture_ratio(span: np.ndarray, pos: int, side: int, chunk: int) -> Tuple[float, float]:
+    """Along-line high-pass variance on the axis rows and mean over the flank rows."""
+    def hp_var(rows: np.ndarray) -> float:
+        row = rows.mean(axis=0).reshape(1, -1)
+        return float(np.var(row - cv2.blur(row, (chunk, 1), borderType=cv2.BORDER_REFLECT)))
+    axis = hp_var(span[pos - 1:pos + 2])
+    flanks = 0.5 * (hp_var(span[:side]) + hp_var(span[-side:]))
+    return axis, flanks
+
+
+def confirm_crease(img_bgr: np.ndarray, seg: np.ndarray) -> Optional[CreaseCandidate]:
+    """
+    Validate one candidate inside a narrow full-resolution strip; None if it
+    does not hold up. The strip runs along the candidate's axis to the card
+    edges, so a crease found only in part at the search level is traced to
+    its confirmed ends.
+    """
+    h, w = img_bgr.shape[:2]
+    ppm = h / CARD_HEIGHT_MM
+    band = max(4, int(round(CREASE_BAND_MM * ppm)))
+    side = max(2, band // 4)
+    reach = band - side
+    chunk = max(4, int(round(CREASE_CHUNK_MM * ppm)))
+    margin = CREASE_EDGE_MARGIN_MM * ppm
+
+    # Re-aim the axis through the valley found in each half of the candidate,
+    # since the search level is only accurate to about a search pixel
+    p1, p2 = seg[:2].astype(np.float64), seg[2:].astype(np.float64)
+    for aimed in (False, True):
+        length = float(np.hypot(*(p2 - p1)))
+        if length < 1.0:
+            return None
+        u = (p2 - p1) / length
+        nrm = np.array([-u[1], u[0]])
+        t_lo, t_hi = _clip_to_card(p1, u, w, h, margin)
+        t_lo, t_hi = min(t_lo, 0.0), max(t_hi, length)
+        strip = _strip(img_bgr, p1, u, t_lo, t_hi, band)
+        a, b = int(-t_lo), int(length - t_lo)
+        if aimed:
+            break
+        mid = (a + b) // 2
+        depth_a, off_a = _peak(strip[:, a:mid].mean(axis=1), band, reach, side)
+        depth_b, off_b = _peak(strip[:, mid:b].mean(axis=1), band, reach, side)
+        if depth_a * depth_b <= 0:
+            return None
+        q1 = p1 + u * ((a + mid) / 2.0 + t_lo) + nrm * off_a
+        q2 = p1 + u * ((mid + b) / 2.0 + t_lo) + nrm * off_b
+        d = (q2 - q1) / max(float(np.hypot(*(q2 - q1))), 1e-6)
+        t1 = float(np.dot(q1 - p1, u))
+        p1, p2 = q1 - d * t1, q1 + d * (length - t1)
+
+    # One offset and polarity for the whole line, then each chunk is tested
+    # there. Chunk flanks sit one valley width (of the whole-line profile)
+    # either side of it, close enough that nearby artwork rarely reaches them
+    line_profile = strip[:, a:b].mean(axis=1)
+    depth, offset = _peak(line_profile, band, reach, side)
+    if abs(depth) < CREASE_MIN_CONTRAST:
+        return None
+    sign = 1.0 if depth > 0 else -1.0
+    pos = band + offset
+    r = int(np.clip(round(_half_width(line_profile, pos)), side, band))
+    lo, hi = max(0, pos - r - side), min(len(line_profile), pos + r + side + 1)
+    n_chunks = max(1, strip.shape[1] // chunk)
+    hit = np.zeros(n_chunks, dtype=bool)
+    contrast = np.zeros(n_chunks)
+    for c in range(n_chunks):
+        profile = strip[lo:hi, c * chunk:(c + 1) * chunk].mean(axis=1)
+        near = sign * _two_sided(profile, side)[pos - lo - 1:pos - lo + 2]
+        contrast[c] = float(near.max())
+        width = _half_width(profile, pos - lo - 1 + int(np.argmax(near)))
+        hit[c] = contrast[c] >= CREASE_MIN_CONTRAST and width >= CREASE_MIN_WIDTH_MM * ppm
+
+    # The candidate's own span must confirm ...
+    c0 = int(np.clip(np.floor(a / chunk), 0, n_chunks - 1))
+    c1 = int(np.clip(np.ceil(b / chunk), c0 + 1, n_chunks))
+    if hit[c0:c1].sum() < CREASE_CONFIRM_FRACTION * (c1 - c0):
+        return None
+    # ... then the run is grown outward across single-chunk gaps
+    while c0 > 0 and (hit[c0 - 1] or (c0 > 1 and hit[c0 - 2])):
+        c0 -= 1
+    while c1 < n_chunks and (hit[c1] or (c1 + 1 < n_chunks and hit[c1 + 1])):
+        c1 += 1
+    run = np.nonzero(hit[c0:c1])[0] + c0
+    if float(np.median(contrast[run])) > CREASE_MAX_CONTRAST:
+        return None
+
+    axis_var, flank_var = _texture_ratio(strip[:, run[0] * chunk:(run[-1] + 1) * chunk],
+                                         pos, side, chunk)
+    ratio = axis_var / max(flank_var, CREASE_TEXTURE_FLOOR)
+    lo_ratio, hi_ratio = CREASE_TEXTURE_RATIO
+    if ratio > hi_ratio or (flank_var > CREASE_TEXTURE_FLOOR and ratio < lo_ratio):
+        return None
+
+    shift = nrm * float(offset)
+    start = p1 + u * (t_lo + run[0] * chunk) + shift
+    end = p1 + u * (t_lo + min(strip.shape[1], (run[-1] + 1) * chunk)) + shift
+    length_px = float(np.hypot(*(end - start)))
+    significance = float(contrast[run].mean() / (contrast[run].std() / np.sqrt(len(run)) + 1e-6))
+    if significance < CREASE_MIN_SIGNIFICANCE and not (
+            significance >= CREASE_LONG_SIGNIFICANCE and length_px / ppm >= CREASE_LONG_MM):
+        return None
+    return CreaseCandidate(
+        x1=float(start[0]), y1=float(start[1]), x2=float(end[0]), y2=float(end[1]),
+        length_px=length_px,
+        length_mm=length_px / ppm,
+        contrast=float(np.median(contrast[run])),
+        confidence=float(len(run)) / float(run[-1] - run[0] + 1),
+    )
+
+
+def detect_creases(img_bgr: np.ndarray, search_bgr: Optional[np.ndarray] = None,
+                   glare_mask: Optional[np.ndarray] = None) -> List[CreaseCandidate]:
+    """
+    Creases on a warped card side.
+
+    search_bgr, if given, is a reduced-resolution view of the same card (e.g.
+    WarpPyramid.level(CREASE_SEARCH_HEIGHT)); otherwise one is made with
+    INTER_AREA. glare_mask may be at any resolution. Returned geometry is in
+    img_bgr pixels.
+    """
+    h, w = img_bgr.shape[:2]
+    if search_bgr is None:
+        sh = min(CREASE_SEARCH_HEIGHT, h)
+        search_bgr = cv2.resize(img_bgr, (max(1, int(round(w * sh / float(h)))), sh),
+                                interpolation=cv2.INTER_AREA)
+    search_gray = cv2.cvtColor(search_bgr, cv2.COLOR_BGR2GRAY)
+    candidates = find_crease_candidates(search_gray, glare_mask)
+    if not candidates:
+        return []
+
+    scale = np.array([w / float(search_gray.shape[1]), h / float(search_gray.shape[0])] * 2)
+    confirmed = []
+    for seg in candidates:
+        found = confirm_crease(img_bgr, seg * scale)
+        if found is not None and found.length_mm >= CREASE_MIN_LEN_MM:
+            confirmed.append(found)
+
+    # Parallel Hough responses to one crease confirm separately; keep the longest
+    band = CREASE_BAND_MM * h / CARD_HEIGHT_MM
+    cos_tol = np.cos(np.radians(5.0))
+    creases: List[CreaseCandidate] = []
+    for c in sorted(confirmed, key=lambda c: -c.length_px):
+        kept = np.array([[k.x1, k.y1, k.x2, k.y2] for k in creases]).reshape(-1, 4)
+        if not _collinear_with(kept, np.array([c.x1, c.y1, c.x2, c.y2]), cos_tol, band, 0.0)[0].any():
+            creases.append(c)
+    return creases
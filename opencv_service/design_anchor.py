@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Design-Anchor Centering
+=======================
+
+Borderless and full-art cards have no border to measure, so the border
+scan in measure_centering gives up ("design-anchor-required"). Most of them
+still print a dominant inner frame - the art window, a frame line, the edge
+of a full-bleed design panel - whose offsets from the card edge grade
+centering the same way borders do.
+
+find_design_anchor looks for that frame on the warped card:
+
+1. LSD line segments, kept when within ANCHOR_MAX_TILT_DEG of the card axes
+   and at least ANCHOR_MIN_SEGMENT of the card side long. Segments hugging
+   the card edge (the cut itself) are dropped.
+2. Per side, candidate frame lines are the positions (within
+   ANCHOR_MAX_OFFSET of that edge) where the most segment length lines up.
+3. Every combination of one candidate per side is a rectangle; a side
+   scores the share of its length, between the two adjacent lines, that
+   segments actually cover. Sides that run on past a corner count against
+   the rectangle (a text box inside a frame lines up with the frame's side
+   lines, but those do not stop at its edge). The best-scoring rectangle
+   wins if its weakest side still reaches ANCHOR_MIN_COVERAGE.
+
+The weakest side's coverage is the anchor's confidence score, so a frame
+seen only in pieces (glare, art running over the frame) reports low.
+Every frame line lies within ANCHOR_MAX_OFFSET of its edge, so a window
+not enclosing the card centre - an art box in the top half, whose top and
+bottom offsets differ by design - is never an anchor.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Segments more than this far off the card axes are ignored
+ANCHOR_MAX_TILT_DEG = 3.0
+
+# Shortest segment kept, as a share of the card's shorter side
+ANCHOR_MIN_SEGMENT = 0.015
+
+# Segments within this share of a dimension from the card edge are the cut, not the design
+ANCHOR_EDGE_MARGIN = 0.015
+
+# Frame lines are searched up to this share of a dimension in from each edge
+ANCHOR_MAX_OFFSET = 0.25
+
+# Segments within this share of a dimension of a line position belong to it
+# (wide enough that both edges of a thin frame line give one line, at its centre)
+ANCHOR_LINE_TOLERANCE = 0.01
+
+# Candidate lines per side (combinations tried: ANCHOR_CANDIDATES ** 4)
+ANCHOR_CANDIDATES = 4
+
+# A frame's sides stop at its corners: coverage over this share of a
+# dimension past each corner is subtracted, at this weight, from the score
+ANCHOR_CORNER_RUN = 0.03
+ANCHOR_OVERSHOOT_WEIGHT = 0.5
+
+# Weakest-side coverage for an anchor, and for medium / high confidence
+ANCHOR_MIN_COVERAGE = 0.35
+ANCHOR_MEDIUM_COVERAGE = 0.5
+ANCHOR_HIGH_COVERAGE = 0.7
+
+_SIDES = ("left", "right", "top", "bottom")
+
+
+@dataclass
+class DesignAnchor:
+    box: Tuple[float, float, float, float]  # frame x0, y0, x1, y1 in pixels of the measured image
+    width: int                               # measured image size
+    height: int
+    offsets: Dict[str, float]                # left / right / top / bottom, frame to card edge (px)
+    side_coverage: Dict[str, float]          # share of each frame side covered by segments
+    score: float                             # weakest side coverage
+    confidence: str                          # "high", "medium", "low"
+
+    def to_dict(self) -> Dict[str, any]:
+        x0, y0, x1, y1 = self.box
+        return {
+            "box_normalized": [round(x0 / self.width, 4), round(y0 / self.height, 4),
+                               round(x1 / self.width, 4), round(y1 / self.height, 4)],
+            "side_coverage": self.side_coverage,
+            "score": self.score,
+        }
+
+
+def _axis_segments(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Near-horizontal and near-vertical LSD segments as (position, start, end, length) rows."""
+    h, w = gray.shape[:2]
+    lines = cv2.createLineSegmentDetector(0).detect(gray)[0]
+    if lines is None:
+        return np.zeros((0, 4)), np.zeros((0, 4))
+    x1, y1, x2, y2 = lines.reshape(-1, 4).astype(np.float64).T
+    dx, dy = x2 - x1, y2 - y1
+    length = np.hypot(dx, dy)
+    tilt = np.tan(np.radians(ANCHOR_MAX_TILT_DEG))
+    long_enough = length >= ANCHOR_MIN_SEGMENT * min(h, w)
+
+    horiz = long_enough & (np.abs(dy) <= tilt * np.abs(dx))
+    vert = long_enough & (np.abs(dx) <= tilt * np.abs(dy))
+    h_rows = np.stack([(y1 + y2) / 2.0, np.minimum(x1, x2), np.maximum(x1, x2), length], axis=1)[horiz]
+    v_rows = np.stack([(x1 + x2) / 2.0, np.minimum(y1, y2), np.maximum(y1, y2), length], axis=1)[vert]
+    return h_rows, v_rows
+
+
+def _candidates(segments: np.ndarray, lo: float, hi: float, span: int,
+                tol: float) -> List[Tuple[float, np.ndarray]]:
+    """Strongest line positions in [lo, hi]: (refined position, covered mask along the side)."""
+    inside = segments[(segments[:, 0] >= lo) & (segments[:, 0] <= hi)]
+    if len(inside) == 0:
+        return []
+    # Segment length by position, summed over a +-tol window
+    bins = np.arange(int(lo), int(np.ceil(hi)) + 1)
+    support = np.zeros(len(bins))
+    np.add.at(support, np.clip(np.round(inside[:, 0]).astype(int) - bins[0], 0, len(bins) - 1), inside[:, 3])
+    radius = max(1, int(round(tol)))
+    support = np.convolve(support, np.ones(2 * radius + 1), mode="same")
+
+    found = []
+    for _ in range(ANCHOR_CANDIDATES):
+        i = int(np.argmax(support))
+        if support[i] <= 0:
+            break
+        support[max(0, i - 2 * radius):i + 2 * radius + 1] = 0
+        near = inside[np.abs(inside[:, 0] - bins[i]) <= tol]
+        if len(near) == 0:
+            continue
+        covered = np.zeros(span, dtype=bool)
+        for _, a, b, _ in near:
+            covered[max(0, int(a)):min(span, int(np.ceil(b)) + 1)] = True
+        found.append((float(np.average(near[:, 0], weights=near[:, 3])), covered))
+    return found
+
+
+def find_design_anchor(img_bgr: np.ndarray) -> Optional[DesignAnchor]:
+    """
+    Dominant inner frame of a warped card side, or None when no frame
+    rectangle is covered well enough on all four sides.
+    """
+    h, w = img_bgr.shape[:2]
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
+    h_rows, v_rows = _axis_segments(gray)
+
+    def side(rows, dim, span, far):
+        tol = ANCHOR_LINE_TOLERANCE * dim
+        lo, hi = ANCHOR_EDGE_MARGIN * dim, ANCHOR_MAX_OFFSET * dim
+        if far:
+            lo, hi = dim - 1 - hi, dim - 1 - lo
+        return _candidates(rows, lo, hi, span, tol)
+
+    cands = {
+        "left": side(v_rows, w, h, False), "right": side(v_rows, w, h, True),
+        "top": side(h_rows, h, w, False), "bottom": side(h_rows, h, w, True),
+    }
+    if any(not cands[s] for s in _SIDES):
+        return None
+
+    def run_past(mask, a, b, dim):
+        """Coverage just beyond both ends of the span [a, b]."""
+        gap, run = int(np.ceil(ANCHOR_LINE_TOLERANCE * dim)), max(1, int(ANCHOR_CORNER_RUN * dim))
+        before = mask[max(0, a - gap - run):max(0, a - gap)]
+        after = mask[b + gap:b + gap + run]
+        return float(np.concatenate([before, after]).mean()) if len(before) + len(after) else 0.0
+
+    best = None
+    for left, lmask in cands["left"]:
+        for right, rmask in cands["right"]:
+            for top, tmask in cands["top"]:
+                for bottom, bmask in cands["bottom"]:
+                    t0, t1 = int(round(top)), int(round(bottom)) + 1
+                    l0, l1 = int(round(left)), int(round(right)) + 1
+                    coverage = (lmask[t0:t1].mean(), rmask[t0:t1].mean(),
+                                tmask[l0:l1].mean(), bmask[l0:l1].mean())
+                    overshoot = (run_past(lmask, t0, t1, h), run_past(rmask, t0, t1, h),
+                                 run_past(tmask, l0, l1, w), run_past(bmask, l0, l1, w))
+                    score = float(np.mean(coverage) - ANCHOR_OVERSHOOT_WEIGHT * np.mean(overshoot))
+                    if min(coverage) >= ANCHOR_MIN_COVERAGE and (best is None or score > best[0]):
+                        best = (score, (left, top, right, bottom), coverage)
+    if best is None:
+        return None
+
+    _, (x0, y0, x1, y1), coverage = best
+    weakest = float(min(coverage))
+    confidence = ("high" if weakest >= ANCHOR_HIGH_COVERAGE else
+                  "medium" if weakest >= ANCHOR_MEDIUM_COVERAGE else "low")
+    return DesignAnchor(
+        box=(x0, y0, x1, y1),
+        width=w,
+        height=h,
+        offsets={"left": x0, "right": w - 1 - x1, "top": y0, "bottom": h - 1 - y1},
+        side_coverage={s: round(float(c), 3) for s, c in zip(_SIDES, coverage)},
+        score=round(weakest, 3),
+        confidence=confidence,
+    )
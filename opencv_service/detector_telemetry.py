@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detector Telemetry for Profile-Aware Card Detection
+===================================================
+
+Keeps rolling win-rate and latency statistics for every (profile, detector)
+pair used by detect_card_quadrilateral() and turns them into a detector order.
+
+A detector "wins" a detection when its candidate scores highest in fusion
+scoring. Detectors are ranked by expected value: smoothed win probability per
+millisecond of run time. Combined with the early-exit cascade this puts the
+detectors that usually win cheaply at the front for our actual traffic mix.
+
+Order modes (OPENCV_DETECTOR_ORDER):
+- "static":   always use Profile.detector_order from card_cv_stage1.PROFILES (default)
+- "adaptive": reorder by expected value once every detector has enough samples
+- "frozen":   use the order saved by --freeze (falls back to static)
+
+With early exit the order decides which candidate is found first, so a
+changing order can change the quad returned for the same photo. "adaptive"
+trades that reproducibility for latency; "static" and "frozen" keep it.
+
+Exploration (every explore_every-th detection per profile) runs the
+detectors the cascade would have skipped, for telemetry only: the quad
+returned is still the cascade's.
+
+Several worker processes share one telemetry file. Each save re-reads the
+file under a lock and replays only this worker's detections since its last
+save on top, so workers merge instead of overwriting each other.
+
+Usage:
+    python detector_telemetry.py --show
+    python detector_telemetry.py --freeze
+"""
+
+import os
+import json
+import atexit
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized across processes
+    fcntl = None
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+TELEMETRY_CONFIG = {
+    "path": os.getenv("OPENCV_DETECTOR_TELEMETRY", os.path.join(_HERE, "detector_telemetry.json")),
+    "frozen_order_path": os.getenv("OPENCV_DETECTOR_ORDER_FILE", os.path.join(_HERE, "detector_order.json")),
+    "mode": os.getenv("OPENCV_DETECTOR_ORDER", "static").lower(),
+    "decay": 0.02,            # Per-update decay; roughly a 50-run rolling window
+    "min_samples": 20.0,      # Decayed runs needed before a detector's stats are trusted
+    "explore_every": 25,      # Every Nth detection per profile also samples the skipped detectors
+    "save_every": 10,         # Persist after this many recorded detections
+}
+
+
+@dataclass
+class DetectorStats:
+    runs: float = 0.0
+    wins: float = 0.0
+    mean_ms: float = 0.0
+
+    def record(self, elapsed_ms: float, won: bool, decay: float) -> None:
+        keep = 1.0 - decay
+        self.runs = self.runs * keep + 1.0
+        self.wins = self.wins * keep + (1.0 if won else 0.0)
+        if self.mean_ms <= 0.0:
+            self.mean_ms = float(elapsed_ms)
+        else:
+            self.mean_ms = keep * self.mean_ms + decay * float(elapsed_ms)
+
+    @property
+    def win_probability(self) -> float:
+        # Laplace smoothing keeps rarely-run detectors from scoring 0 or 1
+        return (self.wins + 1.0) / (self.runs + 2.0)
+
+    @property
+    def expected_value(self) -> float:
+        return self.win_probability / max(self.mean_ms, 1.0)
+
+
+class DetectorTelemetry:
+    """Thread-safe rolling statistics keyed by profile name, then detector name."""
+
+    def __init__(self, path: Optional[str] = None, config: Optional[Dict] = None):
+        self.config = dict(TELEMETRY_CONFIG)
+        if config:
+            self.config.update(config)
+        self.path = path or self.config["path"]
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, DetectorStats]] = {}
+        self._detections: Dict[str, int] = {}
+        self._pending: List[Tuple[str, Dict[str, float], Optional[str]]] = []
+        self._frozen: Optional[Dict[str, List[str]]] = None
+        self.load()
+
+    # ---- persistence ----
+
+    def _read(self) -> Tuple[Dict[str, Dict[str, DetectorStats]], Dict[str, int]]:
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Detector Telemetry] Could not read {self.path}: {e}")
+            return {}, {}
+        stats = {
+            profile: {name: DetectorStats(**vals) for name, vals in detectors.items()}
+            for profile, detectors in raw.get("stats", {}).items()
+        }
+        return stats, {k: int(v) for k, v in raw.get("detections", {}).items()}
+
+    def _apply(self, stats: Dict[str, Dict[str, DetectorStats]], detections: Dict[str, int],
+               profile: str, timings_ms: Dict[str, float], winner: Optional[str]) -> None:
+        per_profile = stats.setdefault(profile, {})
+        for name, elapsed in timings_ms.items():
+            per_profile.setdefault(name, DetectorStats()).record(elapsed, name == winner, self.config["decay"])
+        detections[profile] = detections.get(profile, 0) + 1
+
+    def load(self) -> None:
+        stats, detections = self._read()
+        with self._lock:
+            self._stats, self._detections = stats, detections
+
+    def save(self) -> None:
+        """Merge this worker's unsaved detections into the file and adopt the merged stats."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(f"{self.path}.lock", "w")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            stats, detections = self._read()
+            for record in pending:
+                self._apply(stats, detections, *record)
+            payload = {
+                "stats": {p: {n: asdict(s) for n, s in d.items()} for p, d in stats.items()},
+                "detections": dict(detections),
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[Detector Telemetry] Could not write {self.path}: {e}")
+            with self._lock:
+                self._pending[:0] = pending
+            return
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+        with self._lock:
+            # Detections recorded while saving go on top of the merged stats
+            for record in self._pending:
+                self._apply(stats, detections, *record)
+            self._stats, self._detections = stats, detections
+
+    def flush(self) -> None:
+        """Persist only if there are unsaved detections."""
+        if self._pending:
+            self.save()
+
+    # ---- recording ----
+
+    def record_detection(self, profile: str, timings_ms: Dict[str, float], winner: Optional[str]) -> None:
+        """Record one detection: run time of every detector that ran, plus the winner."""
+        with self._lock:
+            self._apply(self._stats, self._detections, profile, timings_ms, winner)
+            self._pending.append((profile, dict(timings_ms), winner))
+            should_save = len(self._pending) >= self.config["save_every"]
+        if should_save:
+            self.save()
+
+    def should_explore(self, profile: str) -> bool:
+        """True when this detection should also run, for telemetry, the detectors early exit skips."""
+        every = int(self.config["explore_every"])
+        if every <= 0:
+            return False
+        with self._lock:
+            return self._detections.get(profile, 0) % every == 0
+
+    # ---- ordering ----
+
+    def learned_order(self, profile: str, default_order: List[str]) -> List[str]:
+        """
+        Order detectors by expected value (win probability per ms).
+
+        Returns default_order unchanged until every detector in it has
+        min_samples decayed runs, so a half-explored profile is never reshuffled.
+        """
+        with self._lock:
+            per_profile = self._stats.get(profile, {})
+            stats = [per_profile.get(name) for name in default_order]
+        if any(s is None or s.runs < self.config["min_samples"] for s in stats):
+            return list(default_order)
+        ranked = sorted(zip(default_order, stats), key=lambda item: item[1].expected_value, reverse=True)
+        return [name for name, _ in ranked]
+
+    def frozen_order(self, profile: str) -> Optional[List[str]]:
+        if self._frozen is None:
+            path = self.config["frozen_order_path"]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._frozen = json.load(f)
+            except (OSError, ValueError):
+                self._frozen = {}
+        order = self._frozen.get(profile)
+        return list(order) if order else None
+
+    def order_for(self, profile: str, default_order: List[str]) -> List[str]:
+        """Detector order for a profile according to the configured mode."""
+        mode = self.config["mode"]
+        if mode == "frozen":
+            return self.frozen_order(profile) or list(default_order)
+        if mode == "adaptive":
+            return self.learned_order(profile, default_order)
+        return list(default_order)
+
+    def freeze(self, default_orders: Dict[str, List[str]], path: Optional[str] = None) -> Dict[str, List[str]]:
+        """Write the current learned order of every profile to the frozen-order file."""
+        frozen = {name: self.learned_order(name, order) for name, order in default_orders.items()}
+        path = path or self.config["frozen_order_path"]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(frozen, f, indent=2)
+        self._frozen = frozen
+        return frozen
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._lock:
+            return {
+                p: {n: {**asdict(s), "win_probability": s.win_probability, "expected_value": s.expected_value}
+                    for n, s in d.items()}
+                for p, d in self._stats.items()
+            }
+
+
+DETECTOR_TELEMETRY = DetectorTelemetry()
+atexit.register(DETECTOR_TELEMETRY.flush)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or freeze learned detector order.")
+    parser.add_argument("--show", action="store_true", help="Print per-profile detector statistics")
+    parser.add_argument("--freeze", action="store_true", help="Write learned order to the frozen-order file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    # Imported here so this module stays free of the OpenCV dependency
+    from card_cv_stage1 import PROFILES
+
+    defaults = {name: p.detector_order for name, p in PROFILES.items()}
+    if args.freeze:
+        frozen = DETECTOR_TELEMETRY.freeze(defaults)
+        print(json.dumps(frozen, indent=2))
+        print(f"Saved frozen detector order to: {DETECTOR_TELEMETRY.config['frozen_order_path']}")
+    else:
+        print(json.dumps(DETECTOR_TELEMETRY.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
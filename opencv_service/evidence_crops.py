@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Defect Evidence Crops
+=====================
+
+A small set of fixed-size, full-detail crops around the strongest defect
+evidence on a card side, so the vision-LLM grader can be pointed at the
+spots that matter instead of searching a full-resolution photo.
+
+Candidates (reason - where, score):
+- edge        the EVIDENCE_EDGE_CROPS border segments with the highest mean
+              ΔE against the band just inside (the edge whitening signal),
+              centered on the segment's worst crop-wide span; mean ΔE
+- corner      every corner; corner whitening length (px)
+- white_dots  the EVIDENCE_TILE_CROPS surface tiles with the most white dots; count
+- scratches   the EVIDENCE_TILE_CROPS tiles with the most scratches; count
+- crease      up to EVIDENCE_CREASE_CROPS confirmed creases, on their midpoint;
+              detector confidence
+
+Edge and corner crops sit so the card edge falls a quarter of the way in,
+showing the edge profile against the background. Candidates whose regions
+mostly overlap share one crop (its reasons list every candidate, strongest
+reason first).
+
+Crops are EVIDENCE_CROP_PX square and sampled from the decoded photo, not the
+warp, through the card homography at the photo's own density (capped at
+EVIDENCE_MAX_SCALE output pixels per warp pixel), so fine dots are not
+softened by a second resampling. Boxes are reported in warp pixels and as
+fractions of the card.
+"""
+
+import base64
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from roi_stats import CardRoiStats
+from surface_engine import plan_tiles
+
+
+# Output size of every crop (square)
+EVIDENCE_CROP_PX = 320
+
+# Output pixels per warp pixel: the photo's own density, within these limits
+EVIDENCE_MIN_SCALE = 1.0
+EVIDENCE_MAX_SCALE = 2.0
+
+# Candidates per reason (corners: all four)
+EVIDENCE_EDGE_CROPS = 3
+EVIDENCE_TILE_CROPS = 2
+EVIDENCE_CREASE_CROPS = 2
+
+# Most crops per side
+EVIDENCE_MAX_CROPS = 12
+
+# Regions overlapping more than this share of the smaller one are merged
+EVIDENCE_MERGE_OVERLAP = 0.5
+
+EVIDENCE_JPEG_QUALITY = 95
+
+# Border strip the edge ΔE is read from (detect_edge_whitening default)
+EVIDENCE_EDGE_STRIP_PX = 8
+
+_REASON_ORDER = ("edge", "corner", "crease", "white_dots", "scratches")
+
+
+@dataclass
+class EvidenceCrop:
+    reasons: List[str]                  # reason tags, strongest first
+    labels: List[str]                   # segment / corner / tile / crease name per reason
+    score: float                        # score of the first reason (see module docstring)
+    box: List[int]                      # card region shown, warp pixels [x0, y0, x1, y1]
+    box_normalized: List[float]         # the same as fractions of the card width / height
+    scale: float                        # output pixels per warp pixel
+    size_px: int
+    image: bytes = field(default=b"", repr=False)   # JPEG
+    path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "reasons": self.reasons,
+            "labels": self.labels,
+            "score": self.score,
+            "box": self.box,
+            "box_normalized": self.box_normalized,
+            "scale": self.scale,
+            "size_px": self.size_px,
+            "path": self.path,
+            "image_base64": base64.b64encode(self.image).decode("ascii") if self.image else None,
+        }
+
+
+# -----------------------------
+# Candidates
+# -----------------------------
+
+def _edge_candidates(stats: CardRoiStats, edge_metrics, extent: float) -> List[Tuple[str, str, float, float, float]]:
+    """(reason, label, score, cx, cy) of the border segments with the highest mean ΔE."""
+    w, h = stats.width, stats.height
+    inset = extent * 0.25
+    found = []
+    for side, segments in edge_metrics.items():
+        profile = stats.edge_delta_e(side, EVIDENCE_EDGE_STRIP_PX).mean(axis=0 if side in ("top", "bottom") else 1)
+        side_len = len(profile)
+        # Mean ΔE over a crop-wide window around every position along the side
+        window = max(1, min(side_len, int(extent)))
+        smoothed = np.convolve(profile, np.ones(window) / window, mode="same")
+        # Segment spans as in card_cv_stage1.edge_segment_rects
+        seg_len = side_len // len(segments)
+        for i, seg in enumerate(segments):
+            a, b = i * seg_len, side_len if i == len(segments) - 1 else (i + 1) * seg_len
+            if b <= a:
+                continue
+            pos = a + int(np.argmax(smoothed[a:b]))
+            cx, cy = {
+                "top": (pos, inset),
+                "bottom": (pos, h - inset),
+                "left": (inset, pos),
+                "right": (w - inset, pos),
+            }[side]
+            found.append(("edge", seg.segment_name, round(float(profile[a:b].mean()), 2), cx, cy))
+    found.sort(key=lambda c: -c[2])
+    return [c for c in found[:EVIDENCE_EDGE_CROPS] if c[2] > 0.0]
+
+
+def _corner_candidates(corner_metrics, width: int, height: int,
+                       extent: float) -> List[Tuple[str, str, float, float, float]]:
+    inset = extent * 0.25
+    points = {"tl": (inset, inset), "tr": (width - inset, inset),
+              "bl": (inset, height - inset), "br": (width - inset, height - inset)}
+    return [("corner", c.corner_name, round(float(c.whitening_length_px), 1), *points[c.corner_name])
+            for c in corner_metrics if c.corner_name in points]
+
+
+def _tile_candidates(grid, width: int, height: int) -> List[Tuple[str, str, float, float, float]]:
+    """Densest white-dot and scratch tiles of the surface defect grid."""
+    _, _, tiles = plan_tiles(width, height, None, grid.tile_px)
+    found = []
+    for reason, counts in (("white_dots", grid.white_dots), ("scratches", grid.scratches)):
+        ranked = sorted(tiles, key=lambda t: -counts[t.row][t.col])
+        for t in ranked[:EVIDENCE_TILE_CROPS]:
+            n = counts[t.row][t.col]
+            if n <= 0:
+                break
+            cx, cy = (t.core[0] + t.core[2]) / 2.0, (t.core[1] + t.core[3]) / 2.0
+            found.append((reason, f"r{t.row + 1}c{t.col + 1}", float(n), cx, cy))
+    return found
+
+
+def _crease_candidates(creases) -> List[Tuple[str, str, float, float, float]]:
+    ranked = sorted(creases, key=lambda c: -c.confidence)[:EVIDENCE_CREASE_CROPS]
+    return [("crease", f"crease_{i + 1}", round(float(c.confidence), 3), (c.x1 + c.x2) / 2.0, (c.y1 + c.y2) / 2.0)
+            for i, c in enumerate(ranked)]
+
+
+def _merge(candidates: List[Tuple[str, str, float, float, float]], extent: float) -> List[Dict[str, any]]:
+    """Group candidates whose crop regions mostly overlap; the first candidate of a group places the crop."""
+    groups: List[Dict[str, any]] = []
+    for reason, label, score, cx, cy in candidates:
+        for g in groups:
+            dx, dy = abs(g["cx"] - cx), abs(g["cy"] - cy)
+            overlap = max(0.0, extent - dx) * max(0.0, extent - dy) / (extent * extent)
+            if overlap > EVIDENCE_MERGE_OVERLAP:
+                g["reasons"].append(reason)
+                g["labels"].append(label)
+                break
+        else:
+            groups.append({"reasons": [reason], "labels": [label], "score": score, "cx": cx, "cy": cy})
+    return groups[:EVIDENCE_MAX_CROPS]
+
+
+# -----------------------------
+# Extraction
+# -----------------------------
+
+def extract_evidence_crops(photo_bgr: np.ndarray, pyramid, edge_metrics, corner_metrics,
+                           surface_metrics) -> List[EvidenceCrop]:
+    """
+    Evidence crops of one side.
+
+    photo_bgr is the image the pyramid's quad refers to (the decoded photo);
+    the metrics are the side's edges, corners and surface stage results,
+    any of which may be empty.
+    """
+    w, h = pyramid.width, pyramid.height
+    scale = float(np.clip(pyramid.src_card_height / float(h), EVIDENCE_MIN_SCALE, EVIDENCE_MAX_SCALE))
+    extent = EVIDENCE_CROP_PX / scale      # card region of one crop, warp pixels
+
+    candidates = []
+    if edge_metrics:
+        stats = CardRoiStats(pyramid.level(h))
+        candidates += _edge_candidates(stats, edge_metrics, extent)
+    if corner_metrics:
+        candidates += _corner_candidates(corner_metrics, w, h, extent)
+    if surface_metrics is not None:
+        if surface_metrics.creases:
+            candidates += _crease_candidates(surface_metrics.creases)
+        if surface_metrics.defect_grid is not None:
+            candidates += _tile_candidates(surface_metrics.defect_grid, w, h)
+    candidates.sort(key=lambda c: _REASON_ORDER.index(c[0]))
+
+    crops = []
+    for g in _merge(candidates, extent):
+        # Interior evidence stays on the card; edges and corners are already inset
+        cx = float(np.clip(g["cx"], extent / 2.0, max(extent / 2.0, w - extent / 2.0)))
+        cy = float(np.clip(g["cy"], extent / 2.0, max(extent / 2.0, h - extent / 2.0)))
+        if g["reasons"][0] in ("edge", "corner"):
+            cx, cy = g["cx"], g["cy"]
+        x0, y0 = cx - extent / 2.0, cy - extent / 2.0
+        img = pyramid.sample(photo_bgr, x0, y0, EVIDENCE_CROP_PX, scale)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_JPEG_QUALITY])
+        box = [int(round(x0)), int(round(y0)), int(round(x0 + extent)), int(round(y0 + extent))]
+        crops.append(EvidenceCrop(
+            reasons=g["reasons"],
+            labels=g["labels"],
+            score=g["score"],
+            box=box,
+            box_normalized=[round(box[0] / float(w), 4), round(box[1] / float(h), 4),
+                            round(box[2] / float(w), 4), round(box[3] / float(h), 4)],
+            scale=round(scale, 3),
+            size_px=EVIDENCE_CROP_PX,
+            image=buf.tobytes() if ok else b"",
+        ))
+    return crops
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fidelity Tiers
+==============
+
+Named speed / accuracy trade-offs for Stage 1 analysis:
+
+- fast      upload preview. Small detection image, eager cascade exit, only
+            the cheap detectors (no GrabCut), a 1000px warp, and surface
+            analysis limited to white dots and focus.
+- standard  the grading pass; the defaults the rest of the pipeline is
+            calibrated on.
+- full      disputed grades. Larger detection image for scoring, every
+            allowed detector runs (no early exit), full surface analysis.
+
+Pixel-based metrics (border widths, dot areas, band depths) are calibrated
+at the standard 1600px warp. A fast result is reported in its own warp
+pixels; treat it as a preview, not a grade.
+
+Tiers are tunable without code changes: OPENCV_FIDELITY_TIERS may point to
+a JSON file of {tier: {field: value}} overrides, merged over the defaults
+below. latency_target_ms is checked by `benchmark.py tiers`.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, Optional, Tuple
+
+from surface_engine import SURFACE_DETECTORS
+
+
+@dataclass(frozen=True)
+class FidelityTier:
+    name: str
+    detection_max_dim: int                  # longest side of the normalized detection image
+    early_exit_score: Optional[float]       # cascade stops at this score; None = run every detector
+    detectors: Optional[Tuple[str, ...]]    # detectors allowed to run (profile order kept); None = all
+    warp_height: int                        # base height of the warped card
+    surface_detectors: Tuple[str, ...]      # subset of SURFACE_DETECTORS
+    latency_target_ms: float                # p50 analyze_side target on the benchmark set
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d["detectors"] = list(self.detectors) if self.detectors is not None else None
+        d["surface_detectors"] = list(self.surface_detectors)
+        return d
+
+
+DEFAULT_TIER = "standard"
+
+# Latency targets are p50 analyze_side wall time (`benchmark.py tiers`). Measured
+# on a single core, mixed raw / sleeved / holo / full-art set: fast ~540ms,
+# standard ~1080ms, full ~5600ms (full runs GrabCut on every photo).
+_BUILTIN_TIERS = {
+    "fast": FidelityTier(
+        name="fast",
+        detection_max_dim=800,
+        early_exit_score=70.0,
+        detectors=("lab_chroma", "lsd", "hough", "color_seg", "saliency"),
+        warp_height=1000,                  # at 800 centering would read the unfiltered base warp
+        surface_detectors=("dots",),
+        latency_target_ms=600.0,
+    ),
+    "standard": FidelityTier(
+        name="standard",
+        detection_max_dim=1200,
+        early_exit_score=85.0,             # card_cv_stage1.EARLY_EXIT_SCORE
+        detectors=None,
+        warp_height=1600,
+        surface_detectors=SURFACE_DETECTORS,
+        latency_target_ms=1500.0,
+    ),
+    "full": FidelityTier(
+        name="full",
+        detection_max_dim=1600,
+        early_exit_score=None,
+        detectors=None,
+        warp_height=1600,
+        surface_detectors=SURFACE_DETECTORS,
+        latency_target_ms=8000.0,
+    ),
+}
+
+
+def _load_overrides(path: Optional[str]) -> Dict[str, FidelityTier]:
+    tiers = dict(_BUILTIN_TIERS)
+    if not path:
+        return tiers
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Fidelity Tiers] Could not load {path}: {e} - using built-in tiers")
+        return tiers
+
+    for name, fields in overrides.items():
+        fields = dict(fields)
+        for key in ("detectors", "surface_detectors"):
+            if fields.get(key) is not None:
+                fields[key] = tuple(fields[key])
+        base = tiers.get(name, tiers[DEFAULT_TIER])
+        tiers[name] = replace(base, name=name, **fields)
+    return tiers
+
+
+FIDELITY_TIERS: Dict[str, FidelityTier] = _load_overrides(os.environ.get("OPENCV_FIDELITY_TIERS"))
+
+
+def get_tier(name: Optional[str] = None) -> FidelityTier:
+    """Tier by name (default DEFAULT_TIER). Raises ValueError for unknown names."""
+    key = (name or DEFAULT_TIER).strip().lower()
+    if key not in FIDELITY_TIERS:
+        raise ValueError(f"Unknown fidelity tier: {name}. Expected one of: {', '.join(FIDELITY_TIERS)}")
+    return FIDELITY_TIERS[key]
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Holder Classification
+=====================
+
+One answer to "is this card in a penny sleeve, a top loader or a slab?",
+computed once per side and shared by profile selection (select_profile) and
+the final SideMetrics indicators.
+
+Evidence (the signals detect_sleeve_like_features used on the full image):
+- double_edge_ratio     Canny edges in the outer HOLDER_BAND_PX of the frame,
+                        as a share of the whole frame. Measured on the
+                        full-resolution border bands only, since thin plastic
+                        edges do not survive downsampling.
+- glare_ratio           share of low-saturation, high-value pixels
+- vertical_line_ratio   share of pixels above the 98th percentile of |d/dx|
+- color_std             spread of the Lab a/b channels
+- border_edge_density   mean Canny density of the 10% border bands (the
+                        preflight "translucent frame" signal)
+
+All but double_edge_ratio are taken on one point-sampled HOLDER_THUMB_DIM
+thumbnail (INTER_NEAREST keeps per-pixel statistics comparable to the full
+image, as in extract_preflight_features). Scoring thresholds are unchanged
+from detect_sleeve_like_features.
+"""
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+# Longest side of the evidence thumbnail
+HOLDER_THUMB_DIM = 512
+
+# Border band (full-resolution pixels) searched for sleeve double edges
+HOLDER_BAND_PX = 15
+
+# Preflight translucent-frame trigger on border_edge_density
+TRANSLUCENT_EDGE_DENSITY = 0.03
+
+# Score needed for each verdict (out of 7)
+HOLDER_MIN_SCORE = 5
+
+
+@dataclass
+class HolderEvidence:
+    double_edge_ratio: float
+    glare_ratio: float
+    vertical_line_ratio: float
+    color_std: float
+    border_edge_density: float
+
+
+@dataclass
+class HolderVerdict:
+    holder: str                 # "none", "penny_sleeve", "top_loader" or "slab"
+    sleeve: bool
+    top_loader: bool
+    slab: bool
+    translucent_frame: bool     # border_edge_density over TRANSLUCENT_EDGE_DENSITY
+    sleeve_score: int
+    toploader_score: int
+    slab_score: int
+    evidence: HolderEvidence
+    elapsed_ms: float = 0.0
+
+    @property
+    def indicators(self) -> Tuple[bool, bool, bool]:
+        """(sleeve, top_loader, slab), the detect_sleeve_like_features tuple."""
+        return self.sleeve, self.top_loader, self.slab
+
+    @property
+    def in_holder(self) -> bool:
+        return self.sleeve or self.top_loader or self.slab
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+def point_sampled_thumbnail(img_bgr: np.ndarray, max_dim: int) -> Tuple[np.ndarray, float]:
+    """INTER_NEAREST thumbnail with longest side <= max_dim, and its scale."""
+    h, w = img_bgr.shape[:2]
+    scale = min(1.0, max_dim / float(max(h, w)))
+    if scale >= 1.0:
+        return img_bgr, 1.0
+    thumb = cv2.resize(img_bgr, (max(1, int(w * scale)), max(1, int(h * scale))),
+                       interpolation=cv2.INTER_NEAREST)
+    return thumb, scale
+
+
+def border_edge_density(gray: np.ndarray) -> float:
+    """Mean Canny (30/100) density of the four 10% border bands."""
+    h, w = gray.shape[:2]
+    bw = max(1, int(min(h, w) * 0.10))
+    return float(np.mean([
+        np.mean(cv2.Canny(band, 30, 100) > 0)
+        for band in (gray[:bw], gray[-bw:], gray[:, :bw], gray[:, -bw:])
+    ]))
+
+
+def _double_edge_ratio(img_bgr: np.ndarray, band: int) -> float:
+    """Canny (60/120) edge pixels within `band` px of the frame edge, over the frame area."""
+    h, w = img_bgr.shape[:2]
+    band = min(band, h // 2, w // 2)
+    if band <= 0:
+        return 0.0
+    # Strips carry a few pixels of context so Canny's gradients at the band's
+    # inner edge match a full-frame pass; only the band itself is counted.
+    ctx = min(band + 4, h, w)
+
+    def edges(strip: np.ndarray) -> np.ndarray:
+        return cv2.Canny(cv2.cvtColor(strip, cv2.COLOR_BGR2GRAY), 60, 120)
+
+    count = int(np.count_nonzero(edges(img_bgr[:ctx])[:band]))
+    count += int(np.count_nonzero(edges(img_bgr[h - ctx:])[ctx - band:]))
+    if h > 2 * band:
+        count += int(np.count_nonzero(edges(img_bgr[:, :ctx])[band:h - band, :band]))
+        count += int(np.count_nonzero(edges(img_bgr[:, w - ctx:])[band:h - band, ctx - band:]))
+    return count / float(h * w)
+
+
+def score_holder(e: HolderEvidence) -> Tuple[int, int, int]:
+    """(sleeve, top loader, slab) scores; thresholds from detect_sleeve_like_features."""
+    # Penny sleeves: moderate edges, glare split around natural card glare
+    # (15-19%), vertical reflection lines, normal color variation
+    sleeve_score = 0
+    if 0.015 < e.double_edge_ratio < 0.045:
+        sleeve_score += 2
+    if (0.005 < e.glare_ratio < 0.12) or (0.20 < e.glare_ratio < 0.35):
+        sleeve_score += 3
+    if e.vertical_line_ratio > 0.015:
+        sleeve_score += 1
+    if 15.0 < e.color_std < 45:
+        sleeve_score += 1
+
+    # Top loaders: thicker edges, very high glare, more color dampening
+    toploader_score = 0
+    if e.double_edge_ratio > 0.03:
+        toploader_score += 2
+    if 0.35 < e.glare_ratio < 0.65:
+        toploader_score += 3
+    if e.vertical_line_ratio > 0.015:
+        toploader_score += 1
+    if e.color_std < 20:
+        toploader_score += 1
+
+    # Slabs: very thick edges, extreme glare, significant dampening
+    slab_score = 0
+    if e.double_edge_ratio > 0.06:
+        slab_score += 2
+    if e.glare_ratio > 0.50:
+        slab_score += 3
+    if e.color_std < 12:
+        slab_score += 2
+    return sleeve_score, toploader_score, slab_score
+
+
+def classify_holder(img_bgr: np.ndarray, thumb_dim: int = HOLDER_THUMB_DIM,
+                    band_px: int = HOLDER_BAND_PX) -> HolderVerdict:
+    """Holder verdict for a photo (or warped card) from one thumbnail plus its border bands."""
+    t_start = time.perf_counter()
+    thumb, _ = point_sampled_thumbnail(img_bgr, thumb_dim)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+    glare_ratio = float(np.mean((hsv[:, :, 1] < 50) & (hsv[:, :, 2] > 200)))
+
+    grad_x = np.abs(cv2.Sobel(cv2.GaussianBlur(gray, (3, 3), 0), cv2.CV_16S, 1, 0, ksize=3))
+    vertical_line_ratio = float(np.mean(grad_x > np.percentile(grad_x, 98)))
+
+    # Joint std of a and b from per-channel moments
+    lab_mean, lab_std = cv2.meanStdDev(cv2.cvtColor(thumb, cv2.COLOR_BGR2LAB))
+    ab_mean, ab_std = lab_mean.ravel()[1:], lab_std.ravel()[1:]
+    color_std = float(np.sqrt(max(0.0, np.mean(ab_std ** 2 + ab_mean ** 2) - np.mean(ab_mean) ** 2)))
+
+    evidence = HolderEvidence(
+        double_edge_ratio=_double_edge_ratio(img_bgr, band_px),
+        glare_ratio=glare_ratio,
+        vertical_line_ratio=vertical_line_ratio,
+        color_std=color_std,
+        border_edge_density=border_edge_density(gray),
+    )
+    sleeve_score, toploader_score, slab_score = score_holder(evidence)
+    sleeve = sleeve_score >= HOLDER_MIN_SCORE
+    top_loader = toploader_score >= HOLDER_MIN_SCORE
+    slab = slab_score >= HOLDER_MIN_SCORE
+
+    # Several matches: glare in the penny sleeve range means penny sleeve
+    if sleeve and (top_loader or slab) and evidence.glare_ratio < 0.35:
+        top_loader = slab = False
+
+    holder = "slab" if slab else "top_loader" if top_loader else "penny_sleeve" if sleeve else "none"
+    verdict = HolderVerdict(
+        holder=holder,
+        sleeve=sleeve,
+        top_loader=top_loader,
+        slab=slab,
+        translucent_frame=evidence.border_edge_density > TRANSLUCENT_EDGE_DENSITY,
+        sleeve_score=sleeve_score,
+        toploader_score=toploader_score,
+        slab_score=slab_score,
+        evidence=evidence,
+        elapsed_ms=(time.perf_counter() - t_start) * 1000.0,
+    )
+    print(f"[Holder] {holder} (scores sleeve={sleeve_score}, toploader={toploader_score}, slab={slab_score}; "
+          f"edge_ratio={evidence.double_edge_ratio:.3f}, glare={glare_ratio:.3f}, "
+          f"v_lines={vertical_line_ratio:.3f}, color_std={color_std:.1f}) {verdict.elapsed_ms:.1f}ms")
+    return verdict
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Illumination and Color Normalization
+====================================
+
+One normalization implementation for every OpenCV service: the Stage 1 card
+analysis pipeline (card_cv_stage1.py) and the card_detection_service
+processors (stage0 v3.4 equalize_lighting, v3.1 _apply_clahe_bgr).
+
+Cost model:
+- Gray-World gains are estimated on a strided subsample (~256px), not the
+  whole frame, and applied as a per-channel uint8 LUT instead of a float32
+  split / multiply / merge.
+- CLAHE operators are cached per thread and per (clip limit, tile grid);
+  cv2.CLAHE objects are not safe to share across threads.
+- normalize_for_detection() downsizes before normalizing, so the detector
+  pipeline never pays for full-resolution normalization it does not need.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+# Longest side of the subsample used to estimate white-balance gains
+WB_SAMPLE_DIM = 256
+
+# Longest side of the detection-only normalized image. Quad detectors already
+# run at <= 1200px, so normalizing more pixels than this only feeds scoring.
+DETECTION_MAX_DIM = 1200
+
+_thread_local = threading.local()
+
+
+def get_clahe(clip_limit: float, tile_grid: Tuple[int, int] = (8, 8)) -> "cv2.CLAHE":
+    """CLAHE operator for the calling thread, created once per parameter set."""
+    cache: Dict[Tuple[float, Tuple[int, int]], "cv2.CLAHE"] = getattr(_thread_local, "clahe", None)
+    if cache is None:
+        cache = {}
+        _thread_local.clahe = cache
+    key = (float(clip_limit), tuple(tile_grid))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=float(clip_limit), tileGridSize=tuple(tile_grid))
+        cache[key] = clahe
+    return clahe
+
+
+def gray_world_gains(img_bgr: np.ndarray, sample_dim: int = WB_SAMPLE_DIM) -> Tuple[float, float, float]:
+    """Per-channel (B, G, R) Gray-World gains estimated from a strided subsample."""
+    h, w = img_bgr.shape[:2]
+    step = max(1, max(h, w) // sample_dim)
+    means = img_bgr[::step, ::step].reshape(-1, 3).mean(axis=0)
+    k = float(means.mean())
+    eps = 1e-6
+    return tuple(float(k / (m + eps)) for m in means)
+
+
+def apply_channel_gains(img_bgr: np.ndarray, gains: Tuple[float, float, float]) -> np.ndarray:
+    """Multiply each channel by its gain through a uint8 LUT (clipped, truncated)."""
+    levels = np.arange(256, dtype=np.float32)
+    lut = np.stack([np.clip(levels * g, 0, 255).astype(np.uint8) for g in gains], axis=-1)
+    return cv2.LUT(img_bgr, lut.reshape(256, 1, 3))
+
+
+def gray_world_balance(img_bgr: np.ndarray) -> np.ndarray:
+    return apply_channel_gains(img_bgr, gray_world_gains(img_bgr))
+
+
+def clahe_gray(gray: np.ndarray, clip_limit: float = 2.0, tile_grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+    return get_clahe(clip_limit, tile_grid).apply(gray)
+
+
+# card_detection_service/image_normalization.py carries a copy; keep them in step
+def clahe_luminance(img_bgr: np.ndarray, clip_limit: float = 2.0,
+                    tile_grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+    """CLAHE on the LAB L channel, color channels untouched."""
+    lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
+    lab[:, :, 0] = get_clahe(clip_limit, tile_grid).apply(np.ascontiguousarray(lab[:, :, 0]))
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def normalize_illumination(img_bgr: np.ndarray, clip_limit: float = 2.5,
+                           white_balance: bool = True) -> np.ndarray:
+    """Gray-World white balance followed by CLAHE on luminance."""
+    balanced = gray_world_balance(img_bgr) if white_balance else img_bgr
+    return clahe_luminance(balanced, clip_limit)
+
+
+def normalize_for_detection(img_bgr: np.ndarray, max_dim: int = DETECTION_MAX_DIM,
+                            clip_limit: float = 2.5) -> Tuple[np.ndarray, float]:
+    """
+    Detection-only normalization at reduced resolution.
+
+    Returns:
+        (normalized, scale) where scale maps normalized-image coordinates back
+        to img_bgr coordinates (multiply points by scale).
+    """
+    h, w = img_bgr.shape[:2]
+    factor = min(1.0, max_dim / float(max(h, w)))
+    if factor < 1.0:
+        small = cv2.resize(img_bgr, (int(w * factor), int(h * factor)),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img_bgr
+    normalized = normalize_illumination(small, clip_limit)
+    return normalized, w / float(normalized.shape[1])
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Live Capture Guidance
+=====================
+
+Per-frame card detection and capture hints for the mobile camera preview, so
+the user is told to move closer, level the phone or dodge a reflection before
+the shot instead of after an upload. Served over a WebSocket (/live-guidance
+in api_server); one LiveGuidanceSession per connection.
+
+Each preview frame is reduced to LIVE_FRAME_DIM, then:
+- tracking     the previous frame's quad is snapped to this frame's edges
+               (quad_hint.snap_quad_to_edges): cheap, and steady between frames.
+               The snapped quad must have edge support on every side and
+               still pass as a card (validate_card_quad, card presence score)
+- detection    without a prior, or when tracking fails: card-shaped contours
+               of the LAB chroma mask and a Canny edge map, scored like the
+               quality gate's card presence, with a bonus for overlapping
+               the previous quad while it is still tracked. An outline
+               filling the frame is the frame, not a card
+- quality      focus, brightness and glare on a LIVE_CARD_HEIGHT warp of the
+               found card, so the background does not count
+
+Hints, most important first (code - text):
+    no_card      point the camera at the card
+    cut_off      fit the whole card in frame        (a corner at the frame edge)
+    move_closer  / move_back                         (card share of the frame)
+    tilt         hold the phone parallel to the card (opposite sides differ)
+    glare        glare <region>                     (worst cell of a 3x3 grid)
+    blurry       hold steady
+    too_dark     / too_bright
+`ready` is set once a hint-free card has held still for LIVE_STABLE_FRAMES
+frames; the client can take the shot then.
+
+Backpressure: run_guidance_socket reads the socket on its own thread into a
+one-frame slot. A frame that arrives while the previous one is processed
+replaces any frame still waiting (counted in "dropped"), so every answer is
+about the newest frame, at most LIVE_MAX_FPS times a second.
+
+Protocol: binary messages are JPEG / PNG / WebP preview frames; text
+messages are JSON controls ({"type": "reset"} forgets the tracked card).
+Every processed frame is answered with LiveGuidance.to_dict() as JSON.
+
+Usage (offline, over stills or a video):
+    python live_guidance.py preview.mp4
+"""
+
+import argparse
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import quality_gate
+from card_cv_stage1 import (_lab_chroma_mask, detect_glare_mask, resize_max_dim, to_gray, validate_card_quad,
+                            variance_of_laplacian)
+from multi_card import _contour_quad
+from quad_hint import snap_quad_to_edges
+
+
+# Longest side preview frames are processed at
+LIVE_FRAME_DIM = 360
+
+# Most guidance messages per second and connection
+LIVE_MAX_FPS = 15.0
+
+# Largest preview frame accepted
+LIVE_MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+# Height of the card warp focus, brightness and glare are measured on
+LIVE_CARD_HEIGHT = 176
+
+# Weakest detection accepted (card presence score, 0-1)
+LIVE_MIN_CARD_SCORE = 0.35
+
+# Detection score bonus at full overlap with the previous frame's quad
+LIVE_PRIOR_WEIGHT = 0.5
+
+# Share of the frame a found card may cover (validate_card_quad area range)
+LIVE_CARD_AREA_RANGE = (0.02, 0.97)
+
+# Edge support (quad_hint side support, 0-1) every side of a tracked quad needs
+LIVE_MIN_TRACK_SUPPORT = 0.6
+
+# Card share of the frame
+LIVE_MIN_AREA_SHARE = 0.20
+LIVE_MAX_AREA_SHARE = 0.85
+
+# Corners closer than this share of the frame to its edge are cut off
+LIVE_EDGE_MARGIN = 0.01
+
+# Relative length difference between opposite sides
+LIVE_MAX_KEYSTONE = 0.08
+
+# Laplacian variance of the card warp below this is blurred
+LIVE_MIN_FOCUS = 250.0
+
+# Glare coverage (%) of the worst 3x3 card cell
+LIVE_MAX_GLARE_CELL_PERCENT = 8.0
+
+# Largest corner motion (share of the frame diagonal) that counts as still
+LIVE_STABLE_SHIFT = 0.01
+LIVE_STABLE_FRAMES = 3
+
+_GLARE_REGIONS = (("top-left", "top", "top-right"),
+                  ("left", "center", "right"),
+                  ("bottom-left", "bottom", "bottom-right"))
+
+_HINT_TEXT = {
+    "no_card": "point the camera at the card",
+    "cut_off": "fit the whole card in frame",
+    "move_closer": "move closer",
+    "move_back": "move back",
+    "tilt": "hold the phone parallel to the card",
+    "glare": "glare",
+    "blurry": "hold steady",
+    "too_dark": "more light",
+    "too_bright": "less light",
+}
+
+
+@dataclass
+class LiveGuidance:
+    frame: int                          # sequence number of the answered frame, 1-based
+    card_found: bool
+    quad: Optional[List[List[float]]]   # normalized [TL, TR, BR, BL]
+    method: Optional[str]               # "tracked" or "detected"
+    hints: List[Dict[str, str]] = field(default_factory=list)
+    ready: bool = False
+    area_share: Optional[float] = None
+    keystone: Optional[float] = None
+    focus_variance: Optional[float] = None
+    brightness_mean: Optional[float] = None
+    glare_percent: Optional[float] = None
+    dropped: int = 0                    # frames skipped since the previous answer
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d["type"] = "guidance"
+        return d
+
+
+def _hint(code: str, region: Optional[str] = None) -> Dict[str, str]:
+    if region is None:
+        return {"code": code, "text": _HINT_TEXT[code]}
+    return {"code": code, "text": f"{_HINT_TEXT[code]} {region}", "region": region}
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+
+def _card_score(cnt: np.ndarray, frame_area: float) -> float:
+    """Card presence score of one contour (quality_gate.card_presence_score terms)."""
+    (_, _), (rw, rh), _ = cv2.minAreaRect(cnt)
+    if rw < 1 or rh < 1:
+        return 0.0
+    aspect = min(rw, rh) / max(rw, rh)
+    fill = cv2.contourArea(cv2.convexHull(cnt)) / (rw * rh)
+    return (min(1.0, (rw * rh / frame_area) / 0.15) *
+            max(0.0, 1.0 - abs(aspect - quality_gate.CARD_ASPECT) / 0.2) *
+            min(1.0, fill / 0.85))
+
+
+def _is_card(img_small: np.ndarray, quad: np.ndarray) -> bool:
+    """Whether a quad passes as a card in the frame: validate_card_quad plus the presence score."""
+    h, w = img_small.shape[:2]
+    valid, _ = validate_card_quad(img_small, quad, area_range=LIVE_CARD_AREA_RANGE)
+    return valid and _card_score(quad.reshape(-1, 1, 2).astype(np.float32), float(h * w)) >= LIVE_MIN_CARD_SCORE
+
+
+def _overlap(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection over union of two convex quads."""
+    inter, _ = cv2.intersectConvexConvex(a.astype(np.float32), b.astype(np.float32))
+    union = cv2.contourArea(a.astype(np.float32)) + cv2.contourArea(b.astype(np.float32)) - inter
+    return float(inter) / max(1e-6, union)
+
+
+def detect_preview_quad(img_small: np.ndarray, prior: Optional[np.ndarray] = None) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Best card quad in a preview frame (img_small pixels) and its score.
+
+    prior: the previous frame's quad in the same pixels; candidates
+    overlapping it score up to LIVE_PRIOR_WEIGHT higher.
+    """
+    h, w = img_small.shape[:2]
+    gray = cv2.GaussianBlur(to_gray(img_small), (5, 5), 0)
+    edges = cv2.morphologyEx(cv2.Canny(gray, 40, 120), cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+    # A reflection over the card merges with it in both maps; cut it out so
+    # the card's outline is a card with a bite rather than card plus blob
+    glare = detect_glare_mask(img_small) > 0
+    best, best_score = None, 0.0
+    chroma = _lab_chroma_mask(img_small)
+    # On a colored background the chroma mask fills the frame and the card
+    # is a hole in it; the inverted mask has the card's outline
+    for mask in (chroma, cv2.bitwise_not(chroma), edges):
+        mask[glare] = 0
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            score = _card_score(cnt, float(h * w))
+            if score <= 0.0:
+                continue
+            quad = _contour_quad(cnt)
+            valid, _ = validate_card_quad(img_small, quad, area_range=LIVE_CARD_AREA_RANGE)
+            if not valid:
+                continue
+            if prior is not None:
+                score *= 1.0 + LIVE_PRIOR_WEIGHT * _overlap(quad, prior)
+            if score > best_score:
+                best, best_score = quad, score
+    if best_score < LIVE_MIN_CARD_SCORE:
+        return None, best_score
+    return best, best_score
+
+
+def _track_quad(img_small: np.ndarray, prior: np.ndarray) -> Optional[np.ndarray]:
+    """The previous quad snapped to this frame's edges, if every side found an edge and it still fits a card."""
+    quad, report = snap_quad_to_edges(img_small, prior)
+    if quad is None or min(report["side_support"]) < LIVE_MIN_TRACK_SUPPORT:
+        return None
+    if not cv2.isContourConvex(quad.reshape(-1, 1, 2)) or not _is_card(img_small, quad):
+        return None
+    return quad
+
+
+# -----------------------------
+# Session
+# -----------------------------
+
+class LiveGuidanceSession:
+    """Guidance state of one preview stream: the tracked quad and how long it has held still."""
+
+    def __init__(self):
+        self.frames = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self._prior: Optional[np.ndarray] = None     # normalized quad of the previous frame
+        self._still_frames = 0
+
+    def process(self, img_bgr: np.ndarray, dropped: int = 0, frame: Optional[int] = None) -> LiveGuidance:
+        """Guidance for one preview frame (any size; reduced to LIVE_FRAME_DIM)."""
+        t_start = time.perf_counter()
+        self.frames = frame if frame is not None else self.frames + 1
+        img = resize_max_dim(img_bgr, LIVE_FRAME_DIM)
+        h, w = img.shape[:2]
+        scale = np.array([w, h], dtype=np.float32)
+        prior = self._prior * scale if self._prior is not None else None
+
+        quad, method = None, None
+        if prior is not None:
+            quad = _track_quad(img, prior)
+            method = "tracked" if quad is not None else None
+        if quad is None:
+            # A prior that no longer tracks is not evidence for any candidate
+            quad, _ = detect_preview_quad(img)
+            method = "detected" if quad is not None else None
+
+        if quad is None:
+            self.reset()
+            return LiveGuidance(frame=self.frames, card_found=False, quad=None, method=None,
+                                hints=[_hint("no_card")], dropped=dropped,
+                                elapsed_ms=(time.perf_counter() - t_start) * 1000.0)
+
+        normalized = quad / scale
+        shift = None if self._prior is None else float(np.max(np.linalg.norm(normalized - self._prior, axis=1)))
+        self._prior = normalized
+        result = self._measure(img, quad)
+        result.frame, result.method, result.dropped = self.frames, method, dropped
+        result.quad = np.round(normalized, 4).tolist()
+
+        if result.hints or shift is None or shift > LIVE_STABLE_SHIFT * np.sqrt(2.0):
+            self._still_frames = 0
+        else:
+            self._still_frames += 1
+        result.ready = self._still_frames >= LIVE_STABLE_FRAMES
+        result.elapsed_ms = (time.perf_counter() - t_start) * 1000.0
+        return result
+
+    def _measure(self, img: np.ndarray, quad: np.ndarray) -> LiveGuidance:
+        """Framing and quality hints for a found card."""
+        h, w = img.shape[:2]
+        hints = []
+        margin = LIVE_EDGE_MARGIN * max(h, w)
+        if (np.any(quad < margin) or np.any(quad[:, 0] > w - 1 - margin) or
+                np.any(quad[:, 1] > h - 1 - margin)):
+            hints.append(_hint("cut_off"))
+        area_share = float(cv2.contourArea(quad)) / float(h * w)
+        if area_share < LIVE_MIN_AREA_SHARE:
+            hints.append(_hint("move_closer"))
+        elif area_share > LIVE_MAX_AREA_SHARE:
+            hints.append(_hint("move_back"))
+
+        sides = [float(np.linalg.norm(quad[(i + 1) % 4] - quad[i])) for i in range(4)]
+        keystone = max(abs(sides[0] - sides[2]) / max(sides[0], sides[2]),
+                       abs(sides[1] - sides[3]) / max(sides[1], sides[3]))
+        if keystone > LIVE_MAX_KEYSTONE:
+            hints.append(_hint("tilt"))
+
+        # Quality on the card itself, upright
+        card_w = int(round(LIVE_CARD_HEIGHT * quality_gate.CARD_ASPECT))
+        dst = np.array([[0, 0], [card_w - 1, 0], [card_w - 1, LIVE_CARD_HEIGHT - 1], [0, LIVE_CARD_HEIGHT - 1]],
+                       dtype=np.float32)
+        card = cv2.warpPerspective(img, cv2.getPerspectiveTransform(quad.astype(np.float32), dst),
+                                   (card_w, LIVE_CARD_HEIGHT))
+        gray = to_gray(card)
+        focus = variance_of_laplacian(gray)
+        brightness = float(gray.mean())
+        glare = detect_glare_mask(card) > 0
+        cells = [[float(glare[r * LIVE_CARD_HEIGHT // 3:(r + 1) * LIVE_CARD_HEIGHT // 3,
+                              c * card_w // 3:(c + 1) * card_w // 3].mean() * 100.0)
+                  for c in range(3)] for r in range(3)]
+        worst_r, worst_c = np.unravel_index(int(np.argmax(cells)), (3, 3))
+        if cells[worst_r][worst_c] > LIVE_MAX_GLARE_CELL_PERCENT:
+            hints.append(_hint("glare", _GLARE_REGIONS[worst_r][worst_c]))
+        if focus < LIVE_MIN_FOCUS:
+            hints.append(_hint("blurry"))
+        if brightness < quality_gate.MIN_BRIGHTNESS:
+            hints.append(_hint("too_dark"))
+        elif brightness > quality_gate.MAX_BRIGHTNESS:
+            hints.append(_hint("too_bright"))
+
+        return LiveGuidance(
+            frame=0, card_found=True, quad=None, method=None, hints=hints,
+            area_share=round(area_share, 4),
+            keystone=round(keystone, 4),
+            focus_variance=round(focus, 1),
+            brightness_mean=round(brightness, 1),
+            glare_percent=round(float(glare.mean() * 100.0), 2),
+        )
+
+
+# -----------------------------
+# WebSocket loop
+# -----------------------------
+
+class _LatestFrame:
+    """One-frame slot between the socket reader and the processing loop."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame: Optional[bytes] = None
+        self.received = 0
+        self.dropped = 0
+        self.reset_requested = False
+        self.closed = False
+
+    def put(self, frame: bytes) -> None:
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self.received += 1
+            self._frame = frame
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def take(self) -> Optional[Tuple[bytes, int, int]]:
+        """Newest frame, its sequence number and the frames dropped before it; None once closed."""
+        with self._cond:
+            while self._frame is None and not self.closed:
+                self._cond.wait()
+            if self.closed:
+                return None
+            frame, seq, dropped = self._frame, self.received, self.dropped
+            self._frame, self.dropped = None, 0
+            return frame, seq, dropped
+
+
+def decode_preview(data: bytes) -> Optional[np.ndarray]:
+    """Preview frame bytes to a BGR image at most LIVE_FRAME_DIM on its longest side."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return None if img is None else resize_max_dim(img, LIVE_FRAME_DIM)
+
+
+def run_guidance_socket(ws, session: Optional[LiveGuidanceSession] = None) -> None:
+    """
+    Serve one guidance connection until the client closes it.
+
+    ws: any socket with blocking receive() -> bytes | str | None and
+    send(str), e.g. a flask-sock connection.
+    """
+    session = session or LiveGuidanceSession()
+    slot = _LatestFrame()
+
+    def read() -> None:
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, (bytes, bytearray)):
+                    slot.put(bytes(message))
+                    continue
+                try:
+                    control = json.loads(message)
+                except ValueError:
+                    continue
+                if isinstance(control, dict) and control.get("type") == "reset":
+                    slot.reset_requested = True
+        except Exception:
+            pass    # the connection closed
+        finally:
+            slot.close()
+
+    threading.Thread(target=read, name="live-guidance-reader", daemon=True).start()
+    interval = 1.0 / LIVE_MAX_FPS
+    while True:
+        taken = slot.take()
+        if taken is None:
+            return
+        t_start = time.perf_counter()
+        data, seq, dropped = taken
+        if slot.reset_requested:
+            slot.reset_requested = False
+            session.reset()
+        img = decode_preview(data) if len(data) <= LIVE_MAX_FRAME_BYTES else None
+        if img is None:
+            message = {"type": "error", "frame": seq, "dropped": dropped,
+                       "message": "Could not decode frame" if len(data) <= LIVE_MAX_FRAME_BYTES
+                       else f"Frame exceeds {LIVE_MAX_FRAME_BYTES} bytes"}
+        else:
+            message = session.process(img, dropped=dropped, frame=seq).to_dict()
+        try:
+            ws.send(json.dumps(message))
+        except Exception:
+            return
+        # Frames arriving during the pause replace each other in the slot
+        pause = interval - (time.perf_counter() - t_start)
+        if pause > 0:
+            time.sleep(pause)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Print live capture guidance for preview stills or a video.")
+    parser.add_argument("inputs", type=str, nargs="+", help="Image paths, or one video file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    session = LiveGuidanceSession()
+    video = cv2.VideoCapture(args.inputs[0]) if len(args.inputs) == 1 else None
+    frames = []
+    if video is not None and video.isOpened():
+        ok, img = video.read()
+        while ok:
+            frames.append(img)
+            ok, img = video.read()
+    if not frames:
+        frames = [cv2.imread(p, cv2.IMREAD_COLOR) for p in args.inputs]
+    for img in frames:
+        if img is None:
+            continue
+        g = session.process(img)
+        hints = ", ".join(h["text"] for h in g.hints) or ("ready" if g.ready else "-")
+        print(f"frame {g.frame:4d} {g.method or 'no card':8s} {g.elapsed_ms:5.1f}ms  {hints}")
+
+
+if __name__ == "__main__":
+    main()
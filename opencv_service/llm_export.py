@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Card Export
+===============
+
+A cropped, deskewed JPEG or WebP of each card side for the vision-LLM
+grading stage, sized to a pixel budget and a byte budget, so background
+pixels and 12 MP phone photos stop inflating model latency and cost.
+
+The card is resampled once, straight from the decoded photo through the
+detection homography (WarpPyramid.view), at the largest size within
+max_pixels - never above the photo's own detail - with a thin margin so the
+card edges stay in frame. Encoding then looks for the highest quality in
+EXPORT_QUALITY_RANGE that fits max_bytes (at most EXPORT_MAX_ENCODES encodes
+per size); if even the lowest quality does not fit, the image is shrunk and
+encoded again.
+
+Defaults (environment overrides):
+    OPENCV_EXPORT_FORMAT       jpeg | webp                  (jpeg)
+    OPENCV_EXPORT_MAX_PIXELS   output width x height        (1150000, ~1.15 MP:
+                               the size common vision APIs downscale to anyway)
+    OPENCV_EXPORT_MAX_BYTES    encoded size                 (400000)
+    OPENCV_EXPORT_DELIVERY     inline (base64 in the JSON) | reference (a file /
+                               URL to fetch)                (inline)
+
+WebP is roughly a third smaller than JPEG at equal quality but ~25x slower to
+encode with OpenCV's encoder (~150ms per MP here); JPEG is the default.
+"""
+
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+EXPORT_FORMATS = {"jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+                  "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp")}
+EXPORT_DELIVERIES = ("inline", "reference")
+
+EXPORT_FORMAT = os.environ.get("OPENCV_EXPORT_FORMAT", "jpeg").strip().lower()
+EXPORT_MAX_PIXELS = int(os.environ.get("OPENCV_EXPORT_MAX_PIXELS", "1150000"))
+EXPORT_MAX_BYTES = int(os.environ.get("OPENCV_EXPORT_MAX_BYTES", "400000"))
+EXPORT_DELIVERY = os.environ.get("OPENCV_EXPORT_DELIVERY", "inline").strip().lower()
+
+# Budgets accepted from a request
+EXPORT_PIXEL_LIMITS = (65536, 16000000)
+EXPORT_BYTE_LIMITS = (10000, 20000000)
+
+# Margin around the card, as a share of the card height
+EXPORT_MARGIN = 0.02
+
+# Encoder quality searched for the byte budget
+EXPORT_QUALITY_RANGE = (50, 90)
+EXPORT_MAX_ENCODES = 4
+
+# Shrink step when the lowest quality is over budget, and most shrinks
+EXPORT_SHRINK_HEADROOM = 0.9
+EXPORT_MAX_SHRINKS = 4
+
+
+@dataclass(frozen=True)
+class ExportOptions:
+    format: str = EXPORT_FORMAT
+    max_pixels: int = EXPORT_MAX_PIXELS
+    max_bytes: int = EXPORT_MAX_BYTES
+    delivery: str = EXPORT_DELIVERY
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+@dataclass
+class CardExport:
+    format: str
+    mime_type: str
+    width: int
+    height: int
+    quality: int
+    bytes: int
+    scale: float                # output pixels per decoded-photo pixel on the card
+    deskewed: bool              # False when no card was detected: the whole photo is exported
+    within_budget: bool
+    options: Dict[str, any] = field(default_factory=dict)
+    image: bytes = field(default=b"", repr=False)
+
+    @property
+    def extension(self) -> str:
+        return EXPORT_FORMATS[self.format][0]
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d.pop("image")
+        return d
+
+
+def _bounded_int(value, name: str, limits: Tuple[int, int]) -> int:
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if not limits[0] <= n <= limits[1]:
+        raise ValueError(f"{name} must be between {limits[0]} and {limits[1]}")
+    return n
+
+
+def parse_export_options(fmt=None, max_pixels=None, max_bytes=None, delivery=None) -> Optional[ExportOptions]:
+    """
+    ExportOptions from request parameters, or None when none were given.
+
+    Parameters left out take the module defaults. Raises ValueError for an
+    unknown format or delivery, or a budget outside the accepted limits.
+    """
+    if all(v is None or (isinstance(v, str) and not v.strip()) for v in (fmt, max_pixels, max_bytes, delivery)):
+        return None
+    fmt = str(fmt or EXPORT_FORMAT).strip().lower()
+    fmt = "jpeg" if fmt == "jpg" else fmt
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of: {', '.join(EXPORT_FORMATS)}")
+    delivery = str(delivery or EXPORT_DELIVERY).strip().lower()
+    if delivery not in EXPORT_DELIVERIES:
+        raise ValueError(f"Unknown export delivery '{delivery}'. Expected one of: {', '.join(EXPORT_DELIVERIES)}")
+    return ExportOptions(
+        format=fmt,
+        max_pixels=EXPORT_MAX_PIXELS if max_pixels in (None, "") else
+        _bounded_int(max_pixels, "export_max_pixels", EXPORT_PIXEL_LIMITS),
+        max_bytes=EXPORT_MAX_BYTES if max_bytes in (None, "") else
+        _bounded_int(max_bytes, "export_max_bytes", EXPORT_BYTE_LIMITS),
+        delivery=delivery,
+    )
+
+
+def _encode_within(img: np.ndarray, fmt: str, max_bytes: int) -> Tuple[bytes, int]:
+    """(bytes, quality): the highest searched quality that fits max_bytes, else the lowest quality."""
+    ext, flag, _ = EXPORT_FORMATS[fmt]
+
+    def encode(q: int) -> bytes:
+        ok, buf = cv2.imencode(ext, img, [flag, int(q)])
+        if not ok:
+            raise ValueError(f"Could not encode {fmt}")
+        return buf.tobytes()
+
+    lo, hi = EXPORT_QUALITY_RANGE
+    best = encode(hi)
+    if len(best) <= max_bytes:
+        return best, hi
+    floor = encode(lo)
+    if len(floor) > max_bytes:
+        return floor, lo
+    best, best_q = floor, lo
+    for _ in range(EXPORT_MAX_ENCODES - 2):
+        if hi - lo <= 1:
+            break
+        mid = (lo + hi) // 2
+        data = encode(mid)
+        if len(data) <= max_bytes:
+            best, best_q, lo = data, mid, mid
+        else:
+            hi = mid
+    return best, best_q
+
+
+def export_card(photo_bgr: np.ndarray, pyramid, deskewed: bool, options: ExportOptions) -> CardExport:
+    """
+    Encode a side for the LLM stage.
+
+    photo_bgr is the image the pyramid's quad refers to (the decoded photo);
+    deskewed says whether the pyramid follows a detected card.
+    """
+    margin = EXPORT_MARGIN * pyramid.height if deskewed else 0.0
+    region_w, region_h = pyramid.width + 2.0 * margin, pyramid.height + 2.0 * margin
+    # Output pixels per warp pixel: the pixel budget, capped at the photo's own density
+    native = pyramid.src_card_height / float(pyramid.height)
+    scale = min(math.sqrt(options.max_pixels / (region_w * region_h)), native)
+
+    for _ in range(EXPORT_MAX_SHRINKS + 1):
+        out_w, out_h = max(1, int(region_w * scale)), max(1, int(region_h * scale))
+        img = pyramid.view(photo_bgr, -margin, -margin, out_w, out_h, scale)
+        data, quality = _encode_within(img, options.format, options.max_bytes)
+        if len(data) <= options.max_bytes:
+            break
+        # Encoded size is roughly proportional to the pixel count
+        scale *= math.sqrt(options.max_bytes / float(len(data))) * EXPORT_SHRINK_HEADROOM
+
+    return CardExport(
+        format=options.format,
+        mime_type=EXPORT_FORMATS[options.format][2],
+        width=out_w,
+        height=out_h,
+        quality=quality,
+        bytes=len(data),
+        scale=round(scale / native, 4),
+        deskewed=deskewed,
+        within_budget=len(data) <= options.max_bytes,
+        options=options.to_dict(),
+        image=data,
+    )
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-Card Pages
+================
+
+Grades every card in one photo - a 9-pocket binder page, or 4-12 cards laid
+out on a mat - instead of one upload per card.
+
+Detection (detect_card_quads) reuses the single-card building blocks:
+- candidate outlines from the fused edge map (_generate_enhanced_edges, the
+  fused_edges detector) and the LAB chroma mask (lab_chroma), taking every
+  card-like contour instead of the largest; both maps are also opened so
+  cards touching pocket seams or neighbours separate
+- validate_card_quad with a per-card area range
+- score_quad_fusion under a multi-card profile
+then keeps the best-scoring quads that do not overlap (an outline just
+around an accepted one - the card around its artwork frame - replaces it).
+That first pass sets the page's card size; the overlap pass is rerun on the
+candidates with card proportions within MULTI_CARD_SIZE_RANGE of it, so an
+artwork circle or window that outscored its card cannot shadow it. Grid
+rows / columns come from the card centers.
+
+Candidates come from a contour extractor of its own rather than the
+single-card detector cascade: every detector in the cascade returns one
+quad per image (the best or largest outline), while a page needs every
+card-like contour. The maps the cascade detectors threshold (fused edges,
+LAB chroma) and its validation and scoring are shared.
+
+Each card is then measured through SIDE_PIPELINE with the page decode,
+quality gate and its own quad seeded as stage values, so only the warp and
+post-warp stages run per card. Cards run concurrently on their own pool
+(each card's stages run sequentially, so the pool is not oversubscribed).
+
+Usage:
+    python multi_card.py binder_page.jpg --outdir ./out
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from card_cv_stage1 import (
+    PROFILES, SIDE_PIPELINE, SideMetrics, _generate_enhanced_edges, _lab_chroma_mask, assess_image_quality,
+    detect_glare_mask, ensure_outdir, imread_color, order_quad_points, reshoot_side_metrics, resize_max_dim,
+    score_quad_fusion, serialize_side_metrics, side_metrics_from_run, validate_card_quad
+)
+from fidelity_tiers import FidelityTier, get_tier
+from holder_classifier import classify_holder
+from illumination import normalize_for_detection
+from llm_export import ExportOptions
+from pipeline import STAGE_WORKERS, PipelineRun, StageCache, file_digest, fingerprint
+
+
+# Page photos are decoded larger than single-card photos (2200px) so each
+# card keeps close to the single-card resolution after warping.
+MULTI_CARD_DECODE_DIM = 4000
+
+# Longest side of the detection image
+MULTI_CARD_DETECTION_DIM = 1600
+
+# Share of the photo one card may cover
+MULTI_CARD_AREA_RANGE = (0.01, 0.40)
+
+# Cards are dropped below this score_quad_fusion score
+MULTI_CARD_MIN_SCORE = 55.0
+
+# Intersection over the smaller quad above which two candidates are the same card
+MULTI_CARD_MAX_OVERLAP = 0.15
+
+# Cards on one page are the same size: area limits relative to the median card
+MULTI_CARD_SIZE_RANGE = (0.6, 1.6)
+
+# Short / long side ratio of a card outline (63x88mm is 0.72), either orientation
+MULTI_CARD_ASPECT_RANGE = (0.55, 0.85)
+
+# Largest area ratio at which an outline enclosing an accepted card replaces it
+MULTI_CARD_NESTED_GROWTH = 1.5
+
+MAX_CARDS = 24
+
+# score_quad_fusion profile: per-card area bounds, raw-card aspect and glare limits
+MULTI_CARD_PROFILE = replace(PROFILES["raw_on_mat"], name="multi_card",
+                             min_area_ratio=MULTI_CARD_AREA_RANGE[0], max_area_ratio=MULTI_CARD_AREA_RANGE[1],
+                             detector_order=["fused_edges", "lab_chroma"],
+                             notes="Several cards in one photo (binder page, grid on a mat)")
+
+
+@dataclass
+class CardPlacement:
+    index: int                  # row-major reading order
+    row: int
+    col: int
+    quad: np.ndarray            # [TL, TR, BR, BL] in detection-image pixels
+    quad_normalized: List[List[float]]
+    score: float
+    confidence: str
+    method: str
+    area_ratio: float
+
+    @property
+    def label(self) -> str:
+        return f"r{self.row + 1}c{self.col + 1}"
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d.pop("quad")
+        d["label"] = self.label
+        return d
+
+
+@dataclass
+class MultiCardMetrics:
+    cards: List[SideMetrics]
+    placements: List[CardPlacement]
+    rows: int
+    cols: int
+    width: int                  # decoded photo size
+    height: int
+    quality_gate: Optional[Dict[str, any]] = None
+    detection_ms: float = 0.0
+    analysis_ms: float = 0.0
+    version: str = "stage1_opencv_multi_v1.0"
+    run_id: str = ""
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+
+def _contour_quad(cnt: np.ndarray) -> np.ndarray:
+    """Four-corner outline of a contour: its polygon if it is a convex quad, else its min-area box."""
+    peri = cv2.arcLength(cnt, True)
+    approx = cv2.approxPolyDP(cnt, 0.02 * peri, True)
+    if len(approx) == 4 and cv2.isContourConvex(approx):
+        return order_quad_points(approx.reshape(4, 2).astype(np.float32))
+    return order_quad_points(cv2.boxPoints(cv2.minAreaRect(cnt)).astype(np.float32))
+
+
+def _candidate_quads(img_small: np.ndarray, edges_small: np.ndarray) -> List[Tuple[np.ndarray, str]]:
+    """Card-sized outlines from the fused edge map and the LAB chroma mask (img_small pixels)."""
+    h, w = img_small.shape[:2]
+    min_area = MULTI_CARD_AREA_RANGE[0] * h * w * 0.8
+    max_area = MULTI_CARD_AREA_RANGE[1] * h * w * 1.2
+    # Opening with a kernel wider than pocket seams and card gaps separates
+    # cards that touch their neighbours through thin lines
+    k = max(3, int(round(min(h, w) * 0.015)) | 1)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (k, k))
+    chroma = _lab_chroma_mask(img_small)
+    candidates = []
+    sources = (
+        # Edge contours at every nesting level: binder pockets outline each card
+        ("fused_edges", edges_small, cv2.RETR_LIST),
+        ("fused_edges", cv2.morphologyEx(edges_small, cv2.MORPH_OPEN, kernel), cv2.RETR_EXTERNAL),
+        ("lab_chroma", chroma, cv2.RETR_EXTERNAL),
+        ("lab_chroma", cv2.morphologyEx(chroma, cv2.MORPH_OPEN, kernel), cv2.RETR_EXTERNAL),
+    )
+    for method, mask, mode in sources:
+        contours, _ = cv2.findContours(mask, mode, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in contours:
+            (_, _), (rw, rh), _ = cv2.minAreaRect(cnt)
+            if not (min_area <= rw * rh <= max_area):
+                continue
+            # Mostly-empty outlines (an L of edges) are not cards
+            if cv2.contourArea(cv2.convexHull(cnt)) < 0.7 * rw * rh:
+                continue
+            candidates.append((_contour_quad(cnt), method))
+    return candidates
+
+
+def _overlap(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection area over the smaller quad's area."""
+    inter, _ = cv2.intersectConvexConvex(a.astype(np.float32), b.astype(np.float32))
+    return float(inter) / max(1e-6, min(cv2.contourArea(a), cv2.contourArea(b)))
+
+
+def _is_card_shaped(quad: np.ndarray) -> bool:
+    """Short / long side ratio within MULTI_CARD_ASPECT_RANGE."""
+    sides = np.linalg.norm(quad - np.roll(quad, -1, axis=0), axis=1)
+    a, b = (sides[0] + sides[2]) / 2.0, (sides[1] + sides[3]) / 2.0
+    aspect = min(a, b) / max(a, b, 1e-6)
+    return MULTI_CARD_ASPECT_RANGE[0] <= aspect <= MULTI_CARD_ASPECT_RANGE[1]
+
+
+def _non_overlapping(scored: List[tuple]) -> List[tuple]:
+    """
+    Greedy pick over score-sorted candidates; one overlapping an accepted
+    card is the same card. A slightly larger outline around an accepted one
+    is the card around its artwork frame and replaces it, as the single-card
+    detector prefers the card outline.
+    """
+    accepted = []
+    for cand in scored:
+        clashes = [i for i, a in enumerate(accepted) if _overlap(cand[2], a[2]) > MULTI_CARD_MAX_OVERLAP]
+        if not clashes:
+            accepted.append(cand)
+        elif len(clashes) == 1:
+            inner = accepted[clashes[0]]
+            growth = cv2.contourArea(cand[2]) / max(1e-6, cv2.contourArea(inner[2]))
+            if _overlap(cand[2], inner[2]) > 0.9 and 1.05 < growth <= MULTI_CARD_NESTED_GROWTH:
+                accepted[clashes[0]] = cand
+    return accepted
+
+
+def _grid_index(values: np.ndarray, gap: float) -> np.ndarray:
+    """Cluster 1-D positions: a new index starts wherever consecutive sorted values differ by more than gap."""
+    order = np.argsort(values)
+    index = np.zeros(len(values), dtype=int)
+    current = 0
+    for prev, nxt in zip(order[:-1], order[1:]):
+        if values[nxt] - values[prev] > gap:
+            current += 1
+        index[nxt] = current
+    return index
+
+
+def detect_card_quads(img_bgr: np.ndarray, max_cards: int = MAX_CARDS) -> List[CardPlacement]:
+    """
+    Every card in a photo, as non-overlapping quads with grid positions.
+
+    img_bgr is the detection image (illumination-normalized, as analyze_side
+    detects on). Returns placements in reading order (row-major).
+    """
+    h, w = img_bgr.shape[:2]
+    img_small = resize_max_dim(img_bgr, 1200)
+    ratio = w / float(img_small.shape[1])
+    edges_small = _generate_enhanced_edges(img_small)
+    edges_full = cv2.resize(edges_small, (w, h), interpolation=cv2.INTER_NEAREST)
+    glare_mask = detect_glare_mask(img_bgr)
+
+    scored = []
+    for quad_small, method in _candidate_quads(img_small, edges_small):
+        quad = quad_small * ratio
+        is_valid, _ = validate_card_quad(img_bgr, quad, area_range=MULTI_CARD_AREA_RANGE)
+        if not is_valid:
+            continue
+        score, confidence = score_quad_fusion(quad, img_bgr, edges_full, glare_mask, MULTI_CARD_PROFILE)
+        if score >= MULTI_CARD_MIN_SCORE:
+            scored.append((score, confidence, quad, method))
+    print(f"[Multi-Card] {len(scored)} scored candidates")
+
+    # Settle the card size on a first pass, then keep only card-shaped
+    # candidates of that size: an inner outline that outscored its card would
+    # otherwise block the card and then be dropped as off-size itself
+    scored = sorted((c for c in scored if _is_card_shaped(c[2])), key=lambda c: c[0], reverse=True)
+    accepted = _non_overlapping(scored)
+    if accepted:
+        median = float(np.median([cv2.contourArea(c[2]) for c in accepted]))
+        lo, hi = MULTI_CARD_SIZE_RANGE
+        accepted = _non_overlapping([c for c in scored if lo * median <= cv2.contourArea(c[2]) <= hi * median])
+    accepted = accepted[:max_cards]
+    if not accepted:
+        return []
+
+    centers = np.array([c[2].mean(axis=0) for c in accepted])
+    sizes = np.array([[np.linalg.norm(c[2][1] - c[2][0]), np.linalg.norm(c[2][3] - c[2][0])] for c in accepted])
+    card_w, card_h = np.median(sizes, axis=0)
+    rows = _grid_index(centers[:, 1], 0.5 * card_h)
+    cols = _grid_index(centers[:, 0], 0.5 * card_w)
+
+    placements = []
+    for (score, confidence, quad, method), row, col in zip(accepted, rows, cols):
+        placements.append(CardPlacement(
+            index=0,
+            row=int(row),
+            col=int(col),
+            quad=quad.astype(np.float32),
+            quad_normalized=[[round(float(x) / w, 5), round(float(y) / h, 5)] for x, y in quad],
+            score=float(score),
+            confidence=confidence,
+            method=method,
+            area_ratio=float(cv2.contourArea(quad) / (h * w)),
+        ))
+    placements.sort(key=lambda p: (p.row, p.col))
+    for i, p in enumerate(placements):
+        p.index = i
+    print(f"[Multi-Card] {len(placements)} cards in {rows.max() + 1} rows x {cols.max() + 1} columns")
+    return placements
+
+
+# -----------------------------
+# Analysis
+# -----------------------------
+
+def _holder_crop(img: np.ndarray, quad: np.ndarray, margin: float = 0.05) -> np.ndarray:
+    """The card's bounding box with a small margin, as the holder check would see a single-card photo."""
+    h, w = img.shape[:2]
+    x, y, bw, bh = cv2.boundingRect(quad.astype(np.float32))
+    mx, my = int(bw * margin), int(bh * margin)
+    return img[max(0, y - my):min(h, y + bh + my), max(0, x - mx):min(w, x + bw + mx)]
+
+
+def analyze_multi_card(image_path: str, outdir: str, side_label: str = "card",
+                       metric_groups: Optional[List[str]] = None, tier=None,
+                       max_cards: int = MAX_CARDS, cache: Optional[StageCache] = None,
+                       parallel: bool = True, run_quality_gate: bool = True,
+                       export: Optional[ExportOptions] = None) -> MultiCardMetrics:
+    """
+    Detect every card in a photo and analyze each one.
+
+    Returns one SideMetrics per card (labelled "{side_label}_r{row}c{col}",
+    with grid_position set) in reading order. metric_groups, tier and export
+    are as in analyze_side().
+    """
+    if not isinstance(tier, FidelityTier):
+        tier = get_tier(tier)
+    t_start = time.perf_counter()
+    img = resize_max_dim(imread_color(image_path), MULTI_CARD_DECODE_DIM)
+    h, w = img.shape[:2]
+
+    gate = assess_image_quality(img)
+    print(f"[Multi-Card Quality Gate] {'pass' if gate.passed else 'RESHOOT ' + ','.join(gate.reasons)}")
+    if run_quality_gate and not gate.passed:
+        page = reshoot_side_metrics(side_label, img, gate, metric_groups=metric_groups)
+        return MultiCardMetrics(cards=[page], placements=[], rows=0, cols=0, width=w, height=h,
+                                quality_gate=gate.to_dict(),
+                                detection_ms=(time.perf_counter() - t_start) * 1000.0)
+
+    detection_img, detection_scale = normalize_for_detection(img, max_dim=MULTI_CARD_DETECTION_DIM)
+    placements = detect_card_quads(detection_img, max_cards=max_cards)
+    detection_ms = (time.perf_counter() - t_start) * 1000.0
+
+    digest = file_digest(image_path)
+    decode_key = fingerprint("multi_card_decode", digest, MULTI_CARD_DECODE_DIM)
+
+    def analyze_card(p: CardPlacement) -> SideMetrics:
+        quad = (p.quad * detection_scale).astype(np.float32)
+        metadata = {
+            "profile": MULTI_CARD_PROFILE.name,
+            "method": p.method,
+            "score": p.score,
+            "confidence": p.confidence,
+            "area_ratio": p.area_ratio,
+            "quad_normalized": p.quad_normalized,
+        }
+        detect_key = fingerprint(decode_key, "multi_card_detect", np.round(quad, 2).tolist())
+        # Seeded stages: the page decode and gate, this card's quad, and a
+        # holder verdict from the card's surroundings
+        run = PipelineRun(SIDE_PIPELINE,
+                          sources={"image_path": image_path, "tier": tier, "quad_hint": None,
+                                   "export_options": export, "decode": img, "quality_gate": gate,
+                                   "detect": (quad, metadata),
+                                   "holder": classify_holder(_holder_crop(img, quad))},
+                          source_keys={"image_path": digest, "tier": fingerprint(tier.to_dict()),
+                                       "export_options": fingerprint(export.to_dict() if export else None),
+                                       "decode": decode_key, "quality_gate": fingerprint(decode_key, "gate"),
+                                       "detect": detect_key, "holder": fingerprint(detect_key, "holder")},
+                          cache=cache)
+        side = side_metrics_from_run(run, outdir, f"{side_label}_{p.label}", run_quality_gate=False,
+                                     parallel=False, metric_groups=metric_groups)
+        side.grid_position = p.to_dict()
+        return side
+
+    t_analysis = time.perf_counter()
+    if parallel and len(placements) > 1:
+        with ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="multi-card") as pool:
+            cards = list(pool.map(analyze_card, placements))
+    else:
+        cards = [analyze_card(p) for p in placements]
+
+    return MultiCardMetrics(
+        cards=cards,
+        placements=placements,
+        rows=max((p.row for p in placements), default=-1) + 1,
+        cols=max((p.col for p in placements), default=-1) + 1,
+        width=int(w),
+        height=int(h),
+        quality_gate=gate.to_dict(),
+        detection_ms=detection_ms,
+        analysis_ms=(time.perf_counter() - t_analysis) * 1000.0,
+    )
+
+
+def serialize_multi_card(data: MultiCardMetrics) -> Dict:
+    return {
+        "version": data.version,
+        "run_id": data.run_id,
+        "width": data.width,
+        "height": data.height,
+        "grid": {"rows": data.rows, "cols": data.cols},
+        "card_count": len(data.placements),
+        "quality_gate": data.quality_gate,
+        "detection_ms": data.detection_ms,
+        "analysis_ms": data.analysis_ms,
+        "cards": [serialize_side_metrics(c) for c in data.cards],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyze every card in a binder page or multi-card photo.")
+    parser.add_argument("image", type=str, help="Path to the photo")
+    parser.add_argument("--outdir", type=str, default="./out", help="Output directory for metrics and visualizations")
+    parser.add_argument("--tier", type=str, default=None, help="Fidelity tier (default: standard)")
+    parser.add_argument("--max-cards", type=int, default=MAX_CARDS, help="Most cards to analyze")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    ensure_outdir(args.outdir)
+    result = analyze_multi_card(args.image, args.outdir, tier=args.tier, max_cards=args.max_cards)
+    result.run_id = str(uuid.uuid4())
+    json_path = os.path.join(args.outdir, "stage1_multi_card_metrics.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(serialize_multi_card(result), f, indent=2)
+    print(f"Saved metrics for {len(result.placements)} cards to: {json_path}")
+
+
+if __name__ == "__main__":
+    main()
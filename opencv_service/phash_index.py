@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perceptual-Hash Index
+=====================
+
+Finds resubmissions of a card photo: the same upload sent again, the same
+photo re-encoded or re-cropped, or the same card shot several times in a row.
+
+Each warped card gets two 64-bit perceptual hashes (compute_card_hash):
+- phash   sign of the 8x8 low-frequency DCT block of a 32x32 gray thumbnail
+          against its median (robust to re-encoding, scaling, exposure)
+- dhash   sign of horizontal gradients on a 9x8 gray thumbnail
+          (cheap, sensitive to layout changes the DCT smooths over)
+Hashing the warped card rather than the photo makes the hash independent of
+background, framing and perspective.
+
+PhashIndex keeps the hashes in a BK-tree over pHash Hamming distance, so a
+lookup visits only the branches that can hold a match within the radius.
+Matches are confirmed on the dHash distance.
+
+Index storage (optional, see PhashIndex.from_env):
+    OPENCV_PHASH_INDEX_DIR       index.jsonl of hashes plus pickled results;
+                                 without it the index lives for the process
+    OPENCV_PHASH_MAX_ENTRIES     entries kept (default 50000); past it the
+                                 oldest are evicted and the tree is rebuilt
+    OPENCV_PHASH_REUSE           serve a prior result instead of running the
+                                 post-warp stages: "exact" (or 1) for the same
+                                 upload bytes, "near" for any match within
+                                 REUSE_MAX_DISTANCE; default off
+
+Near reuse trades accuracy for time: the hashes see layout and artwork, not
+print lines or whitened corners, so another photo of the same card (even a
+damaged copy) can sit within a few bits. Exact reuse only serves a result
+for a byte-identical resubmission.
+
+Stored results are copies: a served result can be changed by its caller
+without touching what the next lookup gets.
+
+Several workers may share one index directory. Appends, loads and eviction
+hold an exclusive lock on index.jsonl.lock, and eviction re-reads the file
+under it, so one worker's rewrite keeps the entries the others appended.
+"""
+
+import copy
+import contextlib
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows: index writes are not serialized across processes
+    fcntl = None
+
+
+# Near-duplicate radius on each 64-bit hash
+DUPLICATE_MAX_DISTANCE = 10
+
+# Radius within which a prior result may be served in "near" reuse mode
+REUSE_MAX_DISTANCE = 2
+
+REUSE_MODES = ("off", "exact", "near")
+
+# Most matches reported per lookup
+MAX_MATCHES = 5
+
+# Prior results held in memory when the index has no directory
+RESULT_MEMORY_ENTRIES = 256
+
+# Entries kept; eviction drops the oldest down to MAX_ENTRIES * EVICT_TO
+MAX_ENTRIES = int(os.environ.get("OPENCV_PHASH_MAX_ENTRIES", "50000"))
+EVICT_TO = 0.9
+
+
+@dataclass(frozen=True)
+class CardHash:
+    phash: int
+    dhash: int
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"phash": f"{self.phash:016x}", "dhash": f"{self.dhash:016x}"}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in bits.ravel()), 2)
+
+
+def compute_card_hash(img_bgr: np.ndarray) -> CardHash:
+    """pHash and dHash of a warped card."""
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    phash = _bits_to_int(low > np.median(low))
+    tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dhash = _bits_to_int(tiny[:, 1:] > tiny[:, :-1])
+    return CardHash(phash=phash, dhash=dhash)
+
+
+# -----------------------------
+# BK-tree
+# -----------------------------
+
+class BKTree:
+    """Metric tree over Hamming distance: node -> {distance: child}."""
+
+    def __init__(self):
+        self._root: Optional[list] = None     # [hash, items, children]
+        self.size = 0
+
+    def add(self, value: int, item: Any) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """(distance, item) for every item within radius, nearest first."""
+        out = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                out.extend((d, item) for item in node[1])
+            # Triangle inequality: only children at |d - k| <= radius can match
+            for k, child in node[2].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+        out.sort(key=lambda m: m[0])
+        return out
+
+
+# -----------------------------
+# Index
+# -----------------------------
+
+@dataclass
+class HashMatch:
+    entry_id: str
+    phash_distance: int
+    dhash_distance: int
+    same_image: bool            # identical upload bytes
+    side_label: str
+    tier: Optional[str]
+    created: float
+    has_result: bool
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+class PhashIndex:
+    """Thread-safe BK-tree of card hashes with optional stored results."""
+
+    def __init__(self, directory: Optional[str] = None, reuse: str = "off", max_entries: int = MAX_ENTRIES):
+        if reuse not in REUSE_MODES:
+            raise ValueError(f"Unknown reuse mode '{reuse}'. Expected one of: {', '.join(REUSE_MODES)}")
+        self.directory = directory
+        self.reuse = reuse
+        self.max_entries = max_entries
+        self._tree = BKTree()
+        self._entries: Dict[str, Dict[str, any]] = {}
+        self._results: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "PhashIndex":
+        reuse = os.environ.get("OPENCV_PHASH_REUSE", "off").strip().lower()
+        return cls(directory=os.environ.get("OPENCV_PHASH_INDEX_DIR") or None,
+                   reuse={"0": "off", "": "off", "1": "exact"}.get(reuse, reuse))
+
+    @property
+    def stores_results(self) -> bool:
+        return self.reuse != "off"
+
+    def servable(self, match: "HashMatch") -> bool:
+        """Whether a match is close enough to serve its stored result under the reuse mode."""
+        if not match.has_result or self.reuse == "off":
+            return False
+        if self.reuse == "exact":
+            return match.same_image
+        return match.same_image or max(match.phash_distance, match.dhash_distance) <= REUSE_MAX_DISTANCE
+
+    def __len__(self) -> int:
+        return self._tree.size
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.jsonl")
+
+    def _result_path(self, entry_id: str) -> str:
+        return os.path.join(self.directory, "results", entry_id[:2], f"{entry_id}.pkl")
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index file across processes (no-op without fcntl)."""
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self._index_path()}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read_entries(self) -> List[Dict[str, any]]:
+        """Entries on disk, oldest first (lock held)."""
+        path = self._index_path()
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue    # a torn last line from an interrupted write
+                if isinstance(entry, dict) and "id" in entry and "phash" in entry:
+                    entries.append(entry)
+        return entries
+
+    def _load(self) -> None:
+        with self._file_lock():
+            entries = self._read_entries()
+        if not entries:
+            return
+        for entry in entries:
+            self._insert(entry)
+        self._evict()
+        print(f"[Phash Index] Loaded {len(self)} entries from {self._index_path()}")
+
+    def _insert(self, entry: Dict[str, any]) -> None:
+        self._entries[entry["id"]] = entry
+        self._tree.add(int(entry["phash"], 16), entry["id"])
+
+    def _rebuild(self, entries: List[Dict[str, any]]) -> None:
+        self._tree = BKTree()
+        self._entries = {}
+        for entry in entries:
+            self._insert(entry)
+
+    def _evict(self) -> None:
+        """Past max_entries, drop the oldest entries and their results, then rebuild the tree (lock held).
+
+        With a directory the oldest are taken from the file, re-read under the
+        file lock, so entries other processes appended survive the rewrite and
+        this index adopts them.
+        """
+        if len(self._entries) <= self.max_entries:
+            return
+        keep = int(self.max_entries * EVICT_TO)
+        if not self.directory:
+            entries = list(self._entries.values())      # insertion order: oldest first
+            dropped, kept = entries[:len(entries) - keep], entries[len(entries) - keep:]
+            self._rebuild(kept)
+            for entry in dropped:
+                self._results.pop(entry["id"], None)
+            return
+        with self._file_lock():
+            entries = self._read_entries()
+            if len(entries) > self.max_entries:
+                dropped, kept = entries[:len(entries) - keep], entries[len(entries) - keep:]
+                for entry in dropped:
+                    if entry.get("has_result"):
+                        try:
+                            os.remove(self._result_path(entry["id"]))
+                        except OSError:
+                            pass
+                tmp_path = f"{self._index_path()}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for entry in kept:
+                        f.write(json.dumps(entry) + "\n")
+                os.replace(tmp_path, self._index_path())
+            else:
+                kept = entries
+        self._rebuild(kept)
+
+    def lookup(self, card_hash: CardHash, image_key: Optional[str] = None,
+               radius: int = DUPLICATE_MAX_DISTANCE) -> List[HashMatch]:
+        """Prior entries within radius on both hashes, nearest first."""
+        with self._lock:
+            found = self._tree.search(card_hash.phash, radius)
+            matches = []
+            for d, entry_id in found:
+                entry = self._entries[entry_id]
+                dd = hamming(card_hash.dhash, int(entry["dhash"], 16))
+                if dd > radius:
+                    continue
+                matches.append(HashMatch(
+                    entry_id=entry_id,
+                    phash_distance=d,
+                    dhash_distance=dd,
+                    same_image=image_key is not None and entry.get("image_key") == image_key,
+                    side_label=entry.get("side_label", ""),
+                    tier=entry.get("tier"),
+                    created=entry.get("created", 0.0),
+                    has_result=entry.get("has_result", False),
+                ))
+        matches.sort(key=lambda m: (not m.same_image, m.phash_distance + m.dhash_distance, -m.created))
+        return matches[:MAX_MATCHES]
+
+    def add(self, card_hash: CardHash, side_label: str, image_key: Optional[str] = None,
+            tier: Optional[str] = None, metric_groups: Optional[List[str]] = None,
+            result: Any = None) -> str:
+        """Index a card; result (e.g. its SideMetrics) is kept for reuse. Returns the entry id."""
+        entry_id = uuid.uuid4().hex
+        entry = {
+            "id": entry_id,
+            **card_hash.to_dict(),
+            "image_key": image_key,
+            "side_label": side_label,
+            "tier": tier,
+            "metric_groups": metric_groups,
+            "created": time.time(),
+            "has_result": result is not None,
+        }
+        if result is not None:
+            self._store_result(entry_id, result)
+        with self._lock:
+            self._insert(entry)
+            if self.directory:
+                with self._file_lock(), open(self._index_path(), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            self._evict()
+        return entry_id
+
+    def entry(self, entry_id: str) -> Optional[Dict[str, any]]:
+        return self._entries.get(entry_id)
+
+    def _store_result(self, entry_id: str, result: Any) -> None:
+        if not self.directory:
+            result = copy.deepcopy(result)
+            with self._lock:
+                self._results[entry_id] = result
+                while len(self._results) > RESULT_MEMORY_ENTRIES:
+                    self._results.popitem(last=False)
+            return
+        path = self._result_path(entry_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"[Phash Index] Could not store result {entry_id}: {e}")
+
+    def result(self, entry_id: str) -> Any:
+        """Stored result of an entry (a fresh copy), or None."""
+        with self._lock:
+            if entry_id in self._results:
+                return copy.deepcopy(self._results[entry_id])
+        if self.directory:
+            path = self._result_path(entry_id)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        return pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                    return None
+        return None
+
+
+DEFAULT_PHASH_INDEX = PhashIndex.from_env()
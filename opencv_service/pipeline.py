@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoized Stage DAG
+==================
+
+The analysis pipeline expressed as named stages with explicit inputs, so
+intermediate results can be cached and a re-run recomputes only what changed.
+
+Each stage's cache key is a hash of:
+- its name and version string,
+- the source of its function and of the modules / functions listed in its
+  `code` (so an edited threshold inside a function body changes the key),
+- its parameters (thresholds, resolutions, module constants - whatever the
+  stage reads that is not an input), and
+- the keys of its inputs.
+
+A stage's `code` must list every module whose logic decides its output.
+Changes the source hash cannot see - a library upgrade, data files, code
+reached through a module not listed - need a version bump.
+
+Source inputs (e.g. the image file) are keyed by content, so the key of every
+downstream stage is fixed before anything runs. Changing a surface threshold
+changes only the surface key: decode, detect and warp hit the cache and only
+surface and the stages after it execute.
+
+Stage outputs are treated as read-only once produced; they may be shared
+between runs through the memory cache.
+
+Independent stages can be evaluated concurrently (PipelineRun.get_many) on a
+shared thread pool. OpenCV releases the GIL inside its kernels, so stages that
+read the same warped card overlap; a run's latency approaches its slowest
+branch instead of the sum. Each stage is evaluated at most once per run even
+when several branches need it.
+
+Cache backends (both optional, see StageCache.from_env):
+    OPENCV_STAGE_CACHE_ENTRIES   in-memory LRU size (default 0 = off)
+    OPENCV_STAGE_CACHE_DIR       on-disk pickle cache, for archive recalibration
+
+Thread pool:
+    OPENCV_STAGE_WORKERS         stage pool size (default min(4, cpu count))
+
+Memory budget: a run planned with plan(targets, release=True) drops each
+intermediate as soon as the last stage that consumes it has run, keeping only
+the targets. With trace_memory, each stage reports the bytes its output
+retains and the process-wide traced peak while it ran (tracemalloc; numpy /
+OpenCV outputs, not OpenCV-internal scratch). tracemalloc has one peak for
+the whole process: runs share it through PROCESS_TRACE, which starts tracing
+for the first traced run and stops it after the last. A stage whose run
+overlapped another traced stage (concurrent requests, parallel branches) is
+flagged "trace_overlapped"; its peak then includes the other stage's
+allocations.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def fingerprint(*parts: Any) -> str:
+    blob = json.dumps(_jsonable(list(parts)), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def value_nbytes(value: Any, _depth: int = 0) -> int:
+    """Bytes held in numpy arrays reachable from a stage output (containers, dataclasses, objects)."""
+    if _depth > 4 or value is None:
+        return 0
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, dict):
+        return sum(value_nbytes(v, _depth + 1) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_nbytes(v, _depth + 1) for v in value)
+    if hasattr(value, "__dict__"):
+        return sum(value_nbytes(v, _depth + 1) for v in vars(value).values())
+    return 0
+
+
+def peak_rss_bytes() -> int:
+    """Process resident-set high-water mark."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+class ProcessTrace:
+    """
+    Shared tracemalloc state: reference-counted start / stop, and peak
+    readings of traced stages that may overlap.
+
+    The peak is reset only when no other traced stage is running, so a
+    concurrent stage never loses the peak it is accumulating.
+    """
+
+    def __init__(self):
+        # Reentrant: a run dropped mid-stage releases from __del__ on this thread
+        self._lock = threading.RLock()
+        self._users = 0
+        self._started = False       # tracing was started here, not by the host process
+        self._active = 0            # traced stages running
+        self._entries = 0           # traced stages started, ever
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+
+    def enter_stage(self) -> Tuple[int, int, bool]:
+        """(traced bytes now, entry number, overlapped) at the start of a stage."""
+        with self._lock:
+            if self._active == 0:
+                tracemalloc.reset_peak()
+            self._active += 1
+            self._entries += 1
+            return tracemalloc.get_traced_memory()[0], self._entries, self._active > 1
+
+    def exit_stage(self, start: Tuple[int, int, bool]) -> Tuple[int, bool]:
+        """(process peak above the stage's starting bytes, overlapped) at the end of a stage."""
+        mem_start, entry, overlapped = start
+        with self._lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            self._active -= 1
+            overlapped = overlapped or self._entries != entry or self._active > 0
+        return max(0, peak - mem_start), overlapped
+
+
+PROCESS_TRACE = ProcessTrace()
+
+
+_SOURCE_DIGESTS: Dict[int, str] = {}
+
+
+def source_digest(obj: Any) -> str:
+    """Hash of a module's or function's source (of its name when the source is unavailable)."""
+    digest = _SOURCE_DIGESTS.get(id(obj))
+    if digest is None:
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", repr(obj))
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        _SOURCE_DIGESTS[id(obj)] = digest
+    return digest
+
+
+def module_constants(module) -> Dict[str, Any]:
+    """UPPER_CASE scalar / tuple / dict constants of a module, as stage parameters."""
+    out = {}
+    for name, value in vars(module).items():
+        if name.isupper() and isinstance(value, (int, float, str, bool, tuple, dict)):
+            out[name] = value
+    return out
+
+
+def function_defaults(fn: Callable) -> Dict[str, Any]:
+    """Keyword defaults of a function (its tunable thresholds), as stage parameters."""
+    return {name: p.default for name, p in inspect.signature(fn).parameters.items()
+            if p.default is not inspect.Parameter.empty}
+
+
+# -----------------------------
+# Graph
+# -----------------------------
+
+@dataclass
+class Stage:
+    """
+    One pipeline step. fn is called with the values of `inputs`, in order.
+
+    params may be a dict or a zero-argument callable returning one; callables
+    are evaluated per run so edits to module constants take effect.
+
+    code lists the modules (or functions) besides fn whose source is part of
+    the cache key. Bump version for changes their source does not show.
+    """
+    name: str
+    fn: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    params: Any = field(default_factory=dict)
+    version: str = "1"
+    cacheable: bool = True
+    code: Tuple[Any, ...] = ()
+
+    def resolved_params(self) -> Dict[str, Any]:
+        return self.params() if callable(self.params) else dict(self.params)
+
+    def code_digest(self) -> str:
+        return fingerprint([source_digest(obj) for obj in (self.fn,) + tuple(self.code)])
+
+
+class Pipeline:
+    def __init__(self, stages: Iterable[Stage], sources: Iterable[str] = ()):
+        self.sources = tuple(sources)
+        self.stages: Dict[str, Stage] = OrderedDict()
+        for stage in stages:
+            for name in stage.inputs:
+                if name not in self.stages and name not in self.sources:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown or later stage '{name}'")
+            self.stages[stage.name] = stage
+
+    def downstream(self, name: str) -> List[str]:
+        """Stages that (transitively) consume `name`, in pipeline order."""
+        hit = {name}
+        for stage in self.stages.values():
+            if any(i in hit for i in stage.inputs):
+                hit.add(stage.name)
+        return [n for n in self.stages if n in hit and n != name]
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+
+class StageCache:
+    """Two-level (memory LRU, disk pickle) cache of stage outputs keyed by stage key."""
+
+    def __init__(self, memory_entries: int = 0, directory: Optional[str] = None):
+        self.memory_entries = int(memory_entries)
+        self.directory = directory
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "StageCache":
+        return cls(memory_entries=int(os.environ.get("OPENCV_STAGE_CACHE_ENTRIES", "0")),
+                   directory=os.environ.get("OPENCV_STAGE_CACHE_DIR") or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_entries > 0 or bool(self.directory)
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.directory, stage, key[:2], f"{key}.pkl")
+
+    def get(self, stage: str, key: str) -> Tuple[bool, Any]:
+        mem_key = f"{stage}:{key}"
+        with self._lock:
+            if mem_key in self._memory:
+                self._memory.move_to_end(mem_key)
+                return True, self._memory[mem_key]
+        if self.directory:
+            path = self._path(stage, key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                    return False, None
+                self._remember(mem_key, value)
+                return True, value
+        return False, None
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        self._remember(f"{stage}:{key}", value)
+        if self.directory:
+            path = self._path(stage, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+                print(f"[Pipeline] Could not cache stage '{stage}': {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def _remember(self, mem_key: str, value: Any) -> None:
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[mem_key] = value
+            self._memory.move_to_end(mem_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+
+DEFAULT_STAGE_CACHE = StageCache.from_env()
+
+
+# -----------------------------
+# Execution
+# -----------------------------
+
+STAGE_WORKERS = int(os.environ.get("OPENCV_STAGE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for concurrent stages (separate from the surface tile pool)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(2, STAGE_WORKERS), thread_name_prefix="stage")
+        return _executor
+
+
+class PipelineRun:
+    """
+    One evaluation of a Pipeline for a set of source values.
+
+    Stages run lazily: get(name) evaluates only what `name` needs, and a cache
+    hit on a stage means none of its inputs are evaluated at all.
+
+    get() is thread-safe. Each stage has its own lock, taken before its inputs'
+    locks; since inputs always precede a stage in the pipeline, locks are
+    acquired in one global order and concurrent branches cannot deadlock.
+    """
+
+    def __init__(self, pipeline: Pipeline, sources: Dict[str, Any],
+                 source_keys: Optional[Dict[str, str]] = None,
+                 cache: Optional[StageCache] = None):
+        self.pipeline = pipeline
+        self.cache = cache if cache is not None else DEFAULT_STAGE_CACHE
+        self.values: Dict[str, Any] = dict(sources)
+        self._keys: Dict[str, str] = {name: (source_keys or {}).get(name) or fingerprint(repr(value))
+                                      for name, value in sources.items()}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._locks = {name: threading.Lock() for name in pipeline.stages}
+        self._t_start = time.perf_counter()
+        # Memory budget (see plan())
+        self._keep: Optional[set] = None
+        self._consumers: Dict[str, int] = {}
+        self._release_lock = threading.Lock()
+        self._trace = False
+
+    def plan(self, targets: Iterable[str], release: bool = True, trace_memory: bool = False) -> None:
+        """
+        Declare the stages the caller will read.
+
+        With release, every other intermediate is dropped once all planned
+        consumers of it have run; reading it afterwards recomputes it.
+        """
+        keep = set(targets)
+        needed, stack = set(), list(keep)
+        while stack:
+            name = stack.pop()
+            if name in needed or name not in self.pipeline.stages:
+                continue
+            needed.add(name)
+            stack.extend(self.pipeline.stages[name].inputs)
+        if release:
+            self._keep = keep
+            self._consumers = {}
+            for name in needed:
+                for i in self.pipeline.stages[name].inputs:
+                    self._consumers[i] = self._consumers.get(i, 0) + 1
+        if trace_memory and not self._trace:
+            self._trace = True
+            PROCESS_TRACE.acquire()
+
+    def __del__(self):
+        # A traced run that never reached summary() (a stage raised)
+        if getattr(self, "_trace", False):
+            self._trace = False
+            PROCESS_TRACE.release()
+
+    def _consumed(self, stage: Stage) -> None:
+        if self._keep is None:
+            return
+        with self._release_lock:
+            for i in stage.inputs:
+                left = self._consumers.get(i, 0) - 1
+                self._consumers[i] = left
+                if left <= 0 and i not in self._keep and i in self.pipeline.stages:
+                    self.values.pop(i, None)
+
+    def key(self, name: str) -> str:
+        if name not in self._keys:
+            stage = self.pipeline.stages[name]
+            self._keys[name] = fingerprint(stage.name, stage.version, stage.code_digest(),
+                                           stage.resolved_params(), [self.key(i) for i in stage.inputs])
+        return self._keys[name]
+
+    def get(self, name: str) -> Any:
+        if name in self.values:
+            return self.values[name]
+        with self._locks[name]:
+            if name in self.values:
+                return self.values[name]
+            return self._evaluate(self.pipeline.stages[name])
+
+    def get_many(self, names: Iterable[str], executor: Optional[ThreadPoolExecutor] = None) -> List[Any]:
+        """
+        Values of several stages, in the order given.
+
+        With an executor the stages are evaluated concurrently; shared inputs
+        are still computed once. Results do not depend on completion order.
+        """
+        names = list(names)
+        if executor is None:
+            return [self.get(n) for n in names]
+        futures = [executor.submit(self.get, n) for n in names]
+        return [f.result() for f in futures]
+
+    def _evaluate(self, stage: Stage) -> Any:
+        name = stage.name
+
+        if stage.cacheable and self.cache.enabled:
+            hit, value = self.cache.get(name, self.key(name))
+            if hit:
+                self.values[name] = value
+                self.stats[name] = {"status": "cached", "ms": 0.0}
+                self._consumed(stage)
+                return value
+
+        args = [self.get(i) for i in stage.inputs]
+        trace = self._trace
+        if trace:
+            trace_start = PROCESS_TRACE.enter_stage()
+        t_start = time.perf_counter()
+        try:
+            value = stage.fn(*args)
+        finally:
+            if trace:
+                peak, overlapped = PROCESS_TRACE.exit_stage(trace_start)
+        elapsed = (time.perf_counter() - t_start) * 1000.0
+        del args
+        self.values[name] = value
+        self.stats[name] = {"status": "computed", "ms": round(elapsed, 2)}
+        if trace:
+            self.stats[name]["process_peak_bytes"] = peak
+            self.stats[name]["retained_bytes"] = value_nbytes(value)
+            if overlapped:
+                self.stats[name]["trace_overlapped"] = True
+        if stage.cacheable and self.cache.enabled:
+            self.cache.put(name, self.key(name), value)
+        self._consumed(stage)
+        return value
+
+    def summary(self) -> Dict[str, Any]:
+        # Pipeline order, not completion order, so concurrent runs report identically
+        stats = OrderedDict((n, self.stats[n]) for n in self.pipeline.stages if n in self.stats)
+        out = {
+            "stages": dict(stats),
+            "computed": [n for n, s in stats.items() if s["status"] == "computed"],
+            "cached": [n for n, s in stats.items() if s["status"] == "cached"],
+            "compute_ms": round(sum(s["ms"] for s in stats.values()), 2),
+            "wall_ms": round((time.perf_counter() - self._t_start) * 1000.0, 2),
+        }
+        if self._trace:
+            out["process_peak_stage_bytes"] = max([s.get("process_peak_bytes", 0) for s in stats.values()] or [0])
+            out["peak_rss_bytes"] = peak_rss_bytes()
+            out["trace_overlapped"] = any(s.get("trace_overlapped", False) for s in stats.values())
+            self._trace = False
+            PROCESS_TRACE.release()
+        return out
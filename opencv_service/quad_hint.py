@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client-Supplied Card Quads
+==========================
+
+The mobile capture overlay knows roughly where the card is, and the
+manual-adjust flow knows exactly. A QuadHint carries those corners into
+analyze_side so the fusion detector can be skipped:
+
+- trust "exact"  the corners are warped as given (user-dragged corners)
+- trust "hint"   each side is snapped to the strongest edge within a narrow
+                 band around it (snap_quad_to_edges); the full detector
+                 sweep only runs if snapping fails
+
+Corners are given in the uploaded image's coordinates, either normalized
+(0-1 fractions of width / height) or in pixels, in any order; they are
+reordered to [TL, TR, BR, BL].
+
+Edge snapping samples, for each side, a strip of +-band pixels across the
+side (inner 80% of its length; corners are often rounded or worn) and takes
+the strongest gradient across the side in every column, mildly favouring
+offsets near the hint (a sleeve or top-loader edge next to the card should
+not win over the card edge the client pointed at). A RANSAC line through
+(position, offset) finds the columns that agree on one straight edge - the
+hint need not be parallel to it - and adjacent side lines intersect in the
+refined corners.
+"""
+
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+QUAD_TRUST_LEVELS = ("exact", "hint")
+QUAD_UNITS = ("normalized", "pixel")
+
+# Search band on each side of a hinted edge, as a share of the quad's shorter side
+HINT_BAND_FRACTION = 0.05
+HINT_MIN_BAND_PX = 6
+
+# Share of a side's samples that must agree on one edge for the side to snap
+HINT_MIN_SUPPORT = 0.45
+
+# Samples within this many pixels of a candidate edge line agree with it
+HINT_INLIER_PX = 2.0
+
+# RANSAC line hypotheses per side
+HINT_RANSAC_ITERATIONS = 64
+
+# Line score weight at the band's edge relative to the hint line (quadratic falloff)
+HINT_OFFSET_PRIOR = 0.5
+
+# Gradient maxima kept per sample column
+HINT_PEAKS_PER_COLUMN = 3
+
+# Weakest gradient (Sobel, uint8 gray) accepted as an edge sample
+HINT_MIN_GRADIENT = 20.0
+
+
+@dataclass
+class QuadHint:
+    points: List[List[float]]   # [TL, TR, BR, BL]
+    units: str                  # "normalized" or "pixel"
+    trust: str                  # "exact" or "hint"
+
+    def to_normalized(self, width: int, height: int) -> "QuadHint":
+        """The hint in normalized units, given the size of the image its pixel corners refer to."""
+        if self.units == "normalized":
+            return self
+        pts = [[x / float(width), y / float(height)] for x, y in self.points]
+        return QuadHint(points=pts, units="normalized", trust=self.trust)
+
+    def to_pixels(self, width: int, height: int) -> np.ndarray:
+        """Corners in pixels of an image of the given size (hint must be normalized)."""
+        if self.units != "normalized":
+            raise ValueError("Pixel hints must be normalized against their source image first")
+        return np.array([[x * width, y * height] for x, y in self.points], dtype=np.float32)
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+def _order_corners(pts: np.ndarray) -> np.ndarray:
+    """Corners in [TL, TR, BR, BL] order: clockwise (image y down) from the top-left."""
+    center = pts.mean(axis=0)
+    angles = np.arctan2(pts[:, 1] - center[1], pts[:, 0] - center[0])
+    pts = pts[np.argsort(angles)]
+    start = int(np.argmin(pts.sum(axis=1)))
+    return np.roll(pts, -start, axis=0)
+
+
+def parse_quad_hint(value, trust: Optional[str] = None, units: Optional[str] = None) -> Optional[QuadHint]:
+    """
+    QuadHint from a request parameter, or None when no quad was given.
+
+    value: JSON string or list - four [x, y] pairs, eight numbers, or an
+    object {"points": ..., "units": ..., "trust": ...}. units default to
+    "normalized" when every coordinate is within [0, 1], else "pixel";
+    trust defaults to "hint". Raises ValueError for anything malformed.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("Quad must be JSON: four [x, y] corner pairs")
+    if isinstance(value, dict):
+        trust = trust or value.get("trust")
+        units = units or value.get("units")
+        value = value.get("points")
+    try:
+        pts = np.asarray(value, dtype=np.float64).reshape(4, 2)
+    except (TypeError, ValueError):
+        raise ValueError("Quad must have four [x, y] corner pairs")
+    if not np.all(np.isfinite(pts)):
+        raise ValueError("Quad corners must be finite numbers")
+
+    trust = (trust or "hint").strip().lower()
+    if trust not in QUAD_TRUST_LEVELS:
+        raise ValueError(f"Unknown quad trust '{trust}'. Expected one of: {', '.join(QUAD_TRUST_LEVELS)}")
+    if units is None:
+        units = "normalized" if np.all((pts >= 0.0) & (pts <= 1.0)) else "pixel"
+    units = units.strip().lower()
+    if units not in QUAD_UNITS:
+        raise ValueError(f"Unknown quad units '{units}'. Expected one of: {', '.join(QUAD_UNITS)}")
+    if units == "normalized" and not np.all((pts >= -0.05) & (pts <= 1.05)):
+        raise ValueError("Normalized quad corners must lie within the image (0-1)")
+
+    pts = _order_corners(pts)
+    if not cv2.isContourConvex(pts.astype(np.float32).reshape(-1, 1, 2)) or cv2.contourArea(pts.astype(np.float32)) <= 0:
+        raise ValueError("Quad corners must form a convex quadrilateral")
+    return QuadHint(points=pts.round(6).tolist(), units=units, trust=trust)
+
+
+# -----------------------------
+# Edge snapping
+# -----------------------------
+
+def _snap_side(gray: np.ndarray, p0: np.ndarray, p1: np.ndarray,
+               band: int) -> Tuple[Optional[np.ndarray], float]:
+    """Line (vx, vy, x0, y0) of the strongest edge within band px of p0-p1, and its support."""
+    length = float(np.linalg.norm(p1 - p0))
+    if length < 4 * band:
+        return None, 0.0
+    t = (p1 - p0) / length
+    n = np.array([-t[1], t[0]])
+    s = np.linspace(0.1, 0.9, max(16, min(int(length * 0.8), 800))) * length
+    o = np.arange(-band, band + 1, dtype=np.float64)
+    map_x = (p0[0] + s[None, :] * t[0] + o[:, None] * n[0]).astype(np.float32)
+    map_y = (p0[1] + s[None, :] * t[1] + o[:, None] * n[1]).astype(np.float32)
+    strip = cv2.remap(gray, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    # Rows run across the side: the gradient along the rows is the one
+    # perpendicular to the edge. Every column contributes its strongest few
+    # local maxima, so a card edge next to a stronger sleeve edge still has
+    # its samples.
+    grad = np.abs(cv2.Sobel(strip, cv2.CV_32F, 0, 1, ksize=3))[1:-1]
+    is_peak = np.zeros_like(grad, dtype=bool)
+    is_peak[1:-1] = (grad[1:-1] >= grad[:-2]) & (grad[1:-1] > grad[2:]) & (grad[1:-1] >= HINT_MIN_GRADIENT)
+    ranked = np.where(is_peak, grad, 0.0)
+    k = min(HINT_PEAKS_PER_COLUMN, ranked.shape[0])
+    rows = np.argpartition(-ranked, k - 1, axis=0)[:k]
+    cols = np.broadcast_to(np.arange(ranked.shape[1]), rows.shape)
+    keep = ranked[rows, cols] > 0
+    cand_col, cand_off = cols[keep], o[1:-1][rows[keep]]
+    if len(cand_col) < 2:
+        return None, 0.0
+
+    # RANSAC over offset = a + b * s. A line scores the columns it explains,
+    # weighted down with its distance from the hint.
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, len(cand_col), size=(HINT_RANSAC_ITERATIONS, 2))
+    c0, c1 = cand_col[pairs[:, 0]], cand_col[pairs[:, 1]]
+    valid = c0 != c1
+    if not valid.any():
+        return None, 0.0
+    pairs = pairs[valid]
+    ds = s[c1[valid]] - s[c0[valid]]
+    slope = (cand_off[pairs[:, 1]] - cand_off[pairs[:, 0]]) / ds
+    icpt = cand_off[pairs[:, 0]] - slope * s[c0[valid]]
+    residual = np.abs(cand_off[None, :] - (icpt[:, None] + slope[:, None] * s[cand_col][None, :]))
+    hit = residual <= HINT_INLIER_PX
+    explained = np.zeros((len(slope), len(s)), dtype=bool)
+    for h in range(len(slope)):
+        explained[h, cand_col[hit[h]]] = True
+    mid_offset = np.abs(icpt + slope * s[len(s) // 2]) / band
+    score = explained.sum(axis=1) * np.clip(1.0 - HINT_OFFSET_PRIOR * mid_offset ** 2, 0.0, 1.0)
+    best = int(np.argmax(score))
+    support = float(explained[best].mean())
+    if support < HINT_MIN_SUPPORT:
+        return None, support
+
+    # One sample per explained column: the candidate nearest the line
+    # (written last, so it wins over farther ones in the same column)
+    sel = np.flatnonzero(hit[best])
+    sel = sel[np.argsort(-residual[best, sel])]
+    offsets = np.full(len(s), np.nan)
+    offsets[cand_col[sel]] = cand_off[sel]
+    inliers = ~np.isnan(offsets)
+
+    pts = (p0[None, :] + s[inliers, None] * t[None, :] + offsets[inliers, None] * n[None, :]).astype(np.float32)
+    line = cv2.fitLine(pts, cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+    return line, support
+
+
+def _intersect(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    (vx1, vy1, x1, y1), (vx2, vy2, x2, y2) = a, b
+    det = vx1 * (-vy2) - vy1 * (-vx2)
+    if abs(det) < 1e-6:
+        return None
+    t = ((x2 - x1) * (-vy2) - (y2 - y1) * (-vx2)) / det
+    return np.array([x1 + t * vx1, y1 + t * vy1], dtype=np.float32)
+
+
+def snap_quad_to_edges(img_bgr: np.ndarray, quad: np.ndarray) -> Tuple[Optional[np.ndarray], Dict[str, any]]:
+    """
+    Refine a [TL, TR, BR, BL] quad by snapping each side to nearby edges.
+
+    Returns (quad or None, report). The quad is None when any side lacks a
+    consistent edge or a corner would move further than the search band.
+    """
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
+    quad = quad.astype(np.float64)
+    sides = [float(np.linalg.norm(quad[(i + 1) % 4] - quad[i])) for i in range(4)]
+    band = max(HINT_MIN_BAND_PX, int(round(min(sides) * HINT_BAND_FRACTION)))
+
+    lines, support = [], []
+    for i in range(4):
+        line, sup = _snap_side(gray, quad[i], quad[(i + 1) % 4], band)
+        lines.append(line)
+        support.append(round(sup, 3))
+    report = {"band_px": band, "side_support": support, "max_corner_shift_px": None}
+    if any(line is None for line in lines):
+        report["reason"] = "weak_edge"
+        return None, report
+
+    # Corner i joins the side ending at it (i - 1) and the side starting at it (i)
+    corners = [_intersect(lines[i - 1], lines[i]) for i in range(4)]
+    if any(c is None for c in corners):
+        report["reason"] = "parallel_sides"
+        return None, report
+    refined = np.array(corners, dtype=np.float32)
+    shift = float(np.max(np.linalg.norm(refined - quad.astype(np.float32), axis=1)))
+    report["max_corner_shift_px"] = round(shift, 2)
+    if shift > 2.0 * band:
+        report["reason"] = "corner_moved_too_far"
+        return None, report
+    return refined, report
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Image Quality Gate
+==================
+
+Limits, result type and scoring helpers for the few-millisecond check that
+card_cv_stage1.assess_image_quality runs on a thumbnail before any detection
+work. It rejects photos no amount of processing can grade: badly out of
+focus, too dark or blown out, washed by glare, or with no card in frame.
+
+Signals:
+- focus          Laplacian variance of the thumbnail gray
+- exposure       mean brightness and the share of crushed / clipped pixels
+- glare          coverage of the Stage 1 glare mask (low saturation, high value)
+                 over the foreground: large mask regions reaching the frame
+                 edge outside the card outline are background (a white
+                 table, a product-photo margin); glare on the card counts
+- card presence  best card-shaped contour: area share x aspect fit x rectangularity
+
+The A-D image-quality grade shared with stage0 (grade_image_quality) is
+reported alongside for consistency between services. The gate only rejects
+on the hard limits below, which are deliberately far from the grade
+boundaries: a "C" photo is still analyzed, a black frame is not.
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Longest side of the gate thumbnail (upper bound; reduced by an integer factor)
+GATE_THUMB_DIM = 512
+
+# Hard limits (calibrated on GATE_THUMB_DIM thumbnails)
+MIN_FOCUS_VARIANCE = 25.0        # Laplacian variance below this is a blurred frame
+MIN_BRIGHTNESS = 30.0            # mean gray
+MAX_BRIGHTNESS = 235.0
+MAX_DARK_CLIP = 0.70             # share of pixels <= 15
+MAX_BRIGHT_CLIP = 0.60           # share of pixels >= 250
+MAX_GLARE_PERCENT = 45.0
+MIN_CARD_PRESENCE = 0.10
+
+# Glare-mask regions at least this share of the thumbnail that come within
+# GLARE_BACKGROUND_MARGIN of the frame edge are background, not glare, where
+# they lie outside the card outline
+GLARE_BACKGROUND_MIN_AREA = 0.05
+GLARE_BACKGROUND_MARGIN = 0.03
+# Frame sides a background region must reach when no card outline was found
+GLARE_BACKGROUND_MIN_SIDES = 2
+
+# Card outline for the glare split: best card-shaped contour scoring at least
+# this, ignoring contours that span the frame (page or slab borders)
+CARD_OUTLINE_MIN_SCORE = 0.5
+CARD_OUTLINE_MAX_AREA = 0.90
+
+CARD_ASPECT = 63.0 / 88.0
+
+
+# card_detection_service/image_normalization.py carries a copy; keep them in step
+def grade_image_quality(focus: float, edge_density: float, brightness: float) -> Dict[str, any]:
+    """Calculate image quality grade (A-D) based on metrics."""
+    score = (
+        min(focus / 250.0, 1.0) * 0.5 +
+        min(edge_density / 0.08, 1.0) * 0.3 +
+        (1 - abs(128 - brightness) / 128.0) * 0.2
+    ) * 100
+
+    if score >= 85:
+        grade = "A"
+    elif score >= 70:
+        grade = "B"
+    elif score >= 55:
+        grade = "C"
+    else:
+        grade = "D"
+
+    return {
+        "score": round(score, 1),
+        "grade": grade,
+        "reshoot": grade in ["C", "D"]
+    }
+
+
+@dataclass
+class QualityGateResult:
+    passed: bool
+    reasons: List[str]
+    focus_variance: float
+    brightness_mean: float
+    dark_clip_fraction: float
+    bright_clip_fraction: float
+    glare_coverage_percent: float
+    card_presence: float
+    edge_density: float
+    image_quality: Dict[str, any] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+    @property
+    def reshoot_required(self) -> bool:
+        return not self.passed
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d["reshoot_required"] = self.reshoot_required
+        return d
+
+
+def foreground_glare_percent(glare_mask: np.ndarray, card_box: Optional[np.ndarray] = None) -> float:
+    """
+    Glare coverage (0-100) of the foreground of a thumbnail glare mask.
+
+    Large bright, unsaturated regions reaching the frame edge (within
+    GLARE_BACKGROUND_MARGIN) are the surface the card lies on: the part of
+    them outside card_box (see card_outline) is left out of both the glare
+    and the area it is measured against. Without an outline a region must
+    reach GLARE_BACKGROUND_MIN_SIDES frame sides to count as background.
+    """
+    h, w = glare_mask.shape[:2]
+    n, labels, stats, _ = cv2.connectedComponentsWithStats((glare_mask > 0).astype(np.uint8), connectivity=8)
+    x, y, cw, ch, area = stats[1:].T
+    mx, my = GLARE_BACKGROUND_MARGIN * w, GLARE_BACKGROUND_MARGIN * h
+    sides = ((x <= mx).astype(int) + (y <= my) + (x + cw >= w - mx) + (y + ch >= h - my))
+    large = area >= GLARE_BACKGROUND_MIN_AREA * h * w
+    if card_box is None:
+        background = np.concatenate([[False], large & (sides >= GLARE_BACKGROUND_MIN_SIDES)])[labels]
+    else:
+        on_card = np.zeros((h, w), np.uint8)
+        cv2.fillConvexPoly(on_card, np.round(card_box).astype(np.int32), 1)
+        background = np.concatenate([[False], large & (sides >= 1)])[labels] & (on_card == 0)
+    dropped = int(np.count_nonzero(background))
+    return float(100.0 * (int(area.sum()) - dropped) / max(h * w - dropped, 1))
+
+
+def _card_shape_score(cnt: np.ndarray, w: int, h: int) -> Tuple[float, Optional[tuple]]:
+    """Area share x aspect fit x rectangularity of one contour, with its min-area rect."""
+    rect = cv2.minAreaRect(cnt)
+    (rw, rh) = rect[1]
+    if rw < 1 or rh < 1:
+        return 0.0, None
+    area_share = (rw * rh) / float(w * h)
+    aspect = min(rw, rh) / max(rw, rh)
+    fill = cv2.contourArea(cv2.convexHull(cnt)) / (rw * rh)
+    score = (min(1.0, area_share / 0.15) *
+             max(0.0, 1.0 - abs(aspect - CARD_ASPECT) / 0.2) *
+             min(1.0, fill / 0.85))
+    return score, rect
+
+
+def _frame_is_card(edges: np.ndarray) -> bool:
+    """Close-ups and scans: the frame has card proportions and some structure."""
+    h, w = edges.shape[:2]
+    frame_aspect = min(w, h) / float(max(w, h))
+    density = float(np.count_nonzero(edges)) / edges.size
+    return abs(frame_aspect - CARD_ASPECT) < 0.06 and density > 0.01
+
+
+def card_presence_score(edges: np.ndarray) -> float:
+    """Likelihood (0-1) that a card-shaped outline is in frame, from a thumbnail edge map."""
+    h, w = edges.shape[:2]
+    closed = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    best = 0.0
+    for cnt in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        best = max(best, _card_shape_score(cnt, w, h)[0])
+
+    # Close-ups and scans: the card is the frame itself
+    if _frame_is_card(edges):
+        best = max(best, 0.6)
+    return float(best)
+
+
+def card_outline(edges: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Corner points (4x2 float) of the card in a thumbnail edge map, or None.
+
+    The card-presence contour search over nested contours too, skipping those
+    wider than CARD_OUTLINE_MAX_AREA of the frame: a slab or page border
+    encloses the card. A close-up whose frame is the card returns the frame.
+    """
+    h, w = edges.shape[:2]
+    closed = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(closed, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    best, best_rect = CARD_OUTLINE_MIN_SCORE, None
+    for cnt in sorted(contours, key=cv2.contourArea, reverse=True)[:10]:
+        score, rect = _card_shape_score(cnt, w, h)
+        if rect is None or rect[1][0] * rect[1][1] > CARD_OUTLINE_MAX_AREA * w * h:
+            continue
+        if score >= best:
+            best, best_rect = score, rect
+    if best_rect is not None:
+        return cv2.boxPoints(best_rect)
+    if _frame_is_card(edges):
+        return np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], np.float32)
+    return None
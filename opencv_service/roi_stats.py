@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ROI Statistics Engine
+=====================
+
+Summed-area tables (integral images) for one warped card side. Each per-pixel
+map is built once - edge ΔE whitening masks, white-pixel masks, luminance,
+glare - and any rectangle's count, mean or variance is then answered in O(1),
+so the edge segments, corner patches and lighting tiles of card_cv_stage1.py
+and card_cv_stage1_enhanced.py stop re-slicing and re-converting overlapping
+regions. Finer segment grids cost nothing beyond the table lookups.
+
+Maps are built lazily and cached by their parameters. Border maps cover only
+the bands they need, so a caller that only asks for edge and corner
+statistics never converts the card interior.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+Rect = Tuple[int, int, int, int]  # (x0, y0, x1, y1), half-open
+
+
+class IntegralImage:
+    """Sum (and optionally sum-of-squares) table of one single-channel map."""
+
+    def __init__(self, values: np.ndarray, squares: bool = False):
+        self.height, self.width = values.shape[:2]
+        # uint8 maps of card size sum exactly in int32 (half the bytes of float64);
+        # squares always need float64.
+        sdepth = cv2.CV_32S if values.dtype == np.uint8 and values.size * 255 < 2 ** 31 else cv2.CV_64F
+        if squares:
+            self._sum, self._sqsum = cv2.integral2(values, sdepth=sdepth, sqdepth=cv2.CV_64F)
+        else:
+            self._sum = cv2.integral(values, sdepth=sdepth)
+            self._sqsum = None
+
+    def _clip(self, rect: Rect) -> Rect:
+        x0, y0, x1, y1 = rect
+        return (min(max(x0, 0), self.width), min(max(y0, 0), self.height),
+                min(max(x1, 0), self.width), min(max(y1, 0), self.height))
+
+    @staticmethod
+    def _lookup(table: np.ndarray, rect: Rect) -> float:
+        x0, y0, x1, y1 = rect
+        return float(table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0])
+
+    def area(self, rect: Rect) -> int:
+        x0, y0, x1, y1 = self._clip(rect)
+        return max(0, x1 - x0) * max(0, y1 - y0)
+
+    def sum(self, rect: Rect) -> float:
+        return self._lookup(self._sum, self._clip(rect))
+
+    def mean(self, rect: Rect) -> float:
+        return self.sum(rect) / max(1, self.area(rect))
+
+    def variance(self, rect: Rect) -> float:
+        if self._sqsum is None:
+            raise ValueError("IntegralImage was built without squares; variance unavailable")
+        n = max(1, self.area(rect))
+        mean = self.sum(rect) / n
+        return max(0.0, self._lookup(self._sqsum, self._clip(rect)) / n - mean * mean)
+
+    def grid_means(self, rows: int, cols: int) -> np.ndarray:
+        """Tile means on a rows x cols grid; the last row/column absorbs the remainder."""
+        tile_h = max(1, self.height // rows)
+        tile_w = max(1, self.width // cols)
+        ys = np.array([r * tile_h for r in range(rows)] + [self.height])
+        xs = np.array([c * tile_w for c in range(cols)] + [self.width])
+        s = self._sum[np.ix_(ys, xs)]
+        sums = s[1:, 1:] - s[:-1, 1:] - s[1:, :-1] + s[:-1, :-1]
+        areas = np.outer(np.diff(ys), np.diff(xs))
+        return sums / np.maximum(areas, 1)
+
+
+def _delta_e(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    # Simple ΔE 1976, same as card_cv_stage1.delta_e_lab
+    return np.sqrt(np.sum((lab1.astype(np.float32) - lab2.astype(np.float32)) ** 2, axis=2))
+
+
+class CardRoiStats:
+    """
+    Lazily-built per-pixel maps and integral images for one warped card side.
+
+    Edge maps live in strip coordinates: "top"/"bottom" strips are
+    strip_width x W, "left"/"right" strips are H x strip_width. Everything
+    else is in warped-card coordinates.
+    """
+
+    def __init__(self, img_bgr: np.ndarray, glare_mask: Optional[np.ndarray] = None):
+        self.img = img_bgr
+        self.height, self.width = img_bgr.shape[:2]
+        self._glare_mask = glare_mask
+        self._gray: Optional[np.ndarray] = None
+        self._cache: Dict[tuple, object] = {}
+
+    # ---- base maps ----
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def _cached(self, key: tuple, build):
+        # Safe to share across stage threads: builds are pure, so a race only
+        # builds the same value twice.
+        value = self._cache.get(key)
+        if value is None:
+            value = build()
+            self._cache[key] = value
+        return value
+
+    def border_band(self, side: str, depth: int) -> np.ndarray:
+        """BGR view of the outer `depth` pixels along one side (full side length)."""
+        h, w = self.height, self.width
+        return {
+            "top": self.img[0:depth, :],
+            "bottom": self.img[h - depth:h, :],
+            "left": self.img[:, 0:depth],
+            "right": self.img[:, w - depth:w],
+        }[side]
+
+    def border_lab(self, side: str, depth: int) -> np.ndarray:
+        """LAB of the outer `depth` pixels along one side."""
+        return self._cached(("border_lab", side, depth),
+                            lambda: cv2.cvtColor(self.border_band(side, depth), cv2.COLOR_BGR2LAB))
+
+    def border_gray(self, side: str, depth: int) -> np.ndarray:
+        """Gray of the outer `depth` pixels along one side (sliced from the full gray if built)."""
+        if self._gray is not None:
+            h, w = self.height, self.width
+            return {"top": self._gray[0:depth, :], "bottom": self._gray[h - depth:h, :],
+                    "left": self._gray[:, 0:depth], "right": self._gray[:, w - depth:w]}[side]
+        return self._cached(("border_gray", side, depth),
+                            lambda: cv2.cvtColor(self.border_band(side, depth), cv2.COLOR_BGR2GRAY))
+
+    def border_white(self, side: str, depth: int, min_value: int) -> Tuple[np.ndarray, IntegralImage]:
+        """White mask (gray >= min_value) of one border band and its count table."""
+        def build():
+            mask = cv2.inRange(self.border_gray(side, depth), int(min_value), 255)
+            return mask, IntegralImage((mask > 0).astype(np.uint8))
+        return self._cached(("border_white", side, depth, int(min_value)), build)
+
+    def _corner_slice(self, band: np.ndarray, corner: str, patch_size: int) -> np.ndarray:
+        return band[:, 0:patch_size] if corner[1] == "l" else band[:, self.width - patch_size:self.width]
+
+    def corner_lab(self, corner: str, patch_size: int) -> np.ndarray:
+        """LAB of a corner patch, sliced from the cached top/bottom border band."""
+        side = "top" if corner[0] == "t" else "bottom"
+        return self._corner_slice(self.border_lab(side, patch_size), corner, patch_size)
+
+    def corner_gray(self, corner: str, patch_size: int) -> np.ndarray:
+        side = "top" if corner[0] == "t" else "bottom"
+        return self._corner_slice(self.border_gray(side, patch_size), corner, patch_size)
+
+    def corner_white(self, corner: str, patch_size: int, min_value: int) -> np.ndarray:
+        side = "top" if corner[0] == "t" else "bottom"
+        mask, _ = self.border_white(side, patch_size, min_value)
+        return self._corner_slice(mask, corner, patch_size)
+
+    # ---- integral maps ----
+
+    def luminance(self) -> IntegralImage:
+        return self._cached(("luminance",), lambda: IntegralImage(self.gray, squares=True))
+
+    def white_mask(self, min_value: int) -> Tuple[np.ndarray, IntegralImage]:
+        """Full-card uint8 mask (255 where gray >= min_value) and its pixel-count table."""
+        def build():
+            mask = cv2.inRange(self.gray, int(min_value), 255)
+            return mask, IntegralImage((mask > 0).astype(np.uint8))
+        return self._cached(("white", int(min_value)), build)
+
+    def glare(self) -> Optional[IntegralImage]:
+        if self._glare_mask is None:
+            return None
+        return self._cached(("glare",), lambda: IntegralImage((self._glare_mask > 0).astype(np.uint8)))
+
+    def edge_delta_e(self, side: str, strip_width: int) -> np.ndarray:
+        """ΔE between each border-strip pixel and the pixel strip_width further inward."""
+        def build():
+            lab = self.border_lab(side, 2 * strip_width)
+            if side == "top":
+                return _delta_e(lab[0:strip_width], lab[strip_width:2 * strip_width])
+            if side == "bottom":
+                return _delta_e(lab[strip_width:2 * strip_width], lab[0:strip_width])
+            if side == "left":
+                return _delta_e(lab[:, 0:strip_width], lab[:, strip_width:2 * strip_width])
+            return _delta_e(lab[:, strip_width:2 * strip_width], lab[:, 0:strip_width])
+        return self._cached(("edge_de", side, strip_width), build)
+
+    def edge_whitening(self, side: str, strip_width: int, delta_e_thresh: float) -> Tuple[np.ndarray, IntegralImage]:
+        """Whitening mask (ΔE > threshold) of one border strip and its count table."""
+        def build():
+            mask = (self.edge_delta_e(side, strip_width) > delta_e_thresh).astype(np.uint8)
+            return mask, IntegralImage(mask)
+        return self._cached(("edge_white", side, strip_width, float(delta_e_thresh)), build)
+
+    def edge_strip_rect(self, side: str, strip_width: int) -> Rect:
+        """Border strip of one side in warped-card coordinates."""
+        h, w = self.height, self.width
+        return {
+            "top": (0, 0, w, strip_width),
+            "bottom": (0, h - strip_width, w, h),
+            "left": (0, 0, strip_width, h),
+            "right": (w - strip_width, 0, w, h),
+        }[side]
+
+    # ---- convenience ----
+
+    def glare_fraction(self, rect: Optional[Rect] = None) -> float:
+        table = self.glare()
+        if table is None:
+            return 0.0
+        rect = rect or (0, 0, self.width, self.height)
+        return table.sum(rect) / max(1, table.area(rect))
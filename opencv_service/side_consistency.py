@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Front/Back Consistency
+======================
+
+A cheap check, once both sides are warped, that the two uploads are the
+front and back of one card: not the same side twice, not two different
+cards. Callers can reject a mismatched upload before the LLM grading stage.
+
+Per side, the "signature" stage records (SideSignature):
+- aspect        warped card width / height
+- border_lab    mean CIELAB color of the outer BORDER_BAND_FRACTION band
+                (top, right, bottom, left) on a 400px warp level
+- phash/dhash   the card_hash of the warped card
+
+check_side_consistency compares the two sides:
+- same side     both hashes within SAME_SIDE_MAX_DISTANCE bits: the same side
+                (the same photo, or two photos of it) was uploaded twice
+                                                                    -> mismatch
+- aspect        relative aspect difference over ASPECT_MISMATCH      -> mismatch
+                (over ASPECT_SUSPECT                                 -> suspect)
+- similar sides hashes within SIMILAR_MAX_DISTANCE bits and border colors
+                within BORDER_SAME_DELTA_E: likely the same side     -> suspect
+- border width  total border share (from border-present centering)
+                differs by more than BORDER_SHARE_SUSPECT            -> suspect
+- holder        holder classifications differ                       -> suspect
+
+A front and back legitimately differ in border color and artwork, so color
+alone never flags a mismatch; it only backs up a near hash match.
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+
+# Outer band sampled for the border color, as a share of the card width
+BORDER_BAND_FRACTION = 0.03
+
+# Both hashes within this many bits (of 64): the same side uploaded twice.
+# Two photos of one side land within ~8 bits; different artwork on the same
+# card layout sits beyond 20.
+SAME_SIDE_MAX_DISTANCE = 10
+
+# Hashes this close plus near-identical border color: probably the same side
+SIMILAR_MAX_DISTANCE = 16
+BORDER_SAME_DELTA_E = 5.0
+
+# Relative aspect-ratio difference between the sides
+ASPECT_MISMATCH = 0.08
+ASPECT_SUSPECT = 0.04
+
+# Difference in (left + right) / width and (top + bottom) / height
+BORDER_SHARE_SUSPECT = 0.08
+
+
+@dataclass
+class SideSignature:
+    aspect: float
+    border_lab: List[List[float]]    # [top, right, bottom, left] mean L*, a*, b*
+    phash: str
+    dhash: str
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+@dataclass
+class ConsistencyVerdict:
+    verdict: str                     # "consistent", "suspect", "mismatch" or "skipped"
+    reasons: List[str] = field(default_factory=list)
+    checks: Dict[str, Dict[str, any]] = field(default_factory=dict)
+
+    @property
+    def reject(self) -> bool:
+        return self.verdict == "mismatch"
+
+    def to_dict(self) -> Dict[str, any]:
+        d = asdict(self)
+        d["reject"] = self.reject
+        return d
+
+
+def side_signature(warped_bgr: np.ndarray, card_hash) -> SideSignature:
+    """Signature of a warped card (any pyramid level) and its CardHash."""
+    h, w = warped_bgr.shape[:2]
+    band = max(2, int(round(w * BORDER_BAND_FRACTION)))
+    lab = cv2.cvtColor(warped_bgr, cv2.COLOR_BGR2LAB)
+    strips = (lab[:band], lab[:, w - band:], lab[h - band:], lab[:, :band])
+    border_lab = []
+    for strip in strips:
+        mean = cv2.mean(strip)[:3]
+        # 8-bit Lab: L scaled to 0-255, a / b offset by 128
+        border_lab.append([round(mean[0] * 100.0 / 255.0, 2), round(mean[1] - 128.0, 2), round(mean[2] - 128.0, 2)])
+    hashes = card_hash.to_dict()
+    return SideSignature(aspect=w / float(h), border_lab=border_lab, phash=hashes["phash"], dhash=hashes["dhash"])
+
+
+def _hamming_hex(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _border_share(centering, width: int, height: int) -> Optional[float]:
+    """Total border width as a share of the card, averaged over both axes."""
+    # Design-anchor offsets measure an inner frame, not the border
+    if centering is None or centering.method_used != "border-present" or width <= 0 or height <= 0:
+        return None
+    lr = (centering.left_border_mean_px + centering.right_border_mean_px) / float(width)
+    tb = (centering.top_border_mean_px + centering.bottom_border_mean_px) / float(height)
+    return (lr + tb) / 2.0
+
+
+def check_side_consistency(front, back) -> ConsistencyVerdict:
+    """
+    Consistency verdict for two SideMetrics.
+
+    Checks whose inputs a side lacks (metric group not requested, detection
+    failed) are skipped; both sides must have passed the quality gate and
+    carry a signature for any check to run.
+    """
+    if front is None or back is None:
+        return ConsistencyVerdict(verdict="skipped", reasons=["single_side"])
+    for side in (front, back):
+        if side.quality_gate and not side.quality_gate.get("passed", True):
+            return ConsistencyVerdict(verdict="skipped", reasons=[f"{side.side_label}_reshoot_required"])
+    if front.signature is None or back.signature is None:
+        return ConsistencyVerdict(verdict="skipped", reasons=["no_signature"])
+
+    fs, bs = front.signature, back.signature
+    mismatch, suspect, checks = [], [], {}
+
+    phash_d = _hamming_hex(fs["phash"], bs["phash"])
+    dhash_d = _hamming_hex(fs["dhash"], bs["dhash"])
+    same_side = max(phash_d, dhash_d) <= SAME_SIDE_MAX_DISTANCE
+    checks["hash"] = {"phash_distance": phash_d, "dhash_distance": dhash_d, "same_side": same_side}
+    if same_side:
+        mismatch.append("same_side_twice")
+
+    aspect_diff = abs(fs["aspect"] - bs["aspect"]) / max(fs["aspect"], bs["aspect"])
+    checks["aspect"] = {"front": round(fs["aspect"], 4), "back": round(bs["aspect"], 4),
+                        "relative_difference": round(aspect_diff, 4)}
+    if aspect_diff > ASPECT_MISMATCH:
+        mismatch.append("aspect_mismatch")
+    elif aspect_diff > ASPECT_SUSPECT:
+        suspect.append("aspect_differs")
+
+    f_lab = np.mean(np.asarray(fs["border_lab"], dtype=np.float64), axis=0)
+    b_lab = np.mean(np.asarray(bs["border_lab"], dtype=np.float64), axis=0)
+    delta_e = float(np.linalg.norm(f_lab - b_lab))
+    checks["border_color"] = {"front_lab": np.round(f_lab, 2).tolist(), "back_lab": np.round(b_lab, 2).tolist(),
+                              "delta_e": round(delta_e, 2)}
+    if not same_side and max(phash_d, dhash_d) <= SIMILAR_MAX_DISTANCE and delta_e < BORDER_SAME_DELTA_E:
+        suspect.append("sides_look_alike")
+
+    f_share = _border_share(front.centering, front.width, front.height)
+    b_share = _border_share(back.centering, back.width, back.height)
+    if f_share is not None and b_share is not None:
+        checks["border_width"] = {"front_share": round(f_share, 4), "back_share": round(b_share, 4)}
+        if abs(f_share - b_share) > BORDER_SHARE_SUSPECT:
+            suspect.append("border_width_differs")
+
+    if front.holder and back.holder:
+        checks["holder"] = {"front": front.holder["holder"], "back": back.holder["holder"]}
+        if front.holder["holder"] != back.holder["holder"]:
+            suspect.append("holder_differs")
+
+    verdict = "mismatch" if mismatch else "suspect" if suspect else "consistent"
+    return ConsistencyVerdict(verdict=verdict, reasons=mismatch + suspect, checks=checks)
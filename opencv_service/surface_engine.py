@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tiled Surface Defect Engine
+===========================
+
+Surface defect detection for one warped card side, split into overlapping
+tiles that run on a thread pool (OpenCV releases the GIL inside its kernels).
+
+Each tile is a TILE_PX core plus a TILE_MARGIN_PX apron on every side:
+- White dots are kept only by the tile whose core holds their centroid, and
+  dots cut by an interior apron edge are discarded (they are larger than a dot).
+- Scratch segments (Canny + HoughLinesP) from neighbouring tiles are stitched:
+  collinear, overlapping segments found by different tiles merge into one line.
+- Creases are long, card-scale structures and are not tiled: they come from
+  the multi-scale detector in crease_detector.py, which searches a reduced
+  level and confirms in narrow full-resolution bands.
+- Focus variance is combined exactly from per-tile Laplacian sums.
+
+Tiles whose glare coverage exceeds GLARE_TILE_SKIP are excluded from defect
+detection (glare produces white-dot and edge false positives) but still
+contribute to the focus measure.
+
+Alongside the counts the engine returns a DefectGrid: per-tile defect counts
+and densities for localisation by downstream grading.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from crease_detector import CreaseCandidate, detect_creases
+from roi_stats import IntegralImage
+
+
+# Core tile size and apron at the 1600px warp height (6x4 tiles per card).
+# The apron must exceed half the minimum scratch length so any scratch that
+# crosses a seam is long enough in at least one tile to be found.
+TILE_PX = 256
+TILE_MARGIN_PX = 32
+
+# Surface detectors analyze_surface_tiled can run, in increasing cost
+SURFACE_DETECTORS = ("dots", "scratches", "creases")
+
+# Tiles with more glare than this are skipped for defect detection
+GLARE_TILE_SKIP = 0.5
+
+# Segments from different tiles merge when within this angle / offset / gap
+SEAM_ANGLE_DEG = 5.0
+SEAM_OFFSET_PX = 3.0
+SEAM_GAP_PX = 8.0
+
+SURFACE_WORKERS = int(os.environ.get("OPENCV_SURFACE_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SURFACE_WORKERS, thread_name_prefix="surface")
+        return _executor
+
+
+Rect = Tuple[int, int, int, int]  # (x0, y0, x1, y1), half-open
+
+
+@dataclass
+class DefectGrid:
+    """Per-tile defect counts; density is defects per 10k px of core, None for skipped tiles."""
+    rows: int
+    cols: int
+    tile_px: int
+    white_dots: List[List[int]]
+    scratches: List[List[int]]
+    creases: List[List[int]]
+    density: List[List[Optional[float]]]
+    glare_skipped: List[Tuple[int, int]] = field(default_factory=list)
+
+
+@dataclass
+class SurfaceDefects:
+    white_dots_count: int
+    scratch_count: int
+    crease_like_count: int
+    focus_variance: float
+    grid: DefectGrid
+    creases: List[CreaseCandidate] = field(default_factory=list)
+
+
+@dataclass
+class _Tile:
+    row: int
+    col: int
+    core: Rect
+    padded: Rect
+    skip: bool
+
+
+@dataclass
+class _TileResult:
+    dots: List[Tuple[float, float]]
+    segments: np.ndarray  # (N, 4) x1, y1, x2, y2 in card coordinates
+    lap_sum: float
+    lap_sqsum: float
+    lap_count: int
+
+
+def plan_tiles(width: int, height: int, glare: Optional[IntegralImage],
+               tile_px: int = TILE_PX, margin: int = TILE_MARGIN_PX) -> Tuple[int, int, List[_Tile]]:
+    """Split a card into a rows x cols grid of cores (last row/col absorbs the remainder)."""
+    cols = max(1, int(round(width / float(tile_px))))
+    rows = max(1, int(round(height / float(tile_px))))
+    xs = [c * width // cols for c in range(cols)] + [width]
+    ys = [r * height // rows for r in range(rows)] + [height]
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            core = (xs[c], ys[r], xs[c + 1], ys[r + 1])
+            padded = (max(0, core[0] - margin), max(0, core[1] - margin),
+                      min(width, core[2] + margin), min(height, core[3] + margin))
+            skip = glare is not None and glare.mean(core) > GLARE_TILE_SKIP
+            tiles.append(_Tile(r, c, core, padded, skip))
+    return rows, cols, tiles
+
+
+def _in_rect(x: float, y: float, rect: Rect) -> bool:
+    return rect[0] <= x < rect[2] and rect[1] <= y < rect[3]
+
+
+def _tile_pass(img_bgr: np.ndarray, tile: _Tile,
+               min_dot_area: int, max_dot_area: int, min_line_px: int,
+               dots: bool = True, scratches: bool = True) -> _TileResult:
+    px0, py0, px1, py1 = tile.padded
+    cx0, cy0, cx1, cy1 = tile.core
+    gray = cv2.cvtColor(img_bgr[py0:py1, px0:px1], cv2.COLOR_BGR2GRAY)
+    core = (slice(cy0 - py0, cy1 - py0), slice(cx0 - px0, cx1 - px0))
+
+    # Focus: Laplacian sums over the core only (the apron supplies context)
+    # (int16 holds a 3x3 Laplacian of uint8 exactly; sums are exact integers)
+    lap = cv2.Laplacian(gray, cv2.CV_16S)[core]
+    lap_sum = float(lap.sum(dtype=np.int64))
+    lap_sqsum = float(cv2.sumElems(cv2.multiply(lap, lap, dtype=cv2.CV_32S))[0])
+    lap_count = int(lap.size)
+
+    if tile.skip:
+        return _TileResult([], np.zeros((0, 4), np.float32), lap_sum, lap_sqsum, lap_count)
+
+    # White dots owned by this core
+    found = []
+    if dots:
+        _, thr = cv2.threshold(gray, 245, 255, cv2.THRESH_BINARY)
+        thr = cv2.morphologyEx(thr, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8), iterations=1)
+        n, _, stats, centroids = cv2.connectedComponentsWithStats(thr, connectivity=8)
+        th, tw = gray.shape
+        for i in range(1, n):
+            area = stats[i, cv2.CC_STAT_AREA]
+            if not (min_dot_area <= area <= max_dot_area):
+                continue
+            x, y = centroids[i][0] + px0, centroids[i][1] + py0
+            if not _in_rect(x, y, tile.core):
+                continue
+            bx, by, bw, bh = stats[i, :4]
+            cut = ((bx == 0 and px0 > 0) or (by == 0 and py0 > 0) or
+                   (bx + bw == tw and px1 < img_bgr.shape[1]) or (by + bh == th and py1 < img_bgr.shape[0]))
+            if not cut:
+                found.append((float(x), float(y)))
+
+    # Scratch segments in card coordinates
+    segments = np.zeros((0, 4), np.float32)
+    if scratches:
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (3, 3), 0), 40, 100)
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180.0, threshold=50, minLineLength=min_line_px, maxLineGap=8)
+        if lines is not None:
+            segments = lines.reshape(-1, 4).astype(np.float32) + np.float32([px0, py0, px0, py0])
+    return _TileResult(found, segments, lap_sum, lap_sqsum, lap_count)
+
+
+def _segments_match(a: np.ndarray, b: np.ndarray) -> bool:
+    """True if b lies on a's line within the seam tolerances and overlaps or abuts it."""
+    ax, ay = a[2] - a[0], a[3] - a[1]
+    bx, by = b[2] - b[0], b[3] - b[1]
+    la, lb = float(np.hypot(ax, ay)), float(np.hypot(bx, by))
+    if la < 1e-6 or lb < 1e-6:
+        return False
+    cos = abs(ax * bx + ay * by) / (la * lb)
+    if cos < np.cos(np.radians(SEAM_ANGLE_DEG)):
+        return False
+    ux, uy = ax / la, ay / la
+    # Perpendicular offsets of b's endpoints from a's line
+    for px, py in ((b[0], b[1]), (b[2], b[3])):
+        if abs((px - a[0]) * uy - (py - a[1]) * ux) > SEAM_OFFSET_PX:
+            return False
+    # Projection intervals along a
+    t0 = (b[0] - a[0]) * ux + (b[1] - a[1]) * uy
+    t1 = (b[2] - a[0]) * ux + (b[3] - a[1]) * uy
+    lo, hi = min(t0, t1), max(t0, t1)
+    return lo <= la + SEAM_GAP_PX and hi >= -SEAM_GAP_PX
+
+
+def stitch_segments(per_tile: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Merge segments that different tiles found for the same line.
+
+    Segments from the same tile are never merged, so a tile's own Hough output
+    counts exactly as the single-pass detector would count it. Returns one
+    representative (the longest member) per stitched line.
+    """
+    segs = [(t, s) for t, arr in enumerate(per_tile) for s in arr]
+    parent = list(range(len(segs)))
+    if not segs:
+        return []
+    owner = np.array([t for t, _ in segs])
+    coords = np.array([s for _, s in segs], dtype=np.float32)
+    lo = np.minimum(coords[:, :2], coords[:, 2:]) - SEAM_GAP_PX
+    hi = np.maximum(coords[:, :2], coords[:, 2:]) + SEAM_GAP_PX
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Only segments from different tiles whose padded bounding boxes meet are candidates
+    for i in range(len(segs)):
+        near = ((owner[i + 1:] != owner[i]) &
+                np.all(lo[i + 1:] <= hi[i], axis=1) & np.all(hi[i + 1:] >= lo[i], axis=1))
+        for j in np.nonzero(near)[0] + i + 1:
+            if _segments_match(coords[i], coords[j]):
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, np.ndarray] = {}
+    for i, (_, s) in enumerate(segs):
+        root = find(i)
+        best = groups.get(root)
+        if best is None or np.hypot(s[2] - s[0], s[3] - s[1]) > np.hypot(best[2] - best[0], best[3] - best[1]):
+            groups[root] = s
+    return list(groups.values())
+
+
+def _tile_index(x: float, y: float, tiles: List[_Tile], cols: int) -> int:
+    for t in tiles:
+        if _in_rect(x, y, t.core):
+            return t.row * cols + t.col
+    return -1
+
+
+def analyze_surface_tiled(img_bgr: np.ndarray, glare_mask: Optional[np.ndarray] = None,
+                          search_bgr: Optional[np.ndarray] = None,
+                          min_dot_area: int = 3, max_dot_area: int = 200, scratch_min_len_px: int = 40,
+                          tile_px: int = TILE_PX, margin: int = TILE_MARGIN_PX,
+                          detectors: Tuple[str, ...] = SURFACE_DETECTORS) -> SurfaceDefects:
+    """
+    Tiled white-dot and scratch detection, focus variance, and creases.
+
+    glare_mask may be at any resolution; it is resized to the card with
+    nearest-neighbour sampling before the per-tile glare fractions are taken.
+    search_bgr is an optional reduced-resolution view for the crease search.
+    detectors limits the work to a subset of SURFACE_DETECTORS; focus is
+    always measured, skipped detectors report zero.
+    """
+    h, w = img_bgr.shape[:2]
+    glare = None
+    if glare_mask is not None:
+        if glare_mask.shape[:2] != (h, w):
+            glare_mask = cv2.resize(glare_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        glare = IntegralImage((glare_mask > 0).astype(np.uint8))
+
+    rows, cols, tiles = plan_tiles(w, h, glare, tile_px, margin)
+    results = list(get_executor().map(
+        lambda t: _tile_pass(img_bgr, t, min_dot_area, max_dot_area, scratch_min_len_px,
+                             dots="dots" in detectors, scratches="scratches" in detectors),
+        tiles))
+
+    # Focus: variance of the card-wide Laplacian from per-tile sums
+    n = sum(r.lap_count for r in results)
+    mean = sum(r.lap_sum for r in results) / max(1, n)
+    focus = max(0.0, sum(r.lap_sqsum for r in results) / max(1, n) - mean * mean)
+
+    counts = np.zeros((3, rows * cols), dtype=np.int32)  # dots, scratches, creases
+
+    for t, r in zip(tiles, results):
+        counts[0, t.row * cols + t.col] += len(r.dots)
+
+    lines = stitch_segments([r.segments for r in results])
+    for s in lines:
+        idx = _tile_index((s[0] + s[2]) / 2.0, (s[1] + s[3]) / 2.0, tiles, cols)
+        if idx >= 0:
+            counts[1, idx] += 1
+
+    creases = detect_creases(img_bgr, search_bgr, glare_mask) if "creases" in detectors else []
+    for c in creases:
+        idx = _tile_index((c.x1 + c.x2) / 2.0, (c.y1 + c.y2) / 2.0, tiles, cols)
+        if idx >= 0:
+            counts[2, idx] += 1
+
+    density: List[List[Optional[float]]] = [[None] * cols for _ in range(rows)]
+    for t in tiles:
+        if not t.skip:
+            idx = t.row * cols + t.col
+            area = (t.core[2] - t.core[0]) * (t.core[3] - t.core[1])
+            density[t.row][t.col] = round(float(counts[:, idx].sum()) * 10000.0 / max(1, area), 3)
+
+    grid = DefectGrid(
+        rows=rows,
+        cols=cols,
+        tile_px=int(tile_px),
+        white_dots=counts[0].reshape(rows, cols).tolist(),
+        scratches=counts[1].reshape(rows, cols).tolist(),
+        creases=counts[2].reshape(rows, cols).tolist(),
+        density=density,
+        glare_skipped=[(t.row, t.col) for t in tiles if t.skip],
+    )
+    return SurfaceDefects(
+        white_dots_count=int(counts[0].sum()),
+        scratch_count=len(lines),
+        crease_like_count=len(creases),
+        focus_variance=float(focus),
+        grid=grid,
+        creases=creases,
+    )
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import cv2
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(SERVICE_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+SAMPLE_CARDS = (
+    "cards for homepage/pikachu with grey felt hat.png",
+    "cards for homepage/maxxine dupri.png",
+)
+
+
+def load_sample(relpath):
+    """Read a sample image shipped in the repo, skipping when it is absent."""
+    img = cv2.imread(os.path.join(REPO_ROOT, relpath))
+    if img is None:
+        pytest.skip(f"sample image missing: {relpath}")
+    return img
@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+from illumination import normalize_for_detection
+from multi_card import MULTI_CARD_DETECTION_DIM, detect_card_quads
+
+CARD_W, CARD_H, GAP = 630, 880, 60
+
+
+def _binder_page(seed=0):
+    """3x3 page of white-bordered cards, each with a round artwork and a text box."""
+    rng = np.random.default_rng(seed)
+    page = np.full((3 * CARD_H + 4 * GAP, 3 * CARD_W + 4 * GAP, 3), 45, np.uint8)
+    for r in range(3):
+        for c in range(3):
+            card = np.full((CARD_H, CARD_W, 3), 245, np.uint8)
+            fill = rng.integers(60, 200, 3)
+            card[35:-35, 35:-35] = fill
+            cv2.circle(card, (CARD_W // 2, CARD_H // 2 - 60), 190, tuple(int(v) for v in rng.integers(0, 255, 3)), -1)
+            cv2.rectangle(card, (70, CARD_H - 200), (CARD_W - 70, CARD_H - 80), tuple(int(v) for v in 255 - fill), -1)
+            x0, y0 = GAP + c * (CARD_W + GAP), GAP + r * (CARD_H + GAP)
+            page[y0:y0 + CARD_H, x0:x0 + CARD_W] = card
+    return page
+
+
+def test_binder_page_finds_every_card():
+    page = _binder_page()
+    detection, scale = normalize_for_detection(page, max_dim=MULTI_CARD_DETECTION_DIM)
+    placements = detect_card_quads(detection)
+
+    assert [p.label for p in placements] == [f"r{r}c{c}" for r in (1, 2, 3) for c in (1, 2, 3)]
+    for p in placements:
+        x0, y0 = GAP + p.col * (CARD_W + GAP), GAP + p.row * (CARD_H + GAP)
+        corners = p.quad * scale
+        assert np.abs(corners - [[x0, y0], [x0 + CARD_W, y0], [x0 + CARD_W, y0 + CARD_H],
+                                 [x0, y0 + CARD_H]]).max() < 0.03 * CARD_H
@@ -0,0 +1,23 @@
+import json
+
+from phash_index import CardHash, PhashIndex
+
+
+def _add(index, n, start):
+    return [index.add(CardHash(phash=start + i, dhash=start + i), "front") for i in range(n)]
+
+
+def test_eviction_keeps_other_workers_entries(tmp_path):
+    # Two workers share a directory; b's eviction must keep what a appended
+    a = PhashIndex(directory=str(tmp_path), max_entries=10)
+    b = PhashIndex(directory=str(tmp_path), max_entries=10)
+    _add(b, 6, 0)
+    a_ids = _add(a, 5, 1000)
+    b_ids = _add(b, 5, 2000)        # b holds 11 of its own: evicts down to 9
+
+    with open(tmp_path / "index.jsonl", encoding="utf-8") as f:
+        on_disk = [json.loads(line)["id"] for line in f]
+    assert on_disk == a_ids[1:] + b_ids
+    assert all(b.entry(entry_id) is not None for entry_id in a_ids[1:])
+    assert len(b) == 9
+    assert len(PhashIndex(directory=str(tmp_path), max_entries=10)) == 9
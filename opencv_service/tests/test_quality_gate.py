@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+from card_cv_stage1 import assess_image_quality
+from conftest import load_sample
+from quality_gate import MAX_GLARE_PERCENT, foreground_glare_percent
+
+
+def _card_on_white_table():
+    card = cv2.resize(load_sample("cards for homepage/pikachu with grey felt hat.png"), (315, 440))
+    frame = np.full((800, 600, 3), 250, np.uint8)
+    frame[180:620, 140:455] = card
+    return frame
+
+
+def test_sample_card_passes():
+    result = assess_image_quality(load_sample("cards for homepage/pikachu with grey felt hat.png"))
+    assert result.passed, result.reasons
+
+
+def test_white_table_is_background_not_glare():
+    result = assess_image_quality(_card_on_white_table())
+    assert "glare" not in result.reasons
+    assert result.glare_coverage_percent < 10.0
+
+
+def test_washed_out_close_up_is_rejected():
+    # Card fills the frame; the top 900 rows are blown out
+    img = cv2.resize(load_sample("cards for homepage/pikachu with grey felt hat.png"), (1100, 1540))
+    img[:900] = 252
+    result = assess_image_quality(img)
+    assert result.glare_coverage_percent > MAX_GLARE_PERCENT
+    assert "glare" in result.reasons
+
+
+def test_edge_glare_without_outline_needs_two_sides():
+    mask = np.zeros((200, 200), np.uint8)
+    mask[:40, 60:140] = 255          # reaches the top edge only
+    assert foreground_glare_percent(mask) > 7.0
+    mask[:40, :] = 255               # spans left, top and right
+    assert foreground_glare_percent(mask) == 0.0
+
+
+def test_glare_inside_outline_is_kept():
+    mask = np.zeros((200, 200), np.uint8)
+    mask[:, :100] = 255
+    box = np.array([[50, 20], [150, 20], [150, 180], [50, 180]], np.float32)
+    # Only the part of the edge region outside the card is dropped
+    pct = foreground_glare_percent(mask, box)
+    on_card = 51 * 161
+    assert abs(pct - 100.0 * on_card / (200 * 200 - (100 * 200 - on_card))) < 1.0
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+import pytest
+
+from card_cv_stage1 import SIDE_PIPELINE, WarpPyramid, warp_geometry
+from conftest import REPO_ROOT, SAMPLE_CARDS, load_sample
+from fidelity_tiers import get_tier
+from pipeline import PipelineRun, StageCache
+
+
+def _run(path, cache):
+    return PipelineRun(SIDE_PIPELINE, sources={"image_path": path, "tier": get_tier(), "quad_hint": None,
+                                               "export_options": None},
+                       cache=cache)
+
+
+def test_warp_cache_keeps_geometry_not_photo(tmp_path):
+    load_sample(SAMPLE_CARDS[0])
+    path = os.path.join(REPO_ROOT, SAMPLE_CARDS[0])
+    cache = StageCache(directory=str(tmp_path))
+    first = _run(path, cache).get("warp").level(400)
+
+    run = _run(path, cache)
+    second = run.get("warp").level(400)
+    assert run.stats["homography"]["status"] == "cached"
+    assert run.stats["warp"]["status"] == "computed"
+    assert np.array_equal(first, second)
+    assert not (tmp_path / "warp").exists()
+
+
+def test_geometry_rejects_another_photo():
+    img = load_sample(SAMPLE_CARDS[0])
+    geometry = warp_geometry(img, None)
+    other = img.copy()
+    other[::7, ::7] = 255 - other[::7, ::7]
+    with pytest.raises(ValueError):
+        WarpPyramid(other, geometry)
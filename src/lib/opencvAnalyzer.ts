@@ -45,10 +45,15 @@ interface CenteringMetrics {
   right_border_mean_px: number;
   top_border_mean_px: number;
   bottom_border_mean_px: number;
-  method_used?: string;  // "border-present", "design-anchor-required", "failed"
+  method_used?: string;  // "border-present", "design-anchor", "design-anchor-required", "failed"
   confidence?: string;   // "high", "medium", "low", "unreliable"
   validation_notes?: string;  // Details about measurement
   fallback_mode?: boolean;  // True if measuring full image, not card boundaries
+  design_anchor?: {  // Inner frame measured against (design-anchor method)
+    box_normalized: [number, number, number, number];
+    side_coverage: { left: number; right: number; top: number; bottom: number };
+    score: number;
+  } | null;
 }
 
 interface EdgeSegments {